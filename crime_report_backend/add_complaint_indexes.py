@@ -0,0 +1,23 @@
+"""
+Migration: Add the (created_at, id) composite index used by keyset pagination
+on /complaints/all. Works on both SQLite and PostgreSQL.
+Run once from the crime_report_backend directory.
+"""
+from sqlalchemy import text
+from app.database import engine
+
+def add_complaint_indexes():
+    print("Creating keyset pagination index on complaints...")
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_complaints_created_at_id "
+                "ON complaints (created_at, id);"
+            ))
+            conn.commit()
+            print("Success: 'ix_complaints_created_at_id' is in place.")
+    except Exception as e:
+        print(f"Migration error: {e}")
+
+if __name__ == "__main__":
+    add_complaint_indexes()
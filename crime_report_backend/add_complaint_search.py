@@ -0,0 +1,29 @@
+"""
+Migration: Add full-text search over complaints (see app/search.py) and index
+the existing rows. Postgres gets the generated search_vector column and its GIN
+index; SQLite gets the complaints_fts FTS5 table and the triggers that sync it.
+Run once from the crime_report_backend directory.
+"""
+from sqlalchemy import text
+from app.database import engine
+from app.models import COMPLAINT_SEARCH_DDL_POSTGRES, COMPLAINT_SEARCH_DDL_SQLITE
+
+def add_complaint_search():
+    print(f"Adding complaint full-text search on {engine.dialect.name}...")
+    try:
+        with engine.connect() as conn:
+            if engine.dialect.name == "postgresql":
+                # Adding a generated column computes it for every existing row
+                for statement in COMPLAINT_SEARCH_DDL_POSTGRES:
+                    conn.execute(text(statement))
+            else:
+                for statement in COMPLAINT_SEARCH_DDL_SQLITE:
+                    conn.execute(text(statement))
+                conn.execute(text("INSERT INTO complaints_fts (complaints_fts) VALUES ('rebuild')"))
+            conn.commit()
+            print("Success: complaints are searchable.")
+    except Exception as e:
+        print(f"Migration error: {e}")
+
+if __name__ == "__main__":
+    add_complaint_search()
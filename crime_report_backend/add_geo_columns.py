@@ -0,0 +1,49 @@
+"""
+Migration: Add numeric 'latitude'/'longitude' and an indexed 'geohash' to
+complaints and sos_alerts, parsed from the existing string lat/long columns.
+Rows with missing or malformed coordinates are left NULL.
+Works on both SQLite and PostgreSQL. Run once from the crime_report_backend directory.
+"""
+from sqlalchemy import text
+from app.database import engine
+from app import geo
+
+TABLES = ["complaints", "sos_alerts"]
+COLUMNS = [("latitude", "FLOAT"), ("longitude", "FLOAT"), ("geohash", "VARCHAR")]
+BATCH_SIZE = 1000
+
+def add_geo_columns():
+    for table in TABLES:
+        for column, column_type in COLUMNS:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text(f"ALTER TABLE {table} ADD COLUMN {column} {column_type};"))
+                    conn.commit()
+                    print(f"Added '{column}' column to '{table}'.")
+            except Exception as e:
+                print(f"Migration error (column might already exist): {str(e)[:80]}")
+
+        with engine.connect() as conn:
+            rows = conn.execute(text(
+                f'SELECT id, lat, "long" FROM {table} WHERE geohash IS NULL AND lat IS NOT NULL'
+            )).fetchall()
+            updates = []
+            skipped = 0
+            for row_id, lat, long in rows:
+                latitude, longitude, geohash = geo.locate(lat, long)
+                if latitude is None:
+                    skipped += 1
+                    continue
+                updates.append({"id": row_id, "latitude": latitude, "longitude": longitude, "geohash": geohash})
+            for start in range(0, len(updates), BATCH_SIZE):
+                conn.execute(
+                    text(f"UPDATE {table} SET latitude = :latitude, longitude = :longitude, "
+                         f"geohash = :geohash WHERE id = :id"),
+                    updates[start:start + BATCH_SIZE],
+                )
+            conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_geohash ON {table} (geohash);"))
+            conn.commit()
+            print(f"Parsed coordinates for {len(updates)} row(s) in '{table}' ({skipped} unparseable).")
+
+if __name__ == "__main__":
+    add_geo_columns()
@@ -0,0 +1,34 @@
+"""
+Migration: Add the incident_id columns that group SOS alerts and complaints
+into incidents (see app/incidents.py). The incidents table itself is made by
+create_all on startup. Works on both SQLite and PostgreSQL.
+Run once from the crime_report_backend directory.
+"""
+from sqlalchemy import inspect, text
+from app.database import engine
+from app import models
+
+def add_incident_columns():
+    print("Adding incident_id to sos_alerts and complaints...")
+    try:
+        models.Incident.__table__.create(bind=engine, checkfirst=True)
+        inspector = inspect(engine)
+        with engine.connect() as conn:
+            for table in ("sos_alerts", "complaints"):
+                columns = [c["name"] for c in inspector.get_columns(table)]
+                if "incident_id" in columns:
+                    print(f"'{table}.incident_id' already exists.")
+                    continue
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN incident_id INTEGER REFERENCES incidents (id)"))
+                conn.execute(text(f"CREATE INDEX IF NOT EXISTS ix_{table}_incident_id ON {table} (incident_id)"))
+                print(f"Added '{table}.incident_id'.")
+            # /incidents pages on first_seen; last_seen moves as members join
+            conn.execute(text("DROP INDEX IF EXISTS ix_incidents_last_seen_id"))
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_incidents_first_seen_id ON incidents (first_seen, id)"))
+            conn.commit()
+        print("Success: existing reports stay ungrouped; new ones are grouped as they arrive.")
+    except Exception as e:
+        print(f"Migration error: {e}")
+
+if __name__ == "__main__":
+    add_incident_columns()
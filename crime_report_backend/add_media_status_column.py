@@ -0,0 +1,20 @@
+"""
+Migration: Add 'media_status' column to complaints, used when attachments
+are uploaded in the background (MEDIA_UPLOAD_MODE=async).
+Run once from the crime_report_backend directory.
+"""
+from sqlalchemy import text
+from app.database import engine
+
+def add_media_status_column():
+    print("Initiating database migration for complaints table...")
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("ALTER TABLE complaints ADD COLUMN media_status VARCHAR DEFAULT 'ready';"))
+            conn.commit()
+            print("Successfully added 'media_status' column to 'complaints' table.")
+    except Exception as e:
+        print(f"Migration error (column might already exist): {e}")
+
+if __name__ == "__main__":
+    add_media_status_column()
@@ -0,0 +1,27 @@
+"""
+Migration: Add the 'attempts' column to otps (wrong codes entered, see
+app/otp_store.py) and an index on expires_at for the expired-row sweep.
+Run once from the crime_report_backend directory.
+"""
+from sqlalchemy import text
+from app.database import engine
+
+def add_otp_attempts_column():
+    print("Initiating database migration for otps table...")
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("ALTER TABLE otps ADD COLUMN attempts INTEGER DEFAULT 0;"))
+            conn.commit()
+            print("Successfully added 'attempts' column to 'otps' table.")
+    except Exception as e:
+        print(f"Migration error (column might already exist): {e}")
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("CREATE INDEX IF NOT EXISTS ix_otps_expires_at ON otps (expires_at);"))
+            conn.commit()
+            print("Success: 'ix_otps_expires_at' is in place.")
+    except Exception as e:
+        print(f"Migration error: {e}")
+
+if __name__ == "__main__":
+    add_otp_attempts_column()
@@ -0,0 +1,28 @@
+"""
+Migration: Add the responders table and sos_alerts.responder_id used for
+dispatch (see app/dispatch.py). Works on both SQLite and PostgreSQL.
+Run once from the crime_report_backend directory.
+"""
+from sqlalchemy import inspect, text
+from app.database import engine
+from app import models
+
+def add_responders():
+    print("Adding responders and sos_alerts.responder_id...")
+    try:
+        models.Responder.__table__.create(bind=engine, checkfirst=True)
+        columns = [c["name"] for c in inspect(engine).get_columns("sos_alerts")]
+        with engine.connect() as conn:
+            if "responder_id" in columns:
+                print("'sos_alerts.responder_id' already exists.")
+            else:
+                conn.execute(text("ALTER TABLE sos_alerts ADD COLUMN responder_id INTEGER REFERENCES responders (id)"))
+                conn.execute(text("CREATE INDEX IF NOT EXISTS ix_sos_alerts_responder_id ON sos_alerts (responder_id)"))
+                print("Added 'sos_alerts.responder_id'.")
+            conn.commit()
+        print("Success: register responders with POST /responders/ and start their heartbeats.")
+    except Exception as e:
+        print(f"Migration error: {e}")
+
+if __name__ == "__main__":
+    add_responders()
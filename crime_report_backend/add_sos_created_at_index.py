@@ -0,0 +1,23 @@
+"""
+Migration: Add the (created_at, id) composite index that lets /sos/all and
+/sos/export read newest first without sorting. Works on both SQLite and PostgreSQL.
+Run once from the crime_report_backend directory.
+"""
+from sqlalchemy import text
+from app.database import engine
+
+def add_sos_created_at_index():
+    print("Creating newest-first index on sos_alerts...")
+    try:
+        with engine.connect() as conn:
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_sos_alerts_created_at_id "
+                "ON sos_alerts (created_at, id);"
+            ))
+            conn.commit()
+            print("Success: 'ix_sos_alerts_created_at_id' is in place.")
+    except Exception as e:
+        print(f"Migration error: {e}")
+
+if __name__ == "__main__":
+    add_sos_created_at_index()
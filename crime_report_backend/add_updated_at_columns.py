@@ -0,0 +1,38 @@
+"""
+Migration: Add 'updated_at' to complaints and sos_alerts for the
+/complaints/changes and /sos/changes feeds, and to users and incidents for
+the ETags in app/http_cache.py. Existing rows are backfilled from
+created_at (last_seen for incidents). Works on both SQLite and PostgreSQL.
+Run once from the crime_report_backend directory.
+"""
+from sqlalchemy import text
+from app.database import engine
+
+# Table -> column the backfill copies from
+TABLES = {"complaints": "created_at", "sos_alerts": "created_at", "users": "created_at", "incidents": "last_seen"}
+
+def add_updated_at_columns():
+    column_type = "TIMESTAMP WITH TIME ZONE" if engine.dialect.name == "postgresql" else "DATETIME"
+    for table, source in TABLES.items():
+        print(f"Migrating '{table}'...")
+        try:
+            with engine.connect() as conn:
+                conn.execute(text(f"ALTER TABLE {table} ADD COLUMN updated_at {column_type};"))
+                conn.commit()
+                print(f"Added 'updated_at' column to '{table}'.")
+        except Exception as e:
+            print(f"Migration error (column might already exist): {e}")
+
+        try:
+            with engine.connect() as conn:
+                conn.execute(text(f"UPDATE {table} SET updated_at = {source} WHERE updated_at IS NULL;"))
+                conn.execute(text(
+                    f"CREATE INDEX IF NOT EXISTS ix_{table}_updated_at_id ON {table} (updated_at, id);"
+                ))
+                conn.commit()
+                print(f"Backfilled and indexed '{table}.updated_at'.")
+        except Exception as e:
+            print(f"Backfill error: {e}")
+
+if __name__ == "__main__":
+    add_updated_at_columns()
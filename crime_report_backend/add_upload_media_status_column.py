@@ -0,0 +1,21 @@
+"""
+Migration: Add 'media_status' column to upload_sessions, set while a finished
+resumable upload is pushed to the media store in the background
+(MEDIA_UPLOAD_MODE=async).
+Run once from the crime_report_backend directory.
+"""
+from sqlalchemy import text
+from app.database import engine
+
+def add_upload_media_status_column():
+    print("Initiating database migration for upload_sessions table...")
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("ALTER TABLE upload_sessions ADD COLUMN media_status VARCHAR;"))
+            conn.commit()
+            print("Successfully added 'media_status' column to 'upload_sessions' table.")
+    except Exception as e:
+        print(f"Migration error (column might already exist): {e}")
+
+if __name__ == "__main__":
+    add_upload_media_status_column()
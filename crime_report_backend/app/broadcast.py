@@ -0,0 +1,207 @@
+import asyncio
+import json
+import os
+import select
+import threading
+
+from . import log, metrics
+
+logger = log.get_logger(__name__)
+
+# Per-subscriber buffer. A dispatcher that falls this far behind is evicted
+# instead of slowing down delivery to everyone else.
+SUBSCRIBER_QUEUE_SIZE = int(os.getenv("BROADCAST_QUEUE_SIZE", "100"))
+# libpq sslmode for the LISTEN/NOTIFY connection; an sslmode in the DSN wins
+BROADCAST_SSLMODE = os.getenv("BROADCAST_SSLMODE", "require")
+
+class Subscriber:
+    """A single connected client (e.g. one open dispatcher dashboard)."""
+
+    def __init__(self, queue_size: int):
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.evicted = False
+
+    async def get(self):
+        """Wait for the next message. Returns None once the subscriber is evicted."""
+        return await self.queue.get()
+
+class LocalBackend:
+    """
+    In-process pub/sub. Messages only reach subscribers connected to this
+    worker, which is all you need with a single uvicorn process.
+    """
+
+    def start(self, deliver):
+        self._deliver = deliver
+
+    def publish(self, message: dict):
+        self._deliver(message)
+
+    def stop(self):
+        pass
+
+class PostgresNotifyBackend:
+    """
+    Pub/sub over Postgres LISTEN/NOTIFY so several uvicorn workers share one
+    stream: every worker publishes with pg_notify and every worker's listener
+    thread fans the message out to its own subscribers.
+    """
+
+    def __init__(self, dsn: str, channel: str):
+        self.dsn = dsn
+        self.channel = channel
+        self._publish_conn = None
+        self._publish_lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def _connect(self):
+        import psycopg2
+        import psycopg2.extensions
+        from sqlalchemy.engine import make_url
+
+        # The DSN is usually the SQLAlchemy URL, whose "postgresql+psycopg2://" scheme libpq rejects
+        url = make_url(self.dsn).set(drivername="postgresql")
+        if "sslmode" not in url.query:
+            url = url.update_query_dict({"sslmode": BROADCAST_SSLMODE})
+        conn = psycopg2.connect(url.render_as_string(hide_password=False))
+        conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+        return conn
+
+    def start(self, deliver):
+        self._deliver = deliver
+        self._stopped.clear()
+        self._listener = threading.Thread(target=self._listen, name="broadcast-listener", daemon=True)
+        self._listener.start()
+
+    def _listen(self):
+        while not self._stopped.is_set():
+            try:
+                conn = self._connect()
+                conn.cursor().execute(f"LISTEN {self.channel};")
+                while not self._stopped.is_set():
+                    if select.select([conn], [], [], 5) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        self._deliver(json.loads(notify.payload))
+                conn.close()
+            except Exception as e:
+                logger.warning("Broadcast listener error, reconnecting", extra={"error": str(e)})
+                self._stopped.wait(1)
+
+    def publish(self, message: dict):
+        with self._publish_lock:
+            try:
+                if self._publish_conn is None or self._publish_conn.closed:
+                    self._publish_conn = self._connect()
+                self._publish_conn.cursor().execute(
+                    "SELECT pg_notify(%s, %s);", (self.channel, json.dumps(message))
+                )
+            except Exception as e:
+                self._publish_conn = None
+                logger.warning("Broadcast publish failed", extra={"error": str(e)})
+
+    def stop(self):
+        self._stopped.set()
+        if self._publish_conn is not None:
+            self._publish_conn.close()
+
+class BroadcastHub:
+    """
+    Fans published messages out to every connected subscriber on this worker.
+
+    publish() is safe to call from sync route handlers running in the
+    threadpool; delivery itself always happens on the event loop. Each
+    subscriber has a bounded queue and is evicted if it fills up.
+    """
+
+    def __init__(self, backend, queue_size: int = SUBSCRIBER_QUEUE_SIZE):
+        self.backend = backend
+        self.queue_size = queue_size
+        self.subscribers: set[Subscriber] = set()
+        self.evictions = 0
+        self._loop = None
+
+    def start(self):
+        self._loop = asyncio.get_running_loop()
+        self.backend.start(self._deliver_threadsafe)
+
+    def stop(self):
+        self.backend.stop()
+        for subscriber in list(self.subscribers):
+            self._evict(subscriber)
+        self._loop = None
+
+    def subscribe(self) -> Subscriber:
+        subscriber = Subscriber(self.queue_size)
+        self.subscribers.add(subscriber)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber):
+        self.subscribers.discard(subscriber)
+
+    def publish(self, event: str, data: dict, event_id: str | None = None):
+        """Publish a message to all subscribers on all workers sharing the backend."""
+        if self._loop is None:
+            return
+        self.backend.publish({"event": event, "id": event_id, "data": data})
+
+    def _deliver_threadsafe(self, message: dict):
+        loop = self._loop
+        if loop is None:
+            return
+        try:
+            if asyncio.get_running_loop() is loop:
+                self._fan_out(message)
+                return
+        except RuntimeError:
+            pass
+        loop.call_soon_threadsafe(self._fan_out, message)
+
+    def _fan_out(self, message: dict):
+        for subscriber in list(self.subscribers):
+            try:
+                subscriber.queue.put_nowait(message)
+            except asyncio.QueueFull:
+                self._evict(subscriber)
+
+    def _evict(self, subscriber: Subscriber):
+        """Drop a slow consumer: discard its backlog and wake it up with None."""
+        self.subscribers.discard(subscriber)
+        if subscriber.evicted:
+            return
+        subscriber.evicted = True
+        self.evictions += 1
+        while not subscriber.queue.empty():
+            subscriber.queue.get_nowait()
+        subscriber.queue.put_nowait(None)
+
+def format_sse(message: dict) -> str:
+    """Render a hub message as a Server-Sent Events frame."""
+    frame = f"event: {message['event']}\n"
+    if message.get("id"):
+        frame += f"id: {message['id']}\n"
+    return frame + f"data: {json.dumps(message['data'])}\n\n"
+
+def _create_backend():
+    from .database import SQLALCHEMY_DATABASE_URL
+
+    backend = os.getenv("BROADCAST_BACKEND", "local")
+    if backend == "postgres":
+        # LISTEN needs a session-level connection; behind PgBouncer in
+        # transaction mode, point BROADCAST_DATABASE_URL at Postgres directly.
+        dsn = os.getenv("BROADCAST_DATABASE_URL", SQLALCHEMY_DATABASE_URL)
+        return PostgresNotifyBackend(dsn, channel="sos_events")
+    return LocalBackend()
+
+# Hub used by the SOS router for live dispatcher updates
+sos_hub = BroadcastHub(_create_backend())
+
+def _stream_metrics():
+    return [
+        ("sos_stream_subscribers", "gauge", "Open /sos/stream connections on this worker.", (), {(): len(sos_hub.subscribers)}),
+        ("sos_stream_evictions_total", "counter", "Slow /sos/stream consumers dropped.", (), {(): sos_hub.evictions}),
+    ]
+
+metrics.REGISTRY.add_collector(_stream_metrics)
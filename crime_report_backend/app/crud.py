@@ -1,84 +1,280 @@
+import math
+import os
+from datetime import timedelta
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from . import models, schemas, utils
+from sqlalchemy import and_, func, or_
+from . import geo, http_cache, models, otp_store, schemas, utils
+
+def normalize_email(email: str) -> str:
+    """Canonical form stored in users.email (and everything that references it)."""
+    return email.strip().lower()
 
 def get_user_by_email(db: Session, email: str):
-    email = email.strip()
-    # Try exact match
-    user = db.query(models.User).filter(models.User.email == email).first()
-    if user:
-        return user
-        
-    # Try case-insensitive
-    from sqlalchemy import func
-    return db.query(models.User).filter(func.lower(models.User.email) == email.lower()).first()
-
-def create_user(db: Session, user: schemas.UserCreate):
-    hashed_password = utils.get_password_hash(user.password)
+    # Emails are normalized on write, so this is a single lookup on the unique index
+    return db.query(models.User).filter(models.User.email == normalize_email(email)).first()
+
+async def create_user(db: Session, user: schemas.UserCreate):
+    # Hashing runs in the dedicated process pool; only the insert uses a thread
+    hashed_password = await utils.password_hasher.hash(user.password)
     db_user = models.User(
-        email=user.email, 
+        email=normalize_email(user.email),
         hashed_password=hashed_password,
         aadhaar_number=user.aadhaar_number,
         phone_number=user.phone_number,
         name=user.name
     )
-    db.add(db_user)
+
+    def insert():
+        db.add(db_user)
+        http_cache.bump(db, "users")
+        db.commit()
+        db.refresh(db_user)
+        return db_user
+
+    return await run_in_threadpool(insert)
+
+def update_password_hash(db: Session, user_id: int, hashed_password: str):
+    db.query(models.User).filter(models.User.id == user_id).update({"hashed_password": hashed_password})
     db.commit()
-    db.refresh(db_user)
-    return db_user
 
-def get_user_complaints(db: Session, user_email: str):
-    return db.query(models.Complaint).filter(models.Complaint.user_email == user_email).all()
+def increment_complaint_count(db: Session, user_id: int):
+    """Bump a user's complaint_count. Call before committing the new complaint."""
+    db.query(models.User).filter(models.User.id == user_id).update(
+        {"complaint_count": models.User.complaint_count + 1}, synchronize_session=False
+    )
+    http_cache.bump(db, "users")
+
+def get_users_page(db: Session, limit: int, before_id: int | None = None, search: str | None = None,
+                   columns: list | None = None):
+    """
+    Return one page of users, newest first, using keyset pagination on id.
+    `search` matches a prefix of the email or (case-insensitively) the name.
+    With `columns`, rows are tuples of those columns instead of User objects.
+    """
+    query = db.query(*columns) if columns else db.query(models.User)
+    if before_id:
+        query = query.filter(models.User.id < before_id)
+    if search:
+        prefix = search.strip().lower().replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+        query = query.filter(or_(
+            models.User.email.like(prefix, escape="\\"),
+            func.lower(models.User.name).like(prefix, escape="\\"),
+        ))
+    rows = query.order_by(models.User.id.desc()).limit(limit + 1).all()
+    return rows[:limit], len(rows) > limit
+
+def get_user_complaints(db: Session, user_email: str, columns: list | None = None):
+    query = db.query(*columns) if columns else db.query(models.Complaint)
+    return query.filter(models.Complaint.user_email == user_email).all()
+
+def complaint_filters(status=None, crime_type=None, created_after=None, created_before=None) -> list:
+    """WHERE clauses for the filters /complaints/all and /complaints/export share."""
+    return _common_filters(models.Complaint, status, created_after, created_before) + (
+        [models.Complaint.crime_type == crime_type] if crime_type else []
+    )
+
+def sos_filters(status=None, created_after=None, created_before=None) -> list:
+    return _common_filters(models.SOSAlert, status, created_after, created_before)
+
+def _common_filters(model, status, created_after, created_before) -> list:
+    filters = []
+    if status:
+        filters.append(model.status == status)
+    if created_after:
+        filters.append(model.created_at >= created_after)
+    if created_before:
+        filters.append(model.created_at < created_before)
+    return filters
+
+def get_complaints_page(
+    db: Session,
+    limit: int,
+    cursor: tuple | None = None,
+    status: str | None = None,
+    crime_type: str | None = None,
+    created_after=None,
+    created_before=None,
+    columns: list | None = None,
+):
+    """
+    Return one page of complaints, newest first, using keyset pagination on
+    (created_at, id). `cursor` is the (created_at, id) of the last row of the
+    previous page. Fetches limit + 1 rows so the caller knows if more exist.
+    With `columns` (which must include created_at and id), rows are tuples.
+    """
+    query = (db.query(*columns) if columns else db.query(models.Complaint)).filter(*complaint_filters(status, crime_type, created_after, created_before))
+    if cursor:
+        last_created_at, last_id = cursor
+        # The leading `<=` gives the planner a range bound on the composite index
+        query = query.filter(
+            models.Complaint.created_at <= last_created_at,
+            or_(
+                models.Complaint.created_at < last_created_at,
+                models.Complaint.id < last_id,
+            ),
+        )
+    rows = (
+        query.order_by(models.Complaint.created_at.desc(), models.Complaint.id.desc())
+        .limit(limit + 1)
+        .all()
+    )
+    return rows[:limit], len(rows) > limit
 
-import random
-import datetime
+# /changes re-reads this far behind the cursor. updated_at is stamped when a row is
+# written, not when it commits, so a slow transaction can become visible behind a
+# cursor a poller has already moved past; keep this above the longest write transaction.
+CHANGES_OVERLAP_SECONDS = float(os.getenv("CHANGES_OVERLAP_SECONDS", "5"))
+
+def get_changes_since(db: Session, model, limit: int, cursor: tuple | None = None):
+    """
+    Return (rows, has_more, next_cursor) for rows of `model` created or updated
+    after `cursor`, oldest change first, using keyset pagination on (updated_at, id).
+    Works for any model with an indexed `updated_at` column (Complaint, SOSAlert).
+
+    With a cursor, up to `limit` rows from the CHANGES_OVERLAP_SECONDS before it
+    come back first, so rows that committed after the previous poll are not lost.
+    Those may repeat rows already delivered: clients dedupe on (id, updated_at).
+    next_cursor is the last row past the cursor (None if there is none), so it
+    never moves backwards.
+    """
+    query = db.query(model).filter(model.updated_at.isnot(None))
+    order = (model.updated_at.asc(), model.id.asc())
+    overlap = []
+    if cursor:
+        last_updated_at, last_id = cursor
+        overlap = (
+            query.filter(
+                model.updated_at >= last_updated_at - timedelta(seconds=CHANGES_OVERLAP_SECONDS),
+                model.updated_at <= last_updated_at,
+                or_(model.updated_at < last_updated_at, model.id <= last_id),
+            )
+            .order_by(*order)
+            .limit(limit)
+            .all()
+        )
+        query = query.filter(
+            model.updated_at >= last_updated_at,
+            or_(model.updated_at > last_updated_at, model.id > last_id),
+        )
+    rows = query.order_by(*order).limit(limit + 1).all()
+    page = rows[:limit]
+    next_cursor = (page[-1].updated_at, page[-1].id) if page else None
+    return overlap + page, len(rows) > limit, next_cursor
+
+# /near searches this radius first and widens it only when it holds too few rows
+NEAR_FIRST_RADIUS_M = 1000
+
+def _points_in_bbox_query(db: Session, model, bbox: tuple, created_after=None, created_before=None,
+                          columns: list | None = None):
+    """
+    Rows of `model` inside bbox = (min_lat, min_lon, max_lat, max_lon), unordered.
+
+    The box is covered with a few geohash prefixes, each turned into an
+    indexed range scan on `geohash`; the exact box is then checked on the
+    numeric columns.
+    """
+    min_lat, min_lon, max_lat, max_lon = bbox
+    ranges = []
+    for prefix in geo.cover_bbox(min_lat, min_lon, max_lat, max_lon):
+        upper = geo.prefix_upper_bound(prefix)
+        if upper is None:
+            ranges.append(model.geohash >= prefix)
+        else:
+            ranges.append(and_(model.geohash >= prefix, model.geohash < upper))
+    query = (db.query(*columns) if columns else db.query(model)).filter(
+        or_(*ranges),
+        model.latitude.between(min_lat, max_lat),
+        model.longitude.between(min_lon, max_lon),
+    )
+    if created_after:
+        query = query.filter(model.created_at >= created_after)
+    if created_before:
+        query = query.filter(model.created_at < created_before)
+    return query
+
+def get_points_in_bbox(
+    db: Session,
+    model,
+    bbox: tuple,
+    limit: int,
+    created_after=None,
+    created_before=None,
+    columns: list | None = None,
+):
+    """
+    Return rows of `model` (Complaint or SOSAlert) located inside
+    bbox = (min_lat, min_lon, max_lat, max_lon), newest first.
+    With `columns`, rows are tuples of those columns instead of model objects.
+    """
+    query = _points_in_bbox_query(db, model, bbox, created_after, created_before, columns)
+    return query.order_by(model.created_at.desc()).limit(limit).all()
+
+def get_points_near(
+    db: Session,
+    model,
+    latitude: float,
+    longitude: float,
+    radius_m: float,
+    limit: int,
+    created_after=None,
+    created_before=None,
+    columns: list | None = None,
+):
+    """
+    Return rows of `model` within `radius_m` metres of a point, nearest first.
+
+    The search starts NEAR_FIRST_RADIUS_M around the point and widens until
+    it holds `limit` rows or reaches `radius_m`, so a large radius over dense
+    data still reads only a small box. Within each box the database ranks rows
+    by a flat-earth distance (plain arithmetic, so it runs on SQLite and
+    Postgres alike) and returns only the nearest few; the exact haversine
+    distance then filters and orders those. At most 2 * limit rows are loaded.
+    """
+    search_m = min(NEAR_FIRST_RADIUS_M, radius_m)
+    while True:
+        nearby = _nearest_within(db, model, latitude, longitude, search_m, limit, created_after, created_before, columns)
+        # Everything outside the searched circle is farther than what it holds
+        if len(nearby) >= limit or search_m >= radius_m:
+            return nearby
+        search_m = min(search_m * 4, radius_m)
+
+def _nearest_within(db: Session, model, latitude, longitude, radius_m, limit, created_after, created_before, columns):
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    d_lat = model.latitude - latitude
+    d_lon = (model.longitude - longitude) * cos_lat
+    squared_degrees = d_lat * d_lat + d_lon * d_lon
+    radius_degrees = math.degrees(radius_m / geo.EARTH_RADIUS_M)
+    candidates = (
+        _points_in_bbox_query(
+            db,
+            model,
+            geo.radius_bbox(latitude, longitude, radius_m),
+            created_after,
+            created_before,
+            # Trailing copies for the distance check; RowsResponse ignores columns past its schema
+            columns + [model.latitude, model.longitude] if columns else None,
+        )
+        # 1% slack: the flat approximation may put a point on the rim just outside
+        .filter(squared_degrees <= (radius_degrees * 1.01) ** 2)
+        .order_by(squared_degrees)
+        # Twice the page, in case the approximation swaps the order of near ties
+        .limit(limit * 2)
+        .all()
+    )
+    nearby = []
+    for row in candidates:
+        distance = geo.haversine_m(latitude, longitude, row.latitude, row.longitude)
+        if distance <= radius_m:
+            nearby.append((distance, row))
+    nearby.sort(key=lambda pair: pair[0])
+    return [row for _, row in nearby[:limit]]
 
 def create_otp(db: Session, email: str, fixed_otp: str = None):
-    if fixed_otp:
-        otp = fixed_otp
-    else:
-        otp = str(random.randint(10000, 99999))
-    # 5 minutes expiry (Timezone Aware)
-    expires_at = datetime.datetime.now(datetime.timezone.utc) + datetime.timedelta(minutes=5)
-    
-    db_otp = db.query(models.OTP).filter(models.OTP.email == email).first()
-    if db_otp:
-        db_otp.otp = otp
-        db_otp.expires_at = expires_at
-        db_otp.is_verified = False
-    else:
-        db_otp = models.OTP(email=email, otp=otp, expires_at=expires_at)
-        db.add(db_otp)
-    
-    db.commit()
-    db.refresh(db_otp)
-    return db_otp.otp
+    return otp_store.otp_service.issue(db, normalize_email(email), fixed_otp)
 
 def verify_otp(db: Session, email: str, otp: str):
-    db_otp = db.query(models.OTP).filter(models.OTP.email == email).first()
-    if not db_otp:
-        return False
-    
-    if db_otp.otp != otp:
-        return False
-        
-    # Ensure comparison is timezone-aware
-    now = datetime.datetime.now(datetime.timezone.utc)
-    
-    # Handle case where DB might return naive time (SQLite) vs Aware (Postgres)
-    expires_at = db_otp.expires_at
-    if expires_at.tzinfo is None:
-        # If DB time is naive, assume it is UTC and make it aware
-        expires_at = expires_at.replace(tzinfo=datetime.timezone.utc)
-        
-    if expires_at < now:
-        return False
-        
-    db_otp.is_verified = True
-    db.commit()
-    return True
+    return otp_store.otp_service.verify(db, normalize_email(email), otp)
 
 def is_email_verified(db: Session, email: str):
-    db_otp = db.query(models.OTP).filter(models.OTP.email == email).first()
-    if not db_otp:
-        return False
-    return db_otp.is_verified
+    return otp_store.otp_service.is_verified(db, normalize_email(email))
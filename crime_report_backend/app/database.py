@@ -1,46 +1,283 @@
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, event, exc
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+from sqlalchemy.pool import AsyncAdaptedQueuePool, QueuePool
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 
 import os
+import time
 from dotenv import load_dotenv
 
+from . import db_stats, log, metrics
+
 load_dotenv()
 
+logger = log.get_logger(__name__)
+
 # Use env var or fallback to sqlite
 SQLALCHEMY_DATABASE_URL = os.getenv("DATABASE_URL", "sqlite:///./crime_report.db")
 
-# DIAGNOSTIC: Print masked DB URL
+# DIAGNOSTIC: Log masked DB URL
 if "sqlite" in SQLALCHEMY_DATABASE_URL:
-    print(f"✅ Connected DB: SQLite ({SQLALCHEMY_DATABASE_URL})")
+    logger.info("Connected DB", extra={"database": f"SQLite ({SQLALCHEMY_DATABASE_URL})"})
 else:
     # Mask password for safety
     try:
         url_parts = SQLALCHEMY_DATABASE_URL.split("@")
         if len(url_parts) > 1:
             masked_url = f"{url_parts[0].split(':')[0]}:***@{url_parts[1]}"
-            print(f"✅ Connected DB: {masked_url}")
+            logger.info("Connected DB", extra={"database": masked_url})
         else:
-            print(f"✅ Connected DB: {SQLALCHEMY_DATABASE_URL}") # Fallback if format differs
+            logger.info("Connected DB", extra={"database": SQLALCHEMY_DATABASE_URL})  # Fallback if format differs
     except Exception:
-        print("✅ Connected DB: PostgreSQL (URL masked)")
+        logger.info("Connected DB", extra={"database": "PostgreSQL (URL masked)"})
 
-connect_args = {}
-if "sqlite" in SQLALCHEMY_DATABASE_URL:
-    connect_args = {"check_same_thread": False}
-else:
-    connect_args = {"sslmode": "require"}
+def env_flag(name: str, default: str = "false") -> bool:
+    return os.getenv(name, default).strip().lower() in ("1", "true", "yes", "on")
+
+# Connection pool. Each app worker process gets its own pool, so the server
+# sees up to WEB_CONCURRENCY * (DB_POOL_SIZE + DB_MAX_OVERFLOW) connections.
+WEB_CONCURRENCY = int(os.getenv("WEB_CONCURRENCY", "1"))
+DB_POOL_SIZE = int(os.getenv("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+# Total connections the database allows this service; overrides the two above
+DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", "0"))
+# Seconds a request waits for a free connection before failing
+DB_POOL_TIMEOUT = float(os.getenv("DB_POOL_TIMEOUT", "10"))
+# Replace connections older than this, before the provider's idle timeout kills them
+DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", "300"))
+# Test each connection on checkout and reconnect transparently if it was dropped
+DB_POOL_PRE_PING = env_flag("DB_POOL_PRE_PING", "true")
+DB_CONNECT_TIMEOUT = int(os.getenv("DB_CONNECT_TIMEOUT", "10"))
+# Postgres cancels any statement running longer than this (0 disables)
+DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", "30000"))
+# Set when DATABASE_URL points at PgBouncer in transaction pooling mode
+DB_PGBOUNCER = env_flag("DB_PGBOUNCER")
+# Connections set aside for SOS creation (reserved_session()), on top of the
+# pool above, so an alert never queues behind other requests for one
+DB_RESERVED_POOL_SIZE = int(os.getenv("DB_RESERVED_POOL_SIZE", "4"))
+
+if DB_MAX_CONNECTIONS:
+    per_worker = max(1, DB_MAX_CONNECTIONS // WEB_CONCURRENCY - DB_RESERVED_POOL_SIZE)
+    DB_POOL_SIZE = max(1, per_worker * 2 // 3)
+    DB_MAX_OVERFLOW = per_worker - DB_POOL_SIZE
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait to check out a connection."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
+    def recreate(self):
+        # Keep counting across pool recreation (engine.dispose())
+        pool = super().recreate()
+        pool.checkouts, pool.timeouts = self.checkouts, self.timeouts
+        pool.wait_seconds_total, pool.wait_seconds_max = self.wait_seconds_total, self.wait_seconds_max
+        return pool
+
+class InstrumentedAsyncQueuePool(InstrumentedQueuePool, AsyncAdaptedQueuePool):
+    """Same checkout accounting for the asyncio engine's pool."""
+
+def pool_stats(bind=None) -> dict:
+    """Pool occupancy and checkout wait times, for /debug/pool-stats and metrics."""
+    pool = (bind or engine).pool
+    stats = {"pool_class": type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "size": pool.size(),
+            "max_overflow": pool._max_overflow,
+            "checked_out": pool.checkedout(),
+            "idle": pool.checkedin(),
+            "overflow": max(0, pool.overflow()),
+        })
+    if isinstance(pool, InstrumentedQueuePool):
+        stats.update({
+            "checkouts": pool.checkouts,
+            "timeouts": pool.timeouts,
+            "wait_ms_avg": round(pool.wait_seconds_total / pool.checkouts * 1000, 3) if pool.checkouts else 0.0,
+            "wait_ms_max": round(pool.wait_seconds_max * 1000, 3),
+        })
+    return stats
+
+def _set_local_statement_timeout(new_engine):
+    # PgBouncer rejects statement_timeout as a startup parameter, and a plain
+    # SET would leak to other clients sharing the server connection, so the
+    # timeout is applied per transaction instead.
+    @event.listens_for(new_engine, "begin")
+    def set_statement_timeout(conn):
+        conn.exec_driver_sql(f"SET LOCAL statement_timeout = {DB_STATEMENT_TIMEOUT_MS}")
+
+def build_engine(url: str, **overrides):
+    """Create an engine with the pool settings above (keyword overrides win)."""
+    if url.startswith("sqlite"):
+        options = {"connect_args": {"check_same_thread": False}}
+        if ":memory:" not in url and url != "sqlite://":
+            options.update(poolclass=InstrumentedQueuePool, pool_size=DB_POOL_SIZE, max_overflow=DB_MAX_OVERFLOW,
+                           pool_timeout=DB_POOL_TIMEOUT)
+        options.update(overrides)
+        return create_engine(url, **options)
+
+    connect_args = {"sslmode": "require", "connect_timeout": DB_CONNECT_TIMEOUT}
+    if DB_STATEMENT_TIMEOUT_MS and not DB_PGBOUNCER:
+        connect_args["options"] = f"-c statement_timeout={DB_STATEMENT_TIMEOUT_MS}"
+    if DB_PGBOUNCER and url.startswith("postgresql+psycopg:"):
+        # psycopg 3 prepares repeated statements server-side, which breaks when
+        # PgBouncer hands the next transaction to another server connection.
+        # psycopg2 (the default driver) never prepares server-side.
+        connect_args["prepare_threshold"] = None
+    options = {
+        "connect_args": connect_args,
+        "poolclass": InstrumentedQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    options.update(overrides)
+    new_engine = create_engine(url, **options)
 
-engine = create_engine(
-    SQLALCHEMY_DATABASE_URL, connect_args=connect_args
-)
+    if DB_STATEMENT_TIMEOUT_MS and DB_PGBOUNCER:
+        _set_local_statement_timeout(new_engine)
+    return new_engine
+
+def async_url(url: str) -> str:
+    """The asyncio-driver equivalent of a sync DATABASE_URL (aiosqlite / asyncpg)."""
+    parsed = make_url(url)
+    if parsed.get_backend_name() == "sqlite":
+        return parsed.set(drivername="sqlite+aiosqlite").render_as_string(hide_password=False)
+    parsed = parsed.set(drivername="postgresql+asyncpg").difference_update_query(["sslmode"])
+    if DB_PGBOUNCER:
+        # asyncpg prepares every statement server-side; PgBouncer can't route those
+        parsed = parsed.update_query_dict({"prepared_statement_cache_size": "0"})
+    return parsed.render_as_string(hide_password=False)
+
+def build_async_engine(url: str, **overrides):
+    """Async engine for the read-heavy endpoints, with the same pool settings as build_engine()."""
+    if url.startswith("sqlite"):
+        options = {"poolclass": InstrumentedAsyncQueuePool, "pool_size": DB_POOL_SIZE,
+                   "max_overflow": DB_MAX_OVERFLOW, "pool_timeout": DB_POOL_TIMEOUT}
+        options.update(overrides)
+        return create_async_engine(async_url(url), **options)
+
+    connect_args = {"ssl": "require", "timeout": DB_CONNECT_TIMEOUT}
+    if DB_STATEMENT_TIMEOUT_MS and not DB_PGBOUNCER:
+        connect_args["server_settings"] = {"statement_timeout": str(DB_STATEMENT_TIMEOUT_MS)}
+    if DB_PGBOUNCER:
+        connect_args["statement_cache_size"] = 0
+    options = {
+        "connect_args": connect_args,
+        "poolclass": InstrumentedAsyncQueuePool,
+        "pool_size": DB_POOL_SIZE,
+        "max_overflow": DB_MAX_OVERFLOW,
+        "pool_timeout": DB_POOL_TIMEOUT,
+        "pool_recycle": DB_POOL_RECYCLE,
+        "pool_pre_ping": DB_POOL_PRE_PING,
+    }
+    options.update(overrides)
+    new_engine = create_async_engine(async_url(url), **options)
+    if DB_STATEMENT_TIMEOUT_MS and DB_PGBOUNCER:
+        _set_local_statement_timeout(new_engine.sync_engine)
+    return new_engine
+
+engine = build_engine(SQLALCHEMY_DATABASE_URL)
+db_stats.instrument(engine)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
 Base = declarative_base()
 
 def get_db():
+    """The one session dependency for sync endpoints; its queries show up in db_stats."""
     db = SessionLocal()
     try:
         yield db
     finally:
         db.close()
+
+_reserved_engine = None
+_ReservedSessionLocal = None
+
+def reserved_session():
+    """A session on the reserved pool (DB_RESERVED_POOL_SIZE connections). Close it when done."""
+    global _reserved_engine, _ReservedSessionLocal
+    if _ReservedSessionLocal is None:
+        if ":memory:" in SQLALCHEMY_DATABASE_URL or SQLALCHEMY_DATABASE_URL == "sqlite://":
+            # Another pool would open another, empty, in-memory database
+            _ReservedSessionLocal = SessionLocal
+        else:
+            _reserved_engine = build_engine(SQLALCHEMY_DATABASE_URL, pool_size=DB_RESERVED_POOL_SIZE, max_overflow=0)
+            db_stats.instrument(_reserved_engine)
+            _ReservedSessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=_reserved_engine)
+    return _ReservedSessionLocal()
+
+# Created on first use, so deployments that never hit an async endpoint
+# don't need the asyncio driver (aiosqlite / asyncpg) installed.
+_async_engine = None
+_AsyncSessionLocal = None
+
+def get_async_engine():
+    global _async_engine, _AsyncSessionLocal
+    if _async_engine is None:
+        _async_engine = build_async_engine(SQLALCHEMY_DATABASE_URL)
+        db_stats.instrument(_async_engine.sync_engine)
+        _AsyncSessionLocal = async_sessionmaker(_async_engine, expire_on_commit=False, autoflush=False)
+    return _async_engine
+
+async def get_async_db():
+    """Like get_db(), but the session runs on the event loop instead of a threadpool thread."""
+    get_async_engine()
+    async with _AsyncSessionLocal() as db:
+        yield db
+
+def _pool_metrics():
+    pools = {"sync": pool_stats()}
+    if _reserved_engine is not None:
+        pools["reserved"] = pool_stats(_reserved_engine)
+    if _async_engine is not None:
+        pools["async"] = pool_stats(_async_engine)
+    families = []
+    for name, key, kind, documentation in (
+        ("db_pool_size", "size", "gauge", "Connections the pool keeps open."),
+        ("db_pool_checked_out", "checked_out", "gauge", "Connections currently in use."),
+        ("db_pool_overflow", "overflow", "gauge", "Connections open beyond the pool size."),
+        ("db_pool_checkouts_total", "checkouts", "counter", "Connection checkouts."),
+        ("db_pool_checkout_timeouts_total", "timeouts", "counter", "Checkouts that gave up waiting."),
+        ("db_pool_checkout_wait_ms_max", "wait_ms_max", "gauge", "Longest checkout wait since startup."),
+    ):
+        samples = {(engine_name,): stats[key] for engine_name, stats in pools.items() if key in stats}
+        families.append((name, kind, documentation, ("engine",), samples))
+    wait_total = {
+        (engine_name,): pool.wait_seconds_total
+        for engine_name, pool in (("sync", engine.pool), ("reserved", _reserved_engine and _reserved_engine.pool),
+                                  ("async", _async_engine and _async_engine.pool))
+        if isinstance(pool, InstrumentedQueuePool)
+    }
+    families.append(("db_pool_checkout_wait_seconds_total", "counter",
+                     "Total time spent waiting for a connection.", ("engine",), wait_total))
+    return families
+
+metrics.REGISTRY.add_collector(_pool_metrics)
+
+async def dispose_async_engine():
+    global _async_engine
+    if _async_engine is not None:
+        await _async_engine.dispose()
+        _async_engine = None
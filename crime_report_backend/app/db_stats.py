@@ -0,0 +1,180 @@
+import os
+import re
+import threading
+import time
+from contextvars import ContextVar
+from sqlalchemy import event
+
+# Same statement this many times in one request looks like an N+1 loop
+N_PLUS_ONE_THRESHOLD = int(os.getenv("DB_N_PLUS_ONE_THRESHOLD", "10"))
+# Add X-DB-* headers to every response (the /debug/db-stats totals are kept either way)
+DB_STATS_HEADERS = os.getenv("DB_STATS_HEADERS", "true").strip().lower() in ("1", "true", "yes", "on")
+
+_NUMBERS = re.compile(r"\b\d+\b")
+_UNBOUNDED = re.compile(r"^\s*SELECT\b(?!.*\bWHERE\b)(?!.*\bLIMIT\b)(?!.*\bcount\()", re.IGNORECASE | re.DOTALL)
+
+class RequestDBStats:
+    """Database activity of one request, filled in by the engine and pool events below."""
+
+    __slots__ = ("queries", "db_time", "hold_time", "statements", "flags", "_open")
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.hold_time = 0.0
+        self.statements = {}
+        self.flags = set()
+        self._open = {}  # id(connection record) -> checkout time
+
+    def record_query(self, statement: str, elapsed: float):
+        self.queries += 1
+        self.db_time += elapsed
+        shape = _NUMBERS.sub("?", statement)
+        seen = self.statements.get(shape, 0) + 1
+        self.statements[shape] = seen
+        if seen == N_PLUS_ONE_THRESHOLD:
+            self.flags.add("n_plus_one")
+        if _UNBOUNDED.match(statement):
+            # Whole-table read, e.g. dumping every user while handling one request
+            self.flags.add("unbounded_select")
+
+    def connection_hold(self, now: float) -> float:
+        """Time connections were checked out, counting ones still held."""
+        return self.hold_time + sum(now - started for started in self._open.values())
+
+_current: ContextVar[RequestDBStats | None] = ContextVar("request_db_stats", default=None)
+
+def current() -> RequestDBStats | None:
+    return _current.get()
+
+# --------------------------------------------------
+# ENGINE / POOL EVENTS
+# --------------------------------------------------
+def _before_execute(conn, cursor, statement, parameters, context, executemany):
+    if _current.get() is not None:
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+def _after_execute(conn, cursor, statement, parameters, context, executemany):
+    stats = _current.get()
+    started = conn.info.get("query_started")
+    if stats is not None and started:
+        stats.record_query(statement, time.perf_counter() - started.pop())
+
+def _checkout(dbapi_connection, connection_record, connection_proxy):
+    stats = _current.get()
+    if stats is not None:
+        stats._open[id(connection_record)] = time.perf_counter()
+        connection_record.info["request_db_stats"] = stats
+
+def _checkin(dbapi_connection, connection_record):
+    # The connection may be returned outside the request's context (e.g. on
+    # garbage collection), so use the stats object stored at checkout.
+    stats = connection_record.info.pop("request_db_stats", None)
+    if stats is not None:
+        started = stats._open.pop(id(connection_record), None)
+        if started is not None:
+            stats.hold_time += time.perf_counter() - started
+
+def instrument(engine):
+    """Attach query/connection tracking to a sync engine (or an AsyncEngine's sync_engine)."""
+    event.listen(engine, "before_cursor_execute", _before_execute)
+    event.listen(engine, "after_cursor_execute", _after_execute)
+    event.listen(engine, "checkout", _checkout)
+    event.listen(engine, "checkin", _checkin)
+
+# --------------------------------------------------
+# PER-ROUTE TOTALS
+# --------------------------------------------------
+class RouteTotals:
+    __slots__ = ("requests", "queries", "db_time", "hold_time", "max_queries", "flagged")
+
+    def __init__(self):
+        self.requests = 0
+        self.queries = 0
+        self.db_time = 0.0
+        self.hold_time = 0.0
+        self.max_queries = 0
+        self.flagged = {}
+
+_routes: dict[str, RouteTotals] = {}
+_routes_lock = threading.Lock()
+
+def _add_to_route(route: str, stats: RequestDBStats, hold_time: float):
+    with _routes_lock:
+        totals = _routes.get(route)
+        if totals is None:
+            totals = _routes[route] = RouteTotals()
+        totals.requests += 1
+        totals.queries += stats.queries
+        totals.db_time += stats.db_time
+        totals.hold_time += hold_time
+        totals.max_queries = max(totals.max_queries, stats.queries)
+        for flag in stats.flags:
+            totals.flagged[flag] = totals.flagged.get(flag, 0) + 1
+
+def route_report() -> list[dict]:
+    """Per-route averages, slowest total DB time first (for /debug/db-stats)."""
+    with _routes_lock:
+        items = list(_routes.items())
+    report = [
+        {
+            "route": route,
+            "requests": totals.requests,
+            "avg_queries": round(totals.queries / totals.requests, 2),
+            "max_queries": totals.max_queries,
+            "avg_db_ms": round(totals.db_time / totals.requests * 1000, 3),
+            "avg_conn_hold_ms": round(totals.hold_time / totals.requests * 1000, 3),
+            "total_db_ms": round(totals.db_time * 1000, 1),
+            "flagged": dict(totals.flagged),
+        }
+        for route, totals in items
+    ]
+    report.sort(key=lambda row: row["total_db_ms"], reverse=True)
+    return report
+
+def reset():
+    with _routes_lock:
+        _routes.clear()
+
+def route_name(scope) -> str:
+    route = scope.get("route")
+    path = getattr(route, "path", None) or scope.get("path", "?")
+    return f"{scope.get('method', '')} {path}"
+
+class DBStatsMiddleware:
+    """
+    Tracks database use per request: query count, time spent in queries,
+    how long connections were held, and N+1 / unbounded query flags.
+    Adds them as X-DB-* response headers and to the per-route totals.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestDBStats()
+        token = _current.set(stats)
+
+        async def send_with_headers(message):
+            if message["type"] == "http.response.start" and DB_STATS_HEADERS:
+                hold = stats.connection_hold(time.perf_counter())
+                headers = list(message.get("headers", []))
+                headers += [
+                    (b"x-db-queries", str(stats.queries).encode()),
+                    (b"x-db-time-ms", f"{stats.db_time * 1000:.2f}".encode()),
+                    (b"x-db-conn-hold-ms", f"{hold * 1000:.2f}".encode()),
+                ]
+                if stats.flags:
+                    headers.append((b"x-db-flags", ",".join(sorted(stats.flags)).encode()))
+                message["headers"] = headers
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_headers)
+        finally:
+            _current.reset(token)
+            _add_to_route(route_name(scope), stats, stats.connection_hold(time.perf_counter()))
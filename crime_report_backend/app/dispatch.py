@@ -0,0 +1,211 @@
+import heapq
+import math
+import os
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import select, update
+from sqlalchemy.orm import Session
+
+from . import geo, log, metrics, models
+
+logger = log.get_logger(__name__)
+
+# Responders proposed for each new SOS alert, and how far away they may be
+DISPATCH_PROPOSALS = int(os.getenv("DISPATCH_PROPOSALS", "3"))
+DISPATCH_MAX_DISTANCE_M = float(os.getenv("DISPATCH_MAX_DISTANCE_M", "20000"))
+# Responders whose last heartbeat is older than this are not proposed
+DISPATCH_HEARTBEAT_TTL = float(os.getenv("DISPATCH_HEARTBEAT_TTL", "120"))
+# Side of a grid cell in the responder index
+DISPATCH_CELL_M = float(os.getenv("DISPATCH_CELL_M", "1000"))
+# How often a worker pulls responder changes made by other workers into its index
+DISPATCH_REFRESH_SECONDS = float(os.getenv("DISPATCH_REFRESH_SECONDS", "1"))
+# Changes are re-read this far back, so a row committed late with an older updated_at isn't missed
+DISPATCH_REFRESH_OVERLAP_SECONDS = float(os.getenv("DISPATCH_REFRESH_OVERLAP_SECONDS", "5"))
+
+RESPONDER_STATUSES = {"Available", "Busy", "Offline"}
+
+_RESPONDER_COLUMNS = (
+    models.Responder.id, models.Responder.name, models.Responder.status,
+    models.Responder.latitude, models.Responder.longitude, models.Responder.last_seen, models.Responder.updated_at,
+)
+
+def _to_timestamp(value: datetime) -> float:
+    if value.tzinfo is None:
+        # SQLite returns naive datetimes; they were stored as UTC
+        value = value.replace(tzinfo=timezone.utc)
+    return value.timestamp()
+
+class ResponderIndex:
+    """
+    Available responders in a grid of cells at least `cell_m` metres on a
+    side, for k-nearest queries. A heartbeat moves one entry between cells,
+    so the index is kept current without rebuilding. A query reads rings of
+    cells outward from the point until no unread cell can hold anything
+    nearer than the k-th responder found.
+    """
+
+    def __init__(self, cell_m: float = DISPATCH_CELL_M):
+        self.cell_m = cell_m
+        self.cell_lat = math.degrees(cell_m / geo.EARTH_RADIUS_M)
+        self._cells: dict[tuple, dict] = {}  # (row, column) -> {id: (latitude, longitude, last seen, name)}
+        self._located: dict[int, tuple] = {}  # id -> cell
+        self._widths: dict[int, float] = {}
+        self._lock = threading.Lock()
+
+    def _column_width(self, row: int) -> float:
+        width = self._widths.get(row)
+        if width is None:
+            # Measured at the row's edge nearest a pole, where a degree of longitude is shortest
+            edge = min(max(abs(row * self.cell_lat), abs((row + 1) * self.cell_lat)), 89.9)
+            width = self._widths[row] = self.cell_lat / math.cos(math.radians(edge))
+        return width
+
+    def _cell(self, latitude: float, longitude: float) -> tuple:
+        row = math.floor(latitude / self.cell_lat)
+        return row, math.floor(longitude / self._column_width(row))
+
+    def update(self, responder_id: int, name: str, latitude: float, longitude: float, last_seen: float):
+        """Add a responder or move it to its new position."""
+        cell = self._cell(latitude, longitude)
+        with self._lock:
+            previous = self._located.get(responder_id)
+            if previous is not None and previous != cell:
+                self._discard(responder_id, previous)
+            self._cells.setdefault(cell, {})[responder_id] = (latitude, longitude, last_seen, name)
+            self._located[responder_id] = cell
+
+    def remove(self, responder_id: int):
+        with self._lock:
+            cell = self._located.pop(responder_id, None)
+            if cell is not None:
+                self._discard(responder_id, cell)
+
+    def _discard(self, responder_id: int, cell: tuple):
+        members = self._cells[cell]
+        del members[responder_id]
+        if not members:
+            del self._cells[cell]
+
+    def nearest(self, latitude: float, longitude: float, k: int, max_distance_m: float = DISPATCH_MAX_DISTANCE_M,
+                now: float | None = None, max_age: float = DISPATCH_HEARTBEAT_TTL) -> list[tuple]:
+        """Up to k (distance in metres, id, name) tuples, nearest first, heard from within `max_age` seconds."""
+        now = time.time() if now is None else now
+        oldest = now - max_age
+        row = math.floor(latitude / self.cell_lat)
+        last_ring = math.ceil(max_distance_m / self.cell_m) + 1
+        found = []  # Max-heap of the k nearest so far, as (-distance, id, name)
+        with self._lock:
+            for ring in range(last_ring + 1):
+                for r in range(row - ring, row + ring + 1):
+                    column = math.floor(longitude / self._column_width(r))
+                    # Whole row on the ring's top and bottom edges, just its two ends in between
+                    if abs(r - row) == ring:
+                        columns = range(column - ring, column + ring + 1)
+                    else:
+                        columns = (column - ring, column + ring)
+                    for c in columns:
+                        members = self._cells.get((r, c))
+                        if not members:
+                            continue
+                        for responder_id, (lat, lon, last_seen, name) in members.items():
+                            if last_seen < oldest:
+                                continue
+                            distance = geo.haversine_m(latitude, longitude, lat, lon)
+                            if distance > max_distance_m:
+                                continue
+                            if len(found) < k:
+                                heapq.heappush(found, (-distance, responder_id, name))
+                            elif distance < -found[0][0]:
+                                heapq.heapreplace(found, (-distance, responder_id, name))
+                # Every unread cell is at least ring * cell_m away
+                if len(found) == k and -found[0][0] <= ring * self.cell_m:
+                    break
+        return sorted((-distance, responder_id, name) for distance, responder_id, name in found)
+
+    def __len__(self):
+        return len(self._located)
+
+index = ResponderIndex()
+
+dispatch_proposals = metrics.Counter(
+    "dispatch_proposals_total", "Responder proposals made for SOS alerts, by whether any responder was in range.",
+    ("outcome",))
+_proposal_outcomes = {outcome: dispatch_proposals.labels(outcome) for outcome in ("proposed", "none_available")}
+dispatch_proposal_seconds = metrics.Histogram(
+    "dispatch_proposal_seconds", "Time to find the nearest available responders for an SOS alert.",
+    buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.05)).labels()
+
+def _dispatch_metrics():
+    return [("dispatch_responders_indexed", "gauge", "Available responders in this worker's index.", (), {(): len(index)})]
+
+metrics.REGISTRY.add_collector(_dispatch_metrics)
+
+def apply(row):
+    """Bring the index in line with one responders row (an ORM object or a row of the responder columns)."""
+    if row.status != "Available" or row.latitude is None or row.longitude is None or row.last_seen is None:
+        index.remove(row.id)
+    else:
+        index.update(row.id, row.name, row.latitude, row.longitude, _to_timestamp(row.last_seen))
+
+_refresh_lock = threading.Lock()
+_refreshed_at = float("-inf")  # time.monotonic() of the last refresh
+_cursor = None  # Newest updated_at read so far
+
+def refresh(db: Session, force: bool = False) -> int:
+    """
+    Apply responders rows changed since the last refresh to the index, at most
+    once per DISPATCH_REFRESH_SECONDS. The first call loads every row. Writes
+    made through this worker are applied as they happen; this picks up the
+    other workers'. Returns how many rows were read.
+    """
+    global _refreshed_at, _cursor
+    if not force and time.monotonic() - _refreshed_at < DISPATCH_REFRESH_SECONDS:
+        return 0
+    # Another thread is already refreshing; answer from the index as it stands
+    if not _refresh_lock.acquire(blocking=force):
+        return 0
+    try:
+        query = select(*_RESPONDER_COLUMNS)
+        if _cursor is not None:
+            query = query.where(models.Responder.updated_at >= _cursor - timedelta(seconds=DISPATCH_REFRESH_OVERLAP_SECONDS))
+        rows = db.execute(query).all()
+        for row in rows:
+            apply(row)
+            if row.updated_at is not None and (_cursor is None or row.updated_at > _cursor):
+                _cursor = row.updated_at
+        _refreshed_at = time.monotonic()
+        return len(rows)
+    finally:
+        _refresh_lock.release()
+
+def propose(db: Session, latitude: float | None, longitude: float | None, k: int = DISPATCH_PROPOSALS) -> list[dict]:
+    """
+    The k nearest available responders to a point, nearest first, as
+    {"responder_id", "name", "distance_m"} dicts. Empty without coordinates.
+    """
+    if latitude is None or longitude is None:
+        return []
+    refresh(db)
+    with dispatch_proposal_seconds.time():
+        nearest = index.nearest(latitude, longitude, k)
+    _proposal_outcomes["proposed" if nearest else "none_available"].inc()
+    if not nearest:
+        # Counted in dispatch_proposals_total; during a major incident this happens for most alerts
+        logger.info("No available responder in range", extra={"latitude": latitude, "longitude": longitude})
+    return [
+        {"responder_id": responder_id, "name": name, "distance_m": round(distance, 1)}
+        for distance, responder_id, name in nearest
+    ]
+
+def set_status(db: Session, responder_id: int, status: str, only_if: str | None = None):
+    """
+    Change a responder's status in the current transaction. With `only_if`,
+    only when its status is still that, so two dispatchers can't both claim
+    the same responder. Returns the updated row, or None if nothing changed.
+    Pass it to apply() once committed.
+    """
+    query = update(models.Responder).where(models.Responder.id == responder_id)
+    if only_if is not None:
+        query = query.where(models.Responder.status == only_if)
+    return db.execute(query.values(status=status).returning(*_RESPONDER_COLUMNS)).first()
@@ -0,0 +1,175 @@
+import csv
+import io
+import json
+import os
+import threading
+import time
+import weakref
+from datetime import datetime, timezone
+from fastapi import HTTPException
+from fastapi.responses import StreamingResponse
+from sqlalchemy import Boolean, DateTime, Float, Integer, select
+
+from . import log, metrics
+from .database import SessionLocal
+
+logger = log.get_logger(__name__)
+
+# Rows per round trip through the server-side cursor, and per chunk sent to the client.
+# Each batch is fetched and encoded holding the GIL, so larger ones stall SOS creation.
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", "500"))
+# Exports running at once per worker. Each holds a DB connection until it finishes.
+EXPORT_MAX_CONCURRENT = int(os.getenv("EXPORT_MAX_CONCURRENT", "2"))
+
+MEDIA_TYPES = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+    # Needs pyarrow, which is not in requirements.txt
+    "parquet": "application/vnd.apache.parquet",
+}
+
+# Exported columns, in file order
+COMPLAINT_COLUMNS = (
+    "id", "title", "description", "crime_type", "user_email", "status", "lat", "long", "latitude",
+    "longitude", "suspect_details", "image_path", "video_path", "audio_path", "media_status",
+    "incident_id", "created_at", "updated_at",
+)
+SOS_COLUMNS = ("id", "user_email", "status", "lat", "long", "latitude", "longitude", "incident_id", "responder_id",
+               "created_at", "updated_at")
+
+_slots = threading.BoundedSemaphore(EXPORT_MAX_CONCURRENT)
+
+export_rows = metrics.Counter("export_rows_total", "Rows streamed by /complaints/export and /sos/export.",
+                              ("table", "format"))
+
+class _Slot:
+    """One of the EXPORT_MAX_CONCURRENT slots, released exactly once."""
+
+    def __init__(self):
+        self._held = True
+
+    def release(self):
+        if self._held:
+            self._held = False
+            _slots.release()
+
+def stream(model, columns: tuple, filters: list, format: str) -> StreamingResponse:
+    """
+    Stream every row of `model` matching `filters`, newest first, as an attachment.
+    Rows come off a server-side cursor EXPORT_BATCH_SIZE at a time, so memory use
+    doesn't grow with the table and the first batch is sent as soon as it is read.
+    """
+    if format not in MEDIA_TYPES:
+        raise HTTPException(status_code=400, detail=f"Invalid format. Must be one of: {', '.join(MEDIA_TYPES)}")
+    if format == "parquet" and not _parquet_available():
+        raise HTTPException(status_code=400, detail="Parquet export is not available on this server")
+    if not _slots.acquire(blocking=False):
+        raise HTTPException(status_code=503, detail="Server busy, please retry shortly", headers={"Retry-After": "5"})
+
+    slot = _Slot()
+    table = model.__tablename__
+    statement = (
+        select(*(getattr(model, name) for name in columns))
+        .where(*filters)
+        .order_by(model.created_at.desc(), model.id.desc())
+        .execution_options(yield_per=EXPORT_BATCH_SIZE)
+    )
+    encode = {"ndjson": _ndjson, "csv": _csv, "parquet": _parquet}[format]
+    body = encode(model, columns, _batches(statement, table, format, slot))
+    # Releases the slot even if the response is dropped before the body is first iterated
+    weakref.finalize(body, slot.release)
+
+    filename = f"{table}-{datetime.now(timezone.utc):%Y%m%dT%H%M%SZ}.{format}"
+    return StreamingResponse(
+        body,
+        media_type=MEDIA_TYPES[format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"', "X-Accel-Buffering": "no"},
+    )
+
+def _batches(statement, table: str, format: str, slot: _Slot):
+    # Starlette runs each step of a sync iterator in the threadpool, so blocking reads are fine here
+    started = time.perf_counter()
+    rows = 0
+    counter = export_rows.labels(table, format)
+    db = SessionLocal()
+    try:
+        for batch in db.execute(statement).partitions():
+            rows += len(batch)
+            counter.inc(len(batch))
+            yield batch
+        logger.info("Export finished", extra={"table": table, "format": format, "rows": rows,
+                                              "seconds": round(time.perf_counter() - started, 3)})
+    finally:
+        db.close()
+        slot.release()
+
+def _isoformat(value):
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"{type(value).__name__} is not JSON serializable")
+
+def _ndjson(model, columns: tuple, batches):
+    dumps = json.JSONEncoder(separators=(",", ":"), default=_isoformat).encode
+    for batch in batches:
+        yield "".join([dumps(dict(zip(columns, row))) + "\n" for row in batch]).encode()
+
+def _csv(model, columns: tuple, batches):
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow(columns)
+    # The header goes out before the query runs
+    yield buffer.getvalue().encode()
+    for batch in batches:
+        buffer.seek(0)
+        buffer.truncate()
+        writer.writerows(batch)
+        yield buffer.getvalue().encode()
+
+def _parquet_available() -> bool:
+    try:
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        return False
+    return True
+
+class _ChunkSink(io.RawIOBase):
+    """Write-only file that keeps what Parquet writes until the next drain()."""
+
+    def __init__(self):
+        self._chunks = []
+        self._position = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        self._position += len(data)
+        return len(data)
+
+    def tell(self):
+        return self._position
+
+    def drain(self) -> bytes:
+        data = b"".join(self._chunks)
+        self._chunks.clear()
+        return data
+
+def _parquet(model, columns: tuple, batches):
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    types = {Integer: pa.int64(), Float: pa.float64(), Boolean: pa.bool_(), DateTime: pa.timestamp("us", tz="UTC")}
+    schema = pa.schema([
+        (name, next((arrow for sql, arrow in types.items() if isinstance(model.__table__.c[name].type, sql)), pa.string()))
+        for name in columns
+    ])
+    sink = _ChunkSink()
+    # One row group per batch, flushed to the client as soon as it is written
+    with pq.ParquetWriter(sink, schema, compression="snappy") as writer:
+        for batch in batches:
+            values = list(zip(*batch))
+            writer.write_batch(pa.record_batch(
+                [pa.array(values[i], type=schema.field(i).type) for i in range(len(columns))], schema=schema))
+            yield sink.drain()
+    yield sink.drain()
@@ -0,0 +1,128 @@
+import math
+
+# Geohash alphabet; it is in ASCII order, so prefix ranges sort correctly in a B-tree
+_BASE32 = "0123456789bcdefghjkmnpqrstuvwxyz"
+# Precision stored on rows (~5 m cells). Queries use shorter prefixes of it.
+GEOHASH_PRECISION = 9
+EARTH_RADIUS_M = 6371000
+
+def parse_coordinates(lat: str | None, long: str | None):
+    """
+    Parse the string coordinates clients send into floats.
+    Returns (None, None) if either is missing, malformed or out of range.
+    """
+    try:
+        latitude, longitude = float(lat), float(long)
+    except (TypeError, ValueError):
+        return None, None
+    if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+        return None, None
+    return latitude, longitude
+
+def encode(latitude: float, longitude: float, precision: int = GEOHASH_PRECISION) -> str:
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    chars, bits, bit_count, even = [], 0, 0, True
+    while len(chars) < precision:
+        value, interval = (longitude, lon_range) if even else (latitude, lat_range)
+        mid = (interval[0] + interval[1]) / 2
+        bits <<= 1
+        if value >= mid:
+            bits |= 1
+            interval[0] = mid
+        else:
+            interval[1] = mid
+        even = not even
+        bit_count += 1
+        if bit_count == 5:
+            chars.append(_BASE32[bits])
+            bits, bit_count = 0, 0
+    return "".join(chars)
+
+def decode_center(geohash: str) -> tuple[float, float]:
+    """Centre (latitude, longitude) of a geohash cell."""
+    lat_range, lon_range = [-90.0, 90.0], [-180.0, 180.0]
+    even = True
+    for char in geohash:
+        bits = _BASE32.index(char)
+        for shift in range(4, -1, -1):
+            interval = lon_range if even else lat_range
+            mid = (interval[0] + interval[1]) / 2
+            if bits >> shift & 1:
+                interval[0] = mid
+            else:
+                interval[1] = mid
+            even = not even
+    return (lat_range[0] + lat_range[1]) / 2, (lon_range[0] + lon_range[1]) / 2
+
+def locate(lat: str | None, long: str | None):
+    """Return (latitude, longitude, geohash) for storing alongside the raw strings."""
+    latitude, longitude = parse_coordinates(lat, long)
+    if latitude is None:
+        return None, None, None
+    return latitude, longitude, encode(latitude, longitude)
+
+def cell_size(precision: int) -> tuple[float, float]:
+    """(height, width) in degrees of a geohash cell at `precision`."""
+    bits = 5 * precision
+    lon_bits = (bits + 1) // 2
+    lat_bits = bits // 2
+    return 180.0 / 2 ** lat_bits, 360.0 / 2 ** lon_bits
+
+def cover_bbox(
+    min_lat: float,
+    min_lon: float,
+    max_lat: float,
+    max_lon: float,
+    max_cells: int = 32,
+    max_precision: int = GEOHASH_PRECISION,
+) -> list[str]:
+    """
+    Geohash prefixes whose cells together cover the bounding box. Uses the
+    finest precision (up to `max_precision`) that needs at most `max_cells` prefixes.
+    """
+    for precision in range(max_precision, 0, -1):
+        height, width = cell_size(precision)
+        rows = math.floor(max_lat / height) - math.floor(min_lat / height) + 1
+        cols = math.floor(max_lon / width) - math.floor(min_lon / width) + 1
+        if rows * cols <= max_cells:
+            break
+    cells = set()
+    lat = math.floor(min_lat / height) * height
+    while lat <= max_lat:
+        lon = math.floor(min_lon / width) * width
+        while lon <= max_lon:
+            # Encode the cell centre to avoid edge rounding
+            center_lat = min(lat + height / 2, 90.0)
+            center_lon = min(lon + width / 2, 180.0)
+            cells.add(encode(center_lat, center_lon, precision))
+            lon += width
+        lat += height
+    return sorted(cells)
+
+def prefix_upper_bound(prefix: str) -> str | None:
+    """Smallest string greater than every geohash starting with `prefix` (None if unbounded)."""
+    while prefix:
+        position = _BASE32.index(prefix[-1])
+        if position + 1 < len(_BASE32):
+            return prefix[:-1] + _BASE32[position + 1]
+        prefix = prefix[:-1]
+    return None
+
+def haversine_m(lat1: float, lon1: float, lat2: float, lon2: float) -> float:
+    phi1, phi2 = math.radians(lat1), math.radians(lat2)
+    d_phi = phi2 - phi1
+    d_lambda = math.radians(lon2 - lon1)
+    a = math.sin(d_phi / 2) ** 2 + math.cos(phi1) * math.cos(phi2) * math.sin(d_lambda / 2) ** 2
+    return 2 * EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+def radius_bbox(latitude: float, longitude: float, radius_m: float):
+    """Bounding box (min_lat, min_lon, max_lat, max_lon) around a circle, clamped to valid ranges."""
+    d_lat = math.degrees(radius_m / EARTH_RADIUS_M)
+    cos_lat = max(math.cos(math.radians(latitude)), 1e-6)
+    d_lon = min(math.degrees(radius_m / (EARTH_RADIUS_M * cos_lat)), 180.0)
+    return (
+        max(latitude - d_lat, -90.0),
+        max(longitude - d_lon, -180.0),
+        min(latitude + d_lat, 90.0),
+        min(longitude + d_lon, 180.0),
+    )
@@ -0,0 +1,170 @@
+import os
+import random
+import threading
+import time
+from collections import OrderedDict
+from datetime import timezone
+from sqlalchemy import func, select, union_all
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import geo, models
+
+# Geohash precisions aggregated on every insert (2 ≈ 1250 km cells ... 7 ≈ 150 m cells)
+PRECISIONS = range(2, 8)
+# Leaflet zoom level -> grid precision. Roughly a few dozen cells across the screen.
+ZOOM_PRECISION = [(3, 2), (6, 3), (8, 4), (11, 5), (13, 6)]
+MAX_PRECISION = 7
+
+# Rows per cell and day. The coarse cells span whole regions, so without shards
+# every concurrent report in an area would queue on one row lock until it
+# commits. Reads sum the shards.
+HEATMAP_SHARDS = int(os.getenv("HEATMAP_SHARDS", "16"))
+
+HEATMAP_CACHE_SIZE = int(os.getenv("HEATMAP_CACHE_SIZE", "256"))
+HEATMAP_CACHE_TTL = float(os.getenv("HEATMAP_CACHE_TTL", "15"))
+
+# Table the heat map reads for each source
+SOURCES = {
+    "sos": models.SOSAlert,
+    "complaints": models.Complaint,
+}
+
+def precision_for_zoom(zoom: int) -> int:
+    for max_zoom, precision in ZOOM_PRECISION:
+        if zoom <= max_zoom:
+            return precision
+    return MAX_PRECISION
+
+def current_day(now: float | None = None) -> int:
+    return int((time.time() if now is None else now) // 86400)
+
+def record(db: Session, source: str, geohash: str | None, day: int | None = None, count: int = 1):
+    """
+    Add an incident to every precision of the grid, in one random shard. Call it
+    after db.add() and before db.commit() so the grid changes in the same
+    transaction as the insert.
+    """
+    if not geohash:
+        return
+    shard = random.randrange(HEATMAP_SHARDS)
+    rows = [
+        {"source": source, "precision": precision, "cell": geohash[:precision],
+         "day": current_day() if day is None else day, "shard": shard, "count": count}
+        for precision in PRECISIONS
+    ]
+    dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+    statement = dialect.insert(models.HeatmapCell).values(rows)
+    db.execute(statement.on_conflict_do_update(
+        index_elements=["source", "precision", "cell", "day", "shard"],
+        set_={"count": models.HeatmapCell.count + statement.excluded.count},
+    ))
+
+class LRUCache:
+    """Small thread-safe LRU cache whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, size: int, ttl: float):
+        self.size = size
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] < time.monotonic():
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+_cache = LRUCache(HEATMAP_CACHE_SIZE, HEATMAP_CACHE_TTL)
+
+def snap_bbox(bbox: tuple, precision: int) -> tuple:
+    """Expand a bbox outward to whole cells, so nearby viewports share cache entries."""
+    min_lat, min_lon, max_lat, max_lon = bbox
+    height, width = geo.cell_size(precision)
+    return (
+        max(-90.0, (min_lat // height) * height),
+        max(-180.0, (min_lon // width) * width),
+        min(90.0, (max_lat // height + 1) * height),
+        min(180.0, (max_lon // width + 1) * width),
+    )
+
+def get_grid(db: Session, sources: list[str], zoom: int, bbox: tuple, days: int | None) -> dict:
+    """
+    Density grid for the viewport: one entry per non-empty cell at the
+    precision for `zoom`, summed over the last `days` days (all time if None).
+    """
+    precision = precision_for_zoom(zoom)
+    bbox = snap_bbox(bbox, precision)
+    key = (tuple(sources), precision, bbox, days, current_day())
+    cached = _cache.get(key)
+    if cached is not None:
+        return cached
+
+    # One primary-key range scan per (source, prefix). A single OR'ed query
+    # would let SQLite hoist the shared equality terms and scan every cell
+    # of the precision instead.
+    scans = []
+    for source in sources:
+        for prefix in geo.cover_bbox(*bbox, max_precision=precision):
+            conditions = [
+                models.HeatmapCell.source == source,
+                models.HeatmapCell.precision == precision,
+                models.HeatmapCell.cell >= prefix,
+            ]
+            upper = geo.prefix_upper_bound(prefix)
+            if upper is not None:
+                conditions.append(models.HeatmapCell.cell < upper)
+            if days:
+                conditions.append(models.HeatmapCell.day > current_day() - days)
+            scans.append(select(models.HeatmapCell.cell, models.HeatmapCell.count).where(*conditions))
+    matched = union_all(*scans).subquery()
+    query = select(matched.c.cell, func.sum(matched.c.count)).group_by(matched.c.cell)
+
+    min_lat, min_lon, max_lat, max_lon = bbox
+    cells = []
+    for cell, count in db.execute(query):
+        lat, lon = geo.decode_center(cell)
+        if min_lat <= lat <= max_lat and min_lon <= lon <= max_lon:
+            cells.append({"cell": cell, "lat": lat, "lon": lon, "count": count})
+
+    height, width = geo.cell_size(precision)
+    grid = {
+        "precision": precision,
+        "cell_height": height,
+        "cell_width": width,
+        "max_count": max((cell["count"] for cell in cells), default=0),
+        "cells": cells,
+    }
+    _cache.put(key, grid)
+    return grid
+
+def rebuild(db: Session):
+    """Recompute the whole grid from the source tables (first deploy or repair), all in shard 0."""
+    db.query(models.HeatmapCell).delete()
+    for source, model in SOURCES.items():
+        counts = {}
+        for geohash, created_at in db.query(model.geohash, model.created_at).filter(model.geohash.isnot(None)):
+            if created_at is None:
+                day = current_day()
+            else:
+                if created_at.tzinfo is None:
+                    # SQLite returns naive datetimes; they are stored in UTC
+                    created_at = created_at.replace(tzinfo=timezone.utc)
+                day = current_day(created_at.timestamp())
+            for precision in PRECISIONS:
+                key = (precision, geohash[:precision], day)
+                counts[key] = counts.get(key, 0) + 1
+        db.add_all(
+            models.HeatmapCell(source=source, precision=precision, cell=cell, day=day, count=count)
+            for (precision, cell, day), count in counts.items()
+        )
+    db.commit()
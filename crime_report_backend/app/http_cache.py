@@ -0,0 +1,220 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import timedelta
+from types import SimpleNamespace
+from sqlalchemy import event, func, select
+from sqlalchemy.orm import Session
+
+from . import database, metrics, models, stats
+from .database import env_flag
+
+HTTP_CACHE_ENABLED = env_flag("HTTP_CACHE_ENABLED", "true")
+# Seconds a worker trusts its copy of the table versions. Its own writes
+# show up at once; writes made by other workers within this long.
+HTTP_CACHE_VERSION_TTL = float(os.getenv("HTTP_CACHE_VERSION_TTL", "1"))
+# Serialized responses kept per worker, least recently used dropped first
+HTTP_CACHE_SIZE = int(os.getenv("HTTP_CACHE_SIZE", "512"))
+HTTP_CACHE_MAX_BODY = int(os.getenv("HTTP_CACHE_MAX_BODY", str(1024 * 1024)))
+# Clients may keep responses but must revalidate (cheaply, with If-None-Match) before reusing them
+HTTP_CACHE_CONTROL = os.getenv("HTTP_CACHE_CONTROL", "private, no-cache")
+
+# Path -> tables whose versions make up its ETag
+CACHED_PATHS = {
+    "/complaints/all": ("complaints",),
+    "/complaints/recent": ("complaints",),
+    "/complaints/stats": ("complaints",),
+    "/complaints/search": ("complaints",),
+    "/sos/all": ("sos_alerts",),
+    "/sos/stats": ("sos_alerts",),
+    "/auth/users/all": ("users",),
+    "/incidents/": ("incidents",),
+}
+# Counts over a rolling 24h window also change as the window moves
+WINDOWED_PATHS = {"/complaints/stats", "/sos/stats"}
+
+# --------------------------------------------------
+# TABLE VERSIONS
+# --------------------------------------------------
+# A table's version is read from its rows, not stored: the newest id (inserts),
+# the newest updated_at (updates) and how many rows were updated within
+# HTTP_CACHE_COMMIT_SLACK_SECONDS of that. The last part catches a write that
+# commits after a newer one but with an older updated_at, as long as the row
+# it changed wasn't already updated within that window. Each is a short scan
+# of the table's (updated_at, id) index, and writers share no row to lock.
+HTTP_CACHE_COMMIT_SLACK_SECONDS = float(os.getenv("HTTP_CACHE_COMMIT_SLACK_SECONDS", "5"))
+
+VERSIONED_TABLES = {
+    "complaints": models.Complaint,
+    "sos_alerts": models.SOSAlert,
+    "users": models.User,
+    "incidents": models.Incident,
+}
+
+def bump(db: Session, name: str):
+    """
+    Note that this session writes table `name`. Once it commits, this worker
+    forgets its cached version, counts and responses for the table, so its
+    own writes show up at once. Nothing is written to the database.
+    """
+    event.listen(db, "after_commit", lambda session: invalidate(name), once=True)
+
+# Table name -> (expires at, version) as last read by this worker
+_versions = {}
+_lock = threading.Lock()
+
+def invalidate(name: str):
+    """Forget this worker's cached version, counts and responses for table `name`."""
+    with _lock:
+        _versions.pop(name, None)
+    stats.invalidate(name)
+    response_cache.purge(name)
+
+async def _read_version(conn, name: str) -> str:
+    model = VERSIONED_TABLES[name]
+    newest_id, newest_update = (await conn.execute(select(func.max(model.id), func.max(model.updated_at)))).one()
+    if newest_update is None:
+        return f"{newest_id or 0}"
+    recent = (await conn.execute(
+        select(func.count()).select_from(model)
+        .where(model.updated_at >= newest_update - timedelta(seconds=HTTP_CACHE_COMMIT_SLACK_SECONDS))
+    )).scalar_one()
+    return f"{newest_id}.{newest_update.timestamp() * 1e6:.0f}.{recent}"
+
+async def current_versions(tables: tuple) -> tuple:
+    now = time.monotonic()
+    missing = [name for name in tables if _versions.get(name, (0, ""))[0] <= now]
+    if missing:
+        async with database.get_async_engine().connect() as conn:
+            found = {name: await _read_version(conn, name) for name in missing}
+        for name, version in found.items():
+            previous = _versions.get(name)
+            if previous is not None and previous[1] != version:
+                # Another worker wrote: what this worker derived from the old data is stale
+                invalidate(name)
+            with _lock:
+                _versions[name] = (now + HTTP_CACHE_VERSION_TTL, version)
+    return tuple(_versions[name][1] for name in tables)
+
+async def etag_for(path: str, tables: tuple) -> str:
+    parts = list(await current_versions(tables))
+    if path in WINDOWED_PATHS:
+        parts.append(f"b{stats.current_bucket()}")
+    return 'W/"' + "-".join(parts) + '"'
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    # Weak comparison: W/"x" and "x" are the same validator
+    if if_none_match.strip() == "*":
+        return True
+    bare = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == bare for tag in if_none_match.split(","))
+
+# --------------------------------------------------
+# RESPONSE CACHE
+# --------------------------------------------------
+class ResponseCache:
+    """Serialized 200 responses keyed by path and query string, valid while their ETag is current."""
+
+    def __init__(self, size: int):
+        self.size = size
+        self._entries = OrderedDict()  # (path, query) -> (tables, etag, headers, body)
+        self._lock = threading.Lock()
+
+    def get(self, key: tuple, etag: str):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[1] != etag:
+                return None
+            self._entries.move_to_end(key)
+            return entry
+
+    def put(self, key: tuple, tables: tuple, etag: str, headers: list, body: bytes):
+        with self._lock:
+            self._entries[key] = (tables, etag, headers, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def purge(self, name: str):
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if name in entry[0]]:
+                del self._entries[key]
+
+    def __len__(self):
+        return len(self._entries)
+
+response_cache = ResponseCache(HTTP_CACHE_SIZE)
+
+http_cache_requests = metrics.Counter(
+    "http_cache_requests_total", "Requests to ETag-cached endpoints, by how they were answered.", ("result",))
+_results = {result: http_cache_requests.labels(result) for result in ("not_modified", "hit", "miss")}
+
+def _cache_metrics():
+    return [("http_cache_entries", "gauge", "Serialized responses held by the response cache.", (), {(): len(response_cache)})]
+
+metrics.REGISTRY.add_collector(_cache_metrics)
+
+def _mark_route(scope):
+    # Answered without routing; these paths are their own route templates (for metrics and db-stats)
+    scope["route"] = SimpleNamespace(path=scope["path"])
+
+class HTTPCacheMiddleware:
+    """
+    ETags for the polled dashboard endpoints, built from table versions.
+    A matching If-None-Match gets 304 and an unchanged resource is served
+    from the response cache; neither runs the endpoint's query.
+    """
+
+    def __init__(self, app, enabled: bool = HTTP_CACHE_ENABLED):
+        self.app = app
+        self.enabled = enabled
+
+    async def __call__(self, scope, receive, send):
+        tables = CACHED_PATHS.get(scope.get("path")) if scope["type"] == "http" else None
+        if not self.enabled or tables is None or scope["method"] != "GET":
+            await self.app(scope, receive, send)
+            return
+
+        path = scope["path"]
+        etag = await etag_for(path, tables)
+        validators = [(b"etag", etag.encode()), (b"cache-control", HTTP_CACHE_CONTROL.encode())]
+        if_none_match = next((value for name, value in scope["headers"] if name == b"if-none-match"), None)
+        if if_none_match is not None and etag_matches(if_none_match.decode("latin-1"), etag):
+            _results["not_modified"].inc()
+            _mark_route(scope)
+            await send({"type": "http.response.start", "status": 304, "headers": validators})
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        key = (path, scope.get("query_string", b""))
+        entry = response_cache.get(key, etag)
+        if entry is not None:
+            _results["hit"].inc()
+            _mark_route(scope)
+            await send({"type": "http.response.start", "status": 200, "headers": entry[2]})
+            await send({"type": "http.response.body", "body": entry[3]})
+            return
+
+        _results["miss"].inc()
+        # The ETag was computed before the query runs, so a write landing in between
+        # only makes this response newer than its tag, never older.
+        captured = {"status": None, "headers": None, "chunks": [], "size": 0}
+
+        async def send_and_capture(message):
+            if message["type"] == "http.response.start":
+                captured["status"] = message["status"]
+                if message["status"] == 200:
+                    headers = [(name, value) for name, value in message.get("headers", [])
+                               if name not in (b"etag", b"cache-control")] + validators
+                    message["headers"] = captured["headers"] = headers
+            elif message["type"] == "http.response.body" and captured["status"] == 200:
+                body = message.get("body", b"")
+                captured["size"] += len(body)
+                if captured["size"] <= HTTP_CACHE_MAX_BODY:
+                    captured["chunks"].append(body)
+                if not message.get("more_body", False) and captured["size"] <= HTTP_CACHE_MAX_BODY:
+                    response_cache.put(key, tables, etag, captured["headers"], b"".join(captured["chunks"]))
+            await send(message)
+
+        await self.app(scope, receive, send_and_capture)
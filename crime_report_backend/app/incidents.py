@@ -0,0 +1,210 @@
+import math
+import os
+import threading
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import event, func, insert, select, update
+from sqlalchemy.orm import Session
+
+from . import geo, http_cache, log, metrics, models
+from .database import SessionLocal
+
+logger = log.get_logger(__name__)
+
+# Reports within this distance of an incident's centre, and this long after
+# its latest report, are taken to be the same event
+INCIDENT_RADIUS_M = float(os.getenv("INCIDENT_RADIUS_M", "300"))
+INCIDENT_WINDOW_SECONDS = float(os.getenv("INCIDENT_WINDOW_SECONDS", "900"))
+# Seconds between writes of joined reports into their incidents' counts and
+# centres. Joins are batched outside the report's transaction, so a busy
+# incident's row is written once per interval instead of once per report.
+INCIDENT_FLUSH_SECONDS = float(os.getenv("INCIDENT_FLUSH_SECONDS", "0.5"))
+
+# Grid rows are INCIDENT_RADIUS_M tall; columns are at least that wide
+_CELL_LAT = math.degrees(INCIDENT_RADIUS_M / geo.EARTH_RADIUS_M)
+
+COUNT_COLUMNS = {"sos": "sos_count", "complaint": "complaint_count"}
+
+incidents_assigned = metrics.Counter(
+    "incidents_assigned_total", "Reports grouped into incidents, by whether they started a new one.", ("kind", "outcome"))
+_outcomes = {(kind, outcome): incidents_assigned.labels(kind, outcome)
+             for kind in COUNT_COLUMNS for outcome in ("new", "joined", "skipped")}
+
+def _column_width(row: int) -> float:
+    # Measured at the row's edge nearest a pole, where a degree of longitude is shortest
+    edge = min(max(abs(row * _CELL_LAT), abs((row + 1) * _CELL_LAT)), 89.9)
+    return _CELL_LAT / math.cos(math.radians(edge))
+
+def cell_of(latitude: float, longitude: float) -> str:
+    row = math.floor(latitude / _CELL_LAT)
+    return f"{row}:{math.floor(longitude / _column_width(row))}"
+
+def neighbour_cells(latitude: float, longitude: float) -> list[str]:
+    """The point's cell and the cells around it: everything within INCIDENT_RADIUS_M."""
+    row = math.floor(latitude / _CELL_LAT)
+    cells = []
+    for r in (row - 1, row, row + 1):
+        column = math.floor(longitude / _column_width(r))
+        cells.extend(f"{r}:{c}" for c in (column - 1, column, column + 1))
+    return cells
+
+def _candidates(db: Session, latitude: float, longitude: float, now: datetime):
+    table = models.Incident
+    return db.execute(
+        select(table.id, table.latitude, table.longitude).where(
+            table.cell.in_(neighbour_cells(latitude, longitude)),
+            table.last_seen >= now - timedelta(seconds=INCIDENT_WINDOW_SECONDS),
+        )
+    ).all()
+
+def _nearest(candidates, latitude: float, longitude: float):
+    nearest, nearest_distance = None, INCIDENT_RADIUS_M
+    for candidate in candidates:
+        distance = geo.haversine_m(latitude, longitude, candidate.latitude, candidate.longitude)
+        if distance <= nearest_distance:
+            nearest, nearest_distance = candidate, distance
+    return nearest
+
+def _lock_neighbourhood(db: Session, latitude: float, longitude: float):
+    """
+    On Postgres, hold a transaction-scoped advisory lock on each of the nine
+    cells, in a fixed order. Two first reports of one event share at least one
+    cell, so the second waits until the first has committed its incident, and
+    then finds it. SQLite needs none: the report's transaction already holds
+    the database's write lock by the time assign() runs.
+    """
+    if db.get_bind().dialect.name != "postgresql":
+        return
+    for cell in sorted(neighbour_cells(latitude, longitude)):
+        db.execute(select(func.pg_advisory_xact_lock(func.hashtext("incident:" + cell))))
+
+def assign(db: Session, kind: str, report, now: datetime | None = None) -> int | None:
+    """
+    Put a new report (`kind` "sos" or "complaint") into the nearest open
+    incident, or start one, and set report.incident_id. Reports without
+    coordinates are left out. Call it after db.add() and before db.commit(),
+    like stats.record(). Joining costs one indexed lookup over nine grid
+    cells; the incident's counts and centre are updated after the commit, in
+    batches (see JoinBuffer). Starting an incident inserts its row.
+    """
+    if report.latitude is None or report.longitude is None:
+        _outcomes[(kind, "skipped")].inc()
+        return None
+    now = now or datetime.now(timezone.utc)
+    latitude, longitude = report.latitude, report.longitude
+
+    nearest = _nearest(_candidates(db, latitude, longitude, now), latitude, longitude)
+    if nearest is None:
+        _lock_neighbourhood(db, latitude, longitude)
+        # Another report may have started one while this waited for the lock
+        nearest = _nearest(_candidates(db, latitude, longitude, now), latitude, longitude)
+
+    if nearest is None:
+        incident_id = db.execute(insert(models.Incident).values(
+            latitude=latitude, longitude=longitude, cell=cell_of(latitude, longitude), first_seen=now,
+            last_seen=now, member_count=1,
+            **{column: int(column == COUNT_COLUMNS[kind]) for column in COUNT_COLUMNS.values()},
+        ).returning(models.Incident.id)).scalar_one()
+        _outcomes[(kind, "new")].inc()
+        http_cache.bump(db, "incidents")
+    else:
+        incident_id = nearest.id
+        # Counted once the report is committed; a rolled back report never joined
+        event.listen(db, "after_commit",
+                     lambda session: joins.add(incident_id, kind, latitude, longitude, now), once=True)
+        _outcomes[(kind, "joined")].inc()
+    report.incident_id = incident_id
+    return incident_id
+
+class JoinBuffer:
+    """
+    Reports that joined an incident, summed per incident until the next flush.
+    A background thread writes them every INCIDENT_FLUSH_SECONDS in one
+    transaction: one UPDATE per incident, in id order, whatever the number
+    of reports. Pending joins are lost if the process dies; the reports
+    themselves keep their incident_id.
+    """
+
+    def __init__(self, interval: float = INCIDENT_FLUSH_SECONDS, session_factory=SessionLocal):
+        self.interval = interval
+        self.session_factory = session_factory
+        self._pending = {}  # incident id -> [reports, {count column: n}, latitude sum, longitude sum, latest seen]
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def add(self, incident_id: int, kind: str, latitude: float, longitude: float, seen: datetime):
+        counts = dict.fromkeys(COUNT_COLUMNS.values(), 0)
+        counts[COUNT_COLUMNS[kind]] = 1
+        with self._lock:
+            self._merge(incident_id, [1, counts, latitude, longitude, seen])
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="incident-joins", daemon=True)
+                self._thread.start()
+
+    def _merge(self, incident_id: int, added: list):
+        entry = self._pending.get(incident_id)
+        if entry is None:
+            self._pending[incident_id] = added
+            return
+        entry[0] += added[0]
+        for column, n in added[1].items():
+            entry[1][column] += n
+        entry[2] += added[2]
+        entry[3] += added[3]
+        entry[4] = max(entry[4], added[4])
+
+    def _run(self):
+        while not self._wakeup.wait(self.interval):
+            try:
+                self.flush()
+            except Exception as e:
+                logger.error("Incident join flush failed", extra={"error": str(e)})
+
+    def flush(self) -> int:
+        """Write the pending joins now. Returns how many incidents were updated."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        if not pending:
+            return 0
+        table = models.Incident
+        db = self.session_factory()
+        greatest = func.max if db.get_bind().dialect.name == "sqlite" else func.greatest
+        try:
+            for incident_id in sorted(pending):
+                added, counts, latitude_sum, longitude_sum, seen = pending[incident_id]
+                # Recomputed from the stored count in SQL, so flushes from several workers add up
+                members = table.member_count
+                centre = db.execute(update(table).where(table.id == incident_id).values(
+                    latitude=(table.latitude * members + latitude_sum) / (members + added),
+                    longitude=(table.longitude * members + longitude_sum) / (members + added),
+                    last_seen=greatest(table.last_seen, seen),
+                    member_count=members + added,
+                    **{column: getattr(table, column) + n for column, n in counts.items() if n},
+                ).returning(table.latitude, table.longitude, table.cell)).first()
+                if centre is None:
+                    continue
+                # The centre drifts as members join; keep the incident filed under the cell it is in
+                cell = cell_of(centre.latitude, centre.longitude)
+                if cell != centre.cell:
+                    db.execute(update(table).where(table.id == incident_id).values(cell=cell))
+            http_cache.bump(db, "incidents")
+            db.commit()
+        except Exception:
+            db.rollback()
+            # Put them back for the next flush
+            with self._lock:
+                for incident_id, entry in pending.items():
+                    self._merge(incident_id, entry)
+            raise
+        finally:
+            db.close()
+        return len(pending)
+
+    def shutdown(self):
+        """Stop the background thread and write what is pending."""
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+joins = JoinBuffer()
@@ -0,0 +1,218 @@
+import json
+import mimetypes
+import os
+import tempfile
+import threading
+from contextlib import asynccontextmanager
+from fastapi import HTTPException, UploadFile
+from fastapi.concurrency import run_in_threadpool
+
+try:
+    import fcntl
+except ImportError:  # Windows: uploads are only guarded within one process
+    fcntl = None
+
+# Cloudinary resource_type for each kind of attachment (audio is stored as "video")
+RESOURCE_TYPES = {"image": "image", "video": "video", "audio": "video"}
+
+MAX_UPLOAD_BYTES = {
+    "image": int(os.getenv("MAX_IMAGE_BYTES", str(10 * 1024 * 1024))),
+    "video": int(os.getenv("MAX_VIDEO_BYTES", str(200 * 1024 * 1024))),
+    "audio": int(os.getenv("MAX_AUDIO_BYTES", str(25 * 1024 * 1024))),
+}
+
+# Room for the text fields and multipart framing around the files of one form
+MULTIPART_OVERHEAD_BYTES = int(os.getenv("MULTIPART_OVERHEAD_BYTES", str(1024 * 1024)))
+
+# Multipart routes -> the largest body they take. Enforced while the body arrives,
+# before Starlette has spooled the files to disk (see UploadLimitMiddleware).
+_COMPLAINT_FORM_BYTES = sum(MAX_UPLOAD_BYTES.values()) + MULTIPART_OVERHEAD_BYTES
+MULTIPART_LIMITS = {
+    ("POST", "/complaints/"): _COMPLAINT_FORM_BYTES,
+    ("POST", "/complaints"): _COMPLAINT_FORM_BYTES,
+    ("POST", "/auth/upload-profile-pic"): MAX_UPLOAD_BYTES["image"] + MULTIPART_OVERHEAD_BYTES,
+}
+
+# Where resumable uploads are staged until the last chunk arrives.
+# Deliberately outside uploads/, which is publicly served under /static.
+INCOMING_DIR = os.getenv("UPLOAD_STAGING_DIR", os.path.join(tempfile.gettempdir(), "crime_report_incoming"))
+
+# Network chunks are gathered up to this size, then written from a worker thread
+STAGING_WRITE_BYTES = int(os.getenv("UPLOAD_STAGING_WRITE_BYTES", str(1024 * 1024)))
+
+# Mobile clients often send this instead of a real type
+GENERIC_CONTENT_TYPES = {None, "", "application/octet-stream", "binary/octet-stream"}
+
+def resolve_content_type(content_type: str | None, filename: str | None = None) -> str | None:
+    """Return the declared content type, or a guess from the filename if it is generic."""
+    if content_type not in GENERIC_CONTENT_TYPES:
+        return content_type
+    if filename:
+        return mimetypes.guess_type(filename)[0]
+    return None
+
+def check_media(kind: str, content_type: str | None, size: int | None, filename: str | None = None):
+    """
+    Reject attachments of the wrong type (415) or over the size limit for their kind (413).
+    Files whose type can't be determined are accepted, subject to the size limit.
+    """
+    if kind not in RESOURCE_TYPES:
+        raise HTTPException(status_code=400, detail=f"Unknown media kind: {kind}")
+    resolved = resolve_content_type(content_type, filename)
+    if resolved and not resolved.startswith(f"{kind}/"):
+        raise HTTPException(status_code=415, detail=f"Expected {kind} file, got {resolved}")
+    if size is not None and size > MAX_UPLOAD_BYTES[kind]:
+        raise HTTPException(
+            status_code=413,
+            detail=f"{kind.capitalize()} exceeds the {MAX_UPLOAD_BYTES[kind] // (1024 * 1024)} MB limit"
+        )
+
+def validate_upload(upload: UploadFile, kind: str):
+    """Validate a multipart UploadFile before it is handed to the media store."""
+    size = upload.size
+    if size is None:
+        upload.file.seek(0, os.SEEK_END)
+        size = upload.file.tell()
+        upload.file.seek(0)
+    check_media(kind, upload.content_type, size, upload.filename)
+
+def _too_large(limit: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload exceeds the {limit // (1024 * 1024)} MB limit")
+
+class UploadLimitMiddleware:
+    """
+    Refuses multipart bodies over their route's MULTIPART_LIMITS with a 413:
+    at once when Content-Length declares too much, otherwise as soon as the
+    bytes received pass the limit, so an oversized form is never spooled in
+    full. validate_upload() still applies the per-kind limits afterwards.
+    """
+
+    def __init__(self, app, limits: dict = MULTIPART_LIMITS):
+        self.app = app
+        self.limits = limits
+
+    async def __call__(self, scope, receive, send):
+        limit = self.limits.get((scope["method"], scope["path"])) if scope["type"] == "http" else None
+        if limit is None:
+            await self.app(scope, receive, send)
+            return
+
+        declared = dict(scope["headers"]).get(b"content-length", b"")
+        if declared.isdigit() and int(declared) > limit:
+            body = json.dumps({"detail": _too_large(limit).detail}).encode()
+            await send({
+                "type": "http.response.start",
+                "status": 413,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode()),
+                            (b"connection", b"close")],
+            })
+            await send({"type": "http.response.body", "body": body})
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > limit:
+                    # Raised inside form parsing; FastAPI passes HTTPExceptions through as the response
+                    raise _too_large(limit)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+def staging_path(upload_id: str) -> str:
+    return os.path.join(INCOMING_DIR, f"{upload_id}.part")
+
+def _open_staging(path: str, offset: int):
+    out = open(path, "r+b" if os.path.exists(path) else "wb")
+    out.seek(offset)
+    out.truncate()
+    return out
+
+async def append_chunks(upload_id: str, offset: int, total_size: int, chunks) -> int:
+    """
+    Stream an async iterator of byte chunks into the staging file at `offset`.
+
+    Memory use is bounded by STAGING_WRITE_BYTES plus one network chunk, and
+    file I/O runs in the threadpool so the event loop (and the SOS streams
+    it serves) never waits on the disk. Bytes are counted as they arrive and
+    the request is rejected as soon as it would run past `total_size`.
+    Returns the new offset. If the client disconnects part way, whatever was
+    written is kept so the upload can resume from staged_size().
+    """
+    os.makedirs(INCOMING_DIR, exist_ok=True)
+    out = await run_in_threadpool(_open_staging, staging_path(upload_id), offset)
+    written = 0
+    pending = bytearray()
+    try:
+        async for chunk in chunks:
+            if offset + written + len(pending) + len(chunk) > total_size:
+                raise HTTPException(status_code=413, detail="Chunk runs past the declared upload size")
+            pending += chunk
+            if len(pending) >= STAGING_WRITE_BYTES:
+                await run_in_threadpool(out.write, pending)
+                written += len(pending)
+                pending = bytearray()
+    finally:
+        # Keep what did arrive, even when the client dropped or overran
+        if pending:
+            await run_in_threadpool(out.write, pending)
+            written += len(pending)
+        await run_in_threadpool(out.close)
+    return offset + written
+
+_held = set()
+_held_lock = threading.Lock()
+
+def _acquire(upload_id: str):
+    with _held_lock:
+        if upload_id in _held:
+            return None
+        _held.add(upload_id)
+    if fcntl is None:
+        return upload_id, None
+    os.makedirs(INCOMING_DIR, exist_ok=True)
+    lock_file = open(staging_path(upload_id) + ".lock", "a")
+    try:
+        # Also held against other worker processes; the OS drops it if this one dies
+        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+    except OSError:
+        lock_file.close()
+        with _held_lock:
+            _held.discard(upload_id)
+        return None
+    return upload_id, lock_file
+
+def _release(held):
+    upload_id, lock_file = held
+    if lock_file is not None:
+        lock_file.close()
+    with _held_lock:
+        _held.discard(upload_id)
+
+@asynccontextmanager
+async def exclusive(upload_id: str):
+    """
+    Hold an upload while a PUT writes to it. A second PUT to the same upload
+    while the first is still running gets 409 instead of interleaving bytes.
+    """
+    held = await run_in_threadpool(_acquire, upload_id)
+    if held is None:
+        raise HTTPException(status_code=409, detail="Another request is already writing to this upload")
+    try:
+        yield
+    finally:
+        await run_in_threadpool(_release, held)
+
+def staged_size(upload_id: str) -> int:
+    """Bytes received so far for an upload (the offset to resume from)."""
+    path = staging_path(upload_id)
+    return os.path.getsize(path) if os.path.exists(path) else 0
+
+def discard(upload_id: str):
+    for path in (staging_path(upload_id), staging_path(upload_id) + ".lock"):
+        if os.path.exists(path):
+            os.remove(path)
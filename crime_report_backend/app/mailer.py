@@ -0,0 +1,358 @@
+import heapq
+import os
+import queue
+import smtplib
+import threading
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from dotenv import load_dotenv
+
+from . import log, metrics
+
+load_dotenv()
+
+logger = log.get_logger(__name__)
+
+SMTP_SERVER = os.getenv("SMTP_SERVER", "smtp.gmail.com")
+SMTP_PORT = int(os.getenv("SMTP_PORT", "465"))
+# "ssl" (implicit TLS, port 465), "starttls" (port 587) or "none" (local test servers)
+SMTP_SECURITY = os.getenv("SMTP_SECURITY", "ssl").strip().lower()
+SMTP_TIMEOUT = float(os.getenv("SMTP_TIMEOUT", "10"))
+SENDER_EMAIL = os.getenv("SENDER_EMAIL")
+SENDER_PASSWORD = os.getenv("SENDER_PASSWORD")
+# Delivery threads; each keeps one SMTP connection open and reuses it
+MAIL_WORKERS = int(os.getenv("MAIL_WORKERS", "2"))
+# Messages waiting for a worker before new ones are refused (the endpoint answers 503)
+MAIL_QUEUE_SIZE = int(os.getenv("MAIL_QUEUE_SIZE", "1000"))
+# Messages a worker takes off the queue per wakeup and sends over one connection
+MAIL_BATCH_SIZE = int(os.getenv("MAIL_BATCH_SIZE", "20"))
+# Failed sends are retried this many times, waiting MAIL_RETRY_BACKOFF_SECONDS * 2^n,
+# before the message goes to the mail_dead_letters table
+MAIL_MAX_RETRIES = int(os.getenv("MAIL_MAX_RETRIES", "3"))
+MAIL_RETRY_BACKOFF_SECONDS = float(os.getenv("MAIL_RETRY_BACKOFF_SECONDS", "2"))
+# Close a worker's connection after this long unused (servers drop idle sessions anyway)
+MAIL_IDLE_SECONDS = float(os.getenv("MAIL_IDLE_SECONDS", "60"))
+# Reconnect after this many messages on one connection (providers cap it per session)
+MAIL_MAX_PER_CONNECTION = int(os.getenv("MAIL_MAX_PER_CONNECTION", "100"))
+
+def smtp_configured() -> bool:
+    if not SENDER_EMAIL or SENDER_EMAIL == "your-email@gmail.com":
+        return False
+    # Local stand-ins (aiosmtpd, MailHog) accept mail without a login
+    return bool(SENDER_PASSWORD) or SMTP_SECURITY == "none"
+
+class OutgoingMail:
+    __slots__ = ("recipient", "subject", "html", "attempts", "last_error")
+
+    def __init__(self, recipient: str, subject: str, html: str):
+        self.recipient = recipient
+        self.subject = subject
+        self.html = html
+        self.attempts = 0
+        self.last_error = None
+
+    def as_string(self, sender: str) -> str:
+        msg = MIMEMultipart()
+        msg["From"] = sender
+        msg["To"] = self.recipient
+        msg["Subject"] = self.subject
+        msg.attach(MIMEText(self.html, "html"))
+        return msg.as_string()
+
+# Errors that will not go away by trying again: bad recipient, rejected content, bad credentials
+_PERMANENT = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused, smtplib.SMTPAuthenticationError)
+
+def _is_permanent(error: Exception) -> bool:
+    if isinstance(error, _PERMANENT):
+        return True
+    return isinstance(error, smtplib.SMTPResponseException) and 500 <= error.smtp_code < 600
+
+def _store_dead_letter(mail: OutgoingMail):
+    from . import database, models
+
+    db = database.SessionLocal()
+    try:
+        db.add(models.MailDeadLetter(
+            recipient=mail.recipient,
+            subject=mail.subject,
+            body=mail.html,
+            error=str(mail.last_error)[:1000],
+            attempts=mail.attempts,
+        ))
+        db.commit()
+    finally:
+        db.close()
+
+class _Connection:
+    """One worker's SMTP session, opened on first use and reused until idle or capped."""
+
+    def __init__(self, mailer: "Mailer"):
+        self.mailer = mailer
+        self.smtp = None
+        self.sent = 0
+        self.last_used = 0.0
+
+    def get(self) -> smtplib.SMTP:
+        now = time.monotonic()
+        if self.smtp is not None and (
+            now - self.last_used > self.mailer.idle_seconds or self.sent >= self.mailer.max_per_connection
+        ):
+            self.close()
+        if self.smtp is None:
+            self.smtp = self.mailer.connect()
+            self.sent = 0
+        self.last_used = now
+        return self.smtp
+
+    def close(self):
+        if self.smtp is None:
+            return
+        try:
+            self.smtp.quit()
+        except Exception:
+            try:
+                self.smtp.close()
+            except Exception:
+                pass
+        self.smtp = None
+
+class Mailer:
+    """
+    Sends email from a bounded in-process queue so requests never wait on SMTP.
+    Worker threads each hold a persistent SMTP connection, take batches off
+    the queue, retry transient failures with exponential backoff and record
+    messages that still fail in the dead-letter table.
+    """
+
+    def __init__(
+        self,
+        host: str,
+        port: int,
+        sender: str,
+        username: str | None = None,
+        password: str | None = None,
+        security: str = "ssl",
+        timeout: float = 10,
+        workers: int = 2,
+        queue_size: int = 1000,
+        batch_size: int = 20,
+        max_retries: int = 3,
+        retry_backoff: float = 2,
+        idle_seconds: float = 60,
+        max_per_connection: int = 100,
+        dead_letter=_store_dead_letter,
+    ):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.security = security
+        self.timeout = timeout
+        self.workers = workers
+        self.batch_size = batch_size
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.idle_seconds = idle_seconds
+        self.max_per_connection = max_per_connection
+        self.dead_letter = dead_letter
+
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._retries = []  # heap of (due monotonic time, sequence, OutgoingMail)
+        self._retry_seq = 0
+        self._lock = threading.Lock()
+        self._threads = []
+        self._stopping = False
+        self.sent = 0
+        self.retried = 0
+        self.dead_lettered = 0
+        self.rejected = 0
+        self.connections_opened = 0
+
+    # --------------------------------------------------
+    # PRODUCER SIDE
+    # --------------------------------------------------
+    def enqueue(self, recipient: str, subject: str, html: str) -> bool:
+        """Queue a message for delivery. Returns False (and counts it) when the queue is full."""
+        self.start()
+        try:
+            self._queue.put_nowait(OutgoingMail(recipient, subject, html))
+        except queue.Full:
+            with self._lock:
+                self.rejected += 1
+            logger.warning("Mail queue full, message refused", extra={"to": recipient})
+            return False
+        return True
+
+    def start(self):
+        if self._threads or self._stopping:
+            return
+        with self._lock:
+            if self._threads:
+                return
+            for index in range(self.workers):
+                thread = threading.Thread(target=self._run, name=f"mailer-{index}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def shutdown(self, timeout: float = 30):
+        """Deliver what is already queued, then stop the workers and close their connections."""
+        if not self._threads:
+            return
+        self._stopping = True
+        deadline = time.monotonic() + timeout
+        for thread in self._threads:
+            thread.join(max(0.0, deadline - time.monotonic()))
+        self._threads = []
+        # Retries that were not due before shutdown would be lost otherwise
+        with self._lock:
+            pending, self._retries = self._retries, []
+        for _, _, mail in pending:
+            self._give_up(mail)
+
+    # --------------------------------------------------
+    # WORKERS
+    # --------------------------------------------------
+    def connect(self) -> smtplib.SMTP:
+        if self.security == "ssl":
+            smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout)
+        else:
+            smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+            if self.security == "starttls":
+                smtp.starttls()
+        if self.password:
+            smtp.login(self.username or self.sender, self.password)
+        with self._lock:
+            self.connections_opened += 1
+        return smtp
+
+    def _next_batch(self) -> list[OutgoingMail]:
+        batch = []
+        now = time.monotonic()
+        with self._lock:
+            while self._retries and self._retries[0][0] <= now and len(batch) < self.batch_size:
+                batch.append(heapq.heappop(self._retries)[2])
+            next_retry = self._retries[0][0] - now if self._retries else None
+        if not batch:
+            # Wake up for the next due retry, or periodically to notice idleness and shutdown
+            wait = min(next_retry, 1.0) if next_retry is not None else 1.0
+            try:
+                batch.append(self._queue.get(timeout=max(wait, 0.001)))
+            except queue.Empty:
+                return batch
+        while len(batch) < self.batch_size:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        connection = _Connection(self)
+        try:
+            while True:
+                batch = self._next_batch()
+                if not batch:
+                    if self._stopping and self._queue.empty():
+                        return
+                    if connection.smtp is not None and time.monotonic() - connection.last_used > self.idle_seconds:
+                        connection.close()
+                    continue
+                for mail in batch:
+                    self._deliver(connection, mail)
+        finally:
+            connection.close()
+
+    def _deliver(self, connection: _Connection, mail: OutgoingMail):
+        started = time.perf_counter()
+        mail.attempts += 1
+        try:
+            try:
+                reused = connection.smtp is not None
+                smtp = connection.get()
+                smtp.sendmail(self.sender, mail.recipient, mail.as_string(self.sender))
+            except smtplib.SMTPServerDisconnected:
+                # A kept-alive connection the server has since closed; one fresh try
+                connection.close()
+                if not reused:
+                    raise
+                smtp = connection.get()
+                smtp.sendmail(self.sender, mail.recipient, mail.as_string(self.sender))
+            connection.sent += 1
+        except Exception as e:
+            metrics.smtp_send_duration.labels("error").observe(time.perf_counter() - started)
+            connection.close()
+            mail.last_error = e
+            self._failed(mail)
+            return
+        metrics.smtp_send_duration.labels("ok").observe(time.perf_counter() - started)
+        with self._lock:
+            self.sent += 1
+        logger.info("Email sent", extra={"to": mail.recipient, "attempts": mail.attempts})
+
+    def _failed(self, mail: OutgoingMail):
+        if _is_permanent(mail.last_error) or mail.attempts > self.max_retries:
+            self._give_up(mail)
+            return
+        delay = self.retry_backoff * 2 ** (mail.attempts - 1)
+        logger.warning("Email send failed, will retry", extra={
+            "to": mail.recipient, "attempts": mail.attempts, "retry_in": delay, "error": str(mail.last_error)})
+        with self._lock:
+            self.retried += 1
+            self._retry_seq += 1
+            heapq.heappush(self._retries, (time.monotonic() + delay, self._retry_seq, mail))
+
+    def _give_up(self, mail: OutgoingMail):
+        with self._lock:
+            self.dead_lettered += 1
+        logger.error("Email undeliverable, moved to dead letters", extra={
+            "to": mail.recipient, "attempts": mail.attempts, "error": str(mail.last_error)})
+        try:
+            self.dead_letter(mail)
+        except Exception as e:
+            logger.error("Could not store dead letter", extra={"to": mail.recipient, "error": str(e)})
+
+    def stats(self) -> dict:
+        with self._lock:
+            retry_pending = len(self._retries)
+        return {
+            "workers": len(self._threads),
+            "queued": self._queue.qsize(),
+            "retry_pending": retry_pending,
+            "sent": self.sent,
+            "retried": self.retried,
+            "dead_lettered": self.dead_lettered,
+            "rejected": self.rejected,
+            "connections_opened": self.connections_opened,
+        }
+
+mailer = Mailer(
+    SMTP_SERVER,
+    SMTP_PORT,
+    sender=SENDER_EMAIL,
+    password=SENDER_PASSWORD,
+    security=SMTP_SECURITY,
+    timeout=SMTP_TIMEOUT,
+    workers=MAIL_WORKERS,
+    queue_size=MAIL_QUEUE_SIZE,
+    batch_size=MAIL_BATCH_SIZE,
+    max_retries=MAIL_MAX_RETRIES,
+    retry_backoff=MAIL_RETRY_BACKOFF_SECONDS,
+    idle_seconds=MAIL_IDLE_SECONDS,
+    max_per_connection=MAIL_MAX_PER_CONNECTION,
+)
+
+def _mail_metrics():
+    stats = mailer.stats()
+    return [
+        ("mail_queue_depth", "gauge", "Emails waiting for a delivery worker.", (), {(): stats["queued"]}),
+        ("mail_retry_pending", "gauge", "Emails waiting out a retry backoff.", (), {(): stats["retry_pending"]}),
+        ("mail_sent_total", "counter", "Emails accepted by the SMTP server.", (), {(): stats["sent"]}),
+        ("mail_retried_total", "counter", "Failed sends scheduled for another attempt.", (), {(): stats["retried"]}),
+        ("mail_dead_lettered_total", "counter", "Emails given up on and stored as dead letters.", (), {(): stats["dead_lettered"]}),
+        ("mail_rejected_total", "counter", "Emails refused because the queue was full.", (), {(): stats["rejected"]}),
+        ("smtp_connections_opened_total", "counter", "SMTP sessions opened (low means connections are reused).", (), {(): stats["connections_opened"]}),
+    ]
+
+metrics.REGISTRY.add_collector(_mail_metrics)
@@ -1,15 +1,38 @@
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.staticfiles import StaticFiles
 import os
 
-from . import models
-from .database import engine
-from .routers import auth, complaints, debug, sos
+from . import database, db_stats, http_cache, ingest, log, mailer, media, metrics, models, ratelimit, stats, utils
+from .broadcast import sos_hub
+from .database import SessionLocal, engine
+from .incidents import joins as incident_joins
+from .routers import auth, complaints, debug, heatmap, incidents, responders, sos, uploads
+from .routers import metrics as metrics_router
+
+# --------------------------------------------------
+# BACKGROUND SERVICES (STARTUP / SHUTDOWN)
+# --------------------------------------------------
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    db = SessionLocal()
+    try:
+        stats.ensure_counters(db)
+    finally:
+        db.close()
+    sos_hub.start()
+    yield
+    sos_hub.stop()
+    await database.dispose_async_engine()
+    media.shutdown()
+    mailer.mailer.shutdown()
+    incident_joins.shutdown()
+    utils.password_hasher.shutdown()
 
 # --------------------------------------------------
 # CREATE FASTAPI APP
 # --------------------------------------------------
-app = FastAPI(title="Crime Reporting System API")
+app = FastAPI(title="Crime Reporting System API", lifespan=lifespan)
 
 # --------------------------------------------------
 # ENSURE UPLOADS DIRECTORY EXISTS (IMPORTANT FOR RENDER)
@@ -26,14 +49,36 @@ app.mount("/static", StaticFiles(directory=UPLOAD_DIR), name="static")
 # --------------------------------------------------
 from fastapi.middleware.cors import CORSMiddleware
 
+# Oversized multipart forms get a 413 while they stream in, not after being spooled to disk
+app.add_middleware(ingest.UploadLimitMiddleware)
+# Inside CORS, so 503s from a saturated server still carry CORS headers
+app.add_middleware(ratelimit.AdmissionMiddleware)
+# ETag / 304 and cached responses for polled endpoints; hits skip admission control
+app.add_middleware(http_cache.HTTPCacheMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],  # Allow all origins for dev (React/Flutter)
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[
+        "X-Next-Cursor",  # Keyset pagination cursor for list endpoints
+        "X-Search-Truncated",  # /complaints/search left out matches older than its ranking window
+        "X-DB-Queries", "X-DB-Time-Ms", "X-DB-Conn-Hold-Ms", "X-DB-Flags",  # Per-request DB use
+        "X-Request-ID",  # Matches the request_id field in the server logs
+        "Retry-After",  # On 429 (rate limited) and 503 (server busy)
+        "ETag",  # Send back as If-None-Match on the polled list/stats endpoints
+    ],
 )
 
+# Per-request query count / DB time / connection hold (see app/db_stats.py)
+app.add_middleware(db_stats.DBStatsMiddleware)
+# Request counts, latency histograms and in-flight gauge, served at /metrics
+app.add_middleware(metrics.MetricsMiddleware)
+# Outermost, so every log line written while handling a request carries its id
+app.add_middleware(log.RequestIDMiddleware)
+
 # --------------------------------------------------
 # DATABASE INITIALIZATION
 # --------------------------------------------------
@@ -43,16 +88,16 @@ from sqlalchemy import inspect
 inspector = inspect(engine)
 existing_tables = inspector.get_table_names()
 
-print(f"🔍 Database Dialect: {engine.dialect.name}")
-print(f"🔍 Existing tables: {existing_tables}")
+logger = log.get_logger(__name__)
+logger.info("Database dialect", extra={"dialect": engine.dialect.name, "tables": existing_tables})
 
 if not existing_tables:
-    print("⚠️  No tables found. Creating schema...")
+    logger.warning("No tables found. Creating schema...")
 
 # Run create_all to ensure ANY missing tables (like sos_alerts) are created.
 # This checks existence before creating, so perfectly safe.
 models.Base.metadata.create_all(bind=engine)
-print("✅ Schema verification/update complete.")
+logger.info("Schema verification/update complete.")
 
 # --------------------------------------------------
 # ROUTERS
@@ -60,7 +105,12 @@ print("✅ Schema verification/update complete.")
 app.include_router(auth.router)
 app.include_router(complaints.router)
 app.include_router(debug.router)
+app.include_router(heatmap.router)
+app.include_router(incidents.router)
+app.include_router(metrics_router.router)
+app.include_router(responders.router)
 app.include_router(sos.router)
+app.include_router(uploads.router)
 
 # --------------------------------------------------
 # ROOT ENDPOINT
@@ -0,0 +1,227 @@
+import os
+import shutil
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from fastapi import HTTPException, UploadFile
+
+from . import http_cache, ingest, log, metrics, models
+from .database import SessionLocal
+
+logger = log.get_logger(__name__)
+
+# "cloudinary" in production, "local" to write under uploads/ (dev, benchmarks)
+MEDIA_BACKEND = os.getenv("MEDIA_BACKEND", "cloudinary")
+# "sync": upload before responding. "async": respond at once, upload in the background.
+MEDIA_UPLOAD_MODE = os.getenv("MEDIA_UPLOAD_MODE", "sync")
+MEDIA_UPLOAD_WORKERS = int(os.getenv("MEDIA_UPLOAD_WORKERS", "8"))
+# Max complaints whose media is being uploaded in the background at once.
+# When full, new complaints fall back to uploading on the request path.
+MEDIA_MAX_PENDING = int(os.getenv("MEDIA_MAX_PENDING", "32"))
+MEDIA_UPLOAD_RETRIES = int(os.getenv("MEDIA_UPLOAD_RETRIES", "3"))
+MEDIA_RETRY_BACKOFF_SECONDS = float(os.getenv("MEDIA_RETRY_BACKOFF_SECONDS", "1.0"))
+
+class CloudinaryUploader:
+    """Uploads to Cloudinary (requires CLOUDINARY_URL)."""
+
+    def upload(self, fileobj, resource_type: str) -> str:
+        from .utils_cloudinary import upload_fileobj
+        return upload_fileobj(fileobj, resource_type=resource_type)
+
+class LocalFileUploader:
+    """
+    Writes media under the uploads directory and returns its /static URL.
+    `latency` adds an artificial delay per upload to mimic a remote store in benchmarks.
+    """
+
+    def __init__(self, root: str = "uploads", base_url: str = "/static", latency: float = 0.0):
+        self.root = root
+        self.base_url = base_url
+        self.latency = latency
+
+    def upload(self, fileobj, resource_type: str) -> str:
+        if self.latency:
+            time.sleep(self.latency)
+        folder = os.path.join(self.root, resource_type)
+        os.makedirs(folder, exist_ok=True)
+        name = str(uuid.uuid4())
+        with open(os.path.join(folder, name), "wb") as out:
+            shutil.copyfileobj(fileobj, out)
+        return f"{self.base_url}/{resource_type}/{name}"
+
+def _create_uploader():
+    if MEDIA_BACKEND == "local":
+        return LocalFileUploader()
+    return CloudinaryUploader()
+
+uploader = _create_uploader()
+
+def _upload_one(fileobj, resource_type: str) -> str:
+    """uploader.upload(), timed into media_upload_duration_seconds."""
+    started = time.perf_counter()
+    outcome = "error"
+    try:
+        url = uploader.upload(fileobj, resource_type)
+        outcome = "ok"
+        return url
+    finally:
+        metrics.media_upload_duration.labels(MEDIA_BACKEND, resource_type, outcome).observe(
+            time.perf_counter() - started)
+
+_upload_pool = ThreadPoolExecutor(max_workers=MEDIA_UPLOAD_WORKERS, thread_name_prefix="media-upload")
+_background_pool = ThreadPoolExecutor(max_workers=MEDIA_MAX_PENDING, thread_name_prefix="media-job")
+_background_slots = threading.BoundedSemaphore(MEDIA_MAX_PENDING)
+
+def upload_media(files: dict[str, tuple]) -> dict[str, str]:
+    """
+    Upload several attachments concurrently.
+
+    Args:
+        files: Maps a key (e.g. a column name) to (file object, resource_type).
+
+    Returns:
+        dict: The same keys mapped to the uploaded URLs.
+    """
+    futures = {
+        key: _upload_pool.submit(_upload_one, fileobj, resource_type)
+        for key, (fileobj, resource_type) in files.items()
+    }
+    try:
+        return {key: future.result() for key, future in futures.items()}
+    except Exception as e:
+        logger.error("Media upload failed", extra={"error": str(e)})
+        raise HTTPException(status_code=500, detail=f"Media upload failed: {str(e)}")
+
+def upload_file(file: UploadFile, resource_type: str = "auto") -> str:
+    """Upload a single UploadFile through the configured backend and return its URL."""
+    return upload_media({"file": (file.file, resource_type)})["file"]
+
+def _upload_with_retries(fileobj, resource_type: str) -> str:
+    for attempt in range(MEDIA_UPLOAD_RETRIES):
+        try:
+            fileobj.seek(0)
+            return _upload_one(fileobj, resource_type)
+        except Exception as e:
+            if attempt == MEDIA_UPLOAD_RETRIES - 1:
+                raise
+            logger.warning("Media upload attempt failed, retrying",
+                           extra={"attempt": attempt + 1, "error": str(e)})
+            time.sleep(MEDIA_RETRY_BACKOFF_SECONDS * 2 ** attempt)
+
+def _spool(file: UploadFile):
+    """Copy an UploadFile to a temp file we own; FastAPI closes the original after the response."""
+    copy = tempfile.TemporaryFile()
+    file.file.seek(0)
+    shutil.copyfileobj(file.file, copy)
+    copy.seek(0)
+    return copy
+
+def try_reserve_background_slot() -> bool:
+    """Reserve capacity for one background media job. Pair with schedule_complaint_media."""
+    return MEDIA_UPLOAD_MODE == "async" and _background_slots.acquire(blocking=False)
+
+def release_background_slot():
+    """Give back a slot that was reserved but will not be used."""
+    _background_slots.release()
+
+def schedule_complaint_media(complaint_id: int, files: dict[str, tuple]):
+    """
+    Upload a committed complaint's attachments in the background (with retries)
+    and fill in its path columns and media_status afterwards.
+    Requires a slot from try_reserve_background_slot, which it takes over: the
+    slot is released even if scheduling fails, and the complaint is then
+    marked "failed" instead of being left "processing".
+    """
+    spooled = {}
+    try:
+        for column, (upload, resource_type) in files.items():
+            spooled[column] = (_spool(upload), resource_type)
+        _background_pool.submit(_process_complaint_media, complaint_id, spooled)
+    except Exception as e:
+        logger.error("Could not schedule background media upload",
+                     extra={"complaint_id": complaint_id, "error": str(e)})
+        for fileobj, _ in spooled.values():
+            fileobj.close()
+        _background_slots.release()
+        _set_media_status(complaint_id, {}, "failed")
+
+def schedule_staged_upload(upload_id: str, resource_type: str):
+    """
+    Push a fully received resumable upload to the media store in the background
+    (with retries), then set its url and media_status. Takes over a slot from
+    try_reserve_background_slot like schedule_complaint_media. The staged file
+    is kept if the upload fails, so the client can retry by finishing the upload again.
+    """
+    try:
+        _background_pool.submit(_process_staged_upload, upload_id, resource_type)
+    except Exception as e:
+        logger.error("Could not schedule background media upload", extra={"upload_id": upload_id, "error": str(e)})
+        _background_slots.release()
+        _finish_staged_upload(upload_id, None, "failed")
+
+def _finish_staged_upload(upload_id: str, url: str | None, media_status: str):
+    db = SessionLocal()
+    try:
+        upload = db.get(models.UploadSession, upload_id)
+        if upload:
+            upload.url = url
+            upload.media_status = media_status
+            db.commit()
+    finally:
+        db.close()
+
+def _process_staged_upload(upload_id: str, resource_type: str):
+    try:
+        try:
+            with open(ingest.staging_path(upload_id), "rb") as staged:
+                url = _upload_with_retries(staged, resource_type)
+        except Exception as e:
+            logger.error("Background media upload failed", extra={"upload_id": upload_id, "error": str(e)})
+            _finish_staged_upload(upload_id, None, "failed")
+            return
+        _finish_staged_upload(upload_id, url, "ready")
+        ingest.discard(upload_id)
+    finally:
+        _background_slots.release()
+
+def _set_media_status(complaint_id: int, paths: dict, media_status: str):
+    db = SessionLocal()
+    try:
+        complaint = db.get(models.Complaint, complaint_id)
+        if complaint:
+            for column, url in paths.items():
+                setattr(complaint, column, url)
+            complaint.media_status = media_status
+            http_cache.bump(db, "complaints")
+            db.commit()
+    finally:
+        db.close()
+
+def _process_complaint_media(complaint_id: int, files: dict[str, tuple]):
+    try:
+        futures = {
+            column: _upload_pool.submit(_upload_with_retries, fileobj, resource_type)
+            for column, (fileobj, resource_type) in files.items()
+        }
+        paths = {}
+        failed = False
+        for column, future in futures.items():
+            try:
+                paths[column] = future.result()
+            except Exception as e:
+                failed = True
+                logger.error("Background media upload failed",
+                             extra={"column": column, "complaint_id": complaint_id, "error": str(e)})
+
+        _set_media_status(complaint_id, paths, "failed" if failed else "ready")
+    finally:
+        for fileobj, _ in files.values():
+            fileobj.close()
+        _background_slots.release()
+
+def shutdown():
+    """Wait for in-flight background uploads to finish."""
+    _background_pool.shutdown(wait=True)
+    _upload_pool.shutdown(wait=True)
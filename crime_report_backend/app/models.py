@@ -1,28 +1,50 @@
-from sqlalchemy import Boolean, Column, ForeignKey, Integer, String, DateTime
+from sqlalchemy import DDL, Boolean, Column, ForeignKey, Float, Index, Integer, String, Text, DateTime, event
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
+from datetime import datetime, timezone
 
 from .database import Base
 
+def utcnow():
+    return datetime.now(timezone.utc)
+
 class User(Base):
     __tablename__ = "users"
 
     id = Column(Integer, primary_key=True, index=True)
     name = Column(String, nullable=True)
+    # Always stored normalized (see crud.normalize_email)
     email = Column(String, unique=True, index=True)
     aadhaar_number = Column(String, nullable=True)
     phone_number = Column(String, nullable=True)
     hashed_password = Column(String)
     profile_pic = Column(String, nullable=True)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Maintained by create_complaint (see backfill_complaint_counts.py)
+    complaint_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # Bumped on every write; with the id, it versions the table for the ETags in app/http_cache.py
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+
+    __table_args__ = (
+        Index("ix_users_updated_at_id", "updated_at", "id"),
+        # Guards against case-variant duplicates slipping in outside crud.create_user
+        Index("ux_users_email_lower", func.lower(email), unique=True),
+        # Lets Postgres use an index for email prefix search (LIKE 'abc%')
+        Index("ix_users_email_pattern", "email", postgresql_ops={"email": "text_pattern_ops"}),
+        # Same for the case-insensitive name prefix search; with both, Postgres can OR two index scans
+        Index("ix_users_name_lower_pattern", func.lower(name).label("name_lower"),
+              postgresql_ops={"name_lower": "text_pattern_ops"}),
+    )
 
 class OTP(Base):
     __tablename__ = "otps"
 
     email = Column(String, primary_key=True, index=True)
-    otp = Column(String)
-    expires_at = Column(DateTime(timezone=True))
+    otp = Column(String)  # Cleared once used
+    # Code expiry; once verified, when the row may be deleted (see app/otp_store.py)
+    expires_at = Column(DateTime(timezone=True), index=True)
     is_verified = Column(Boolean, default=False)
+    attempts = Column(Integer, default=0)  # Wrong codes entered for the current OTP
 
 class Complaint(Base):
     __tablename__ = "complaints"
@@ -35,12 +57,67 @@ class Complaint(Base):
     image_path = Column(String, nullable=True)
     video_path = Column(String, nullable=True)
     audio_path = Column(String, nullable=True)
+    # "ready", or "processing" while attachments upload in the background ("failed" if they gave up)
+    media_status = Column(String, default="ready", nullable=True)
     lat = Column(String, nullable=True)
     long = Column(String, nullable=True)
+    # Parsed copies of lat/long for spatial queries (see app/geo.py)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    geohash = Column(String, nullable=True, index=True)
     suspect_details = Column(String, nullable=True)
     status = Column(String, default="Pending")
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
-    
+    # Reports of the same event, grouped by app/incidents.py (unset without coordinates)
+    incident_id = Column(Integer, ForeignKey("incidents.id"), nullable=True, index=True)
+    # Python-side default keeps the stored format identical to bound cursor values on SQLite
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now())
+    # Bumped on every write (e.g. status changes); drives /complaints/changes
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+
+    __table_args__ = (
+        # Backs keyset pagination on /complaints/all (newest first)
+        Index("ix_complaints_created_at_id", "created_at", "id"),
+        Index("ix_complaints_updated_at_id", "updated_at", "id"),
+    )
+
+# Full-text index over title, suspect_details and description (see app/search.py),
+# maintained by the database itself so every write path keeps it current.
+# Postgres: a generated tsvector column with a GIN index. Title and suspect
+# details weigh "A", the description "B".
+COMPLAINT_SEARCH_DDL_POSTGRES = [
+    """ALTER TABLE complaints ADD COLUMN IF NOT EXISTS search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(suspect_details, '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(description, '')), 'B')
+    ) STORED""",
+    "CREATE INDEX IF NOT EXISTS ix_complaints_search_vector ON complaints USING GIN (search_vector)",
+]
+# SQLite: an external-content FTS5 table (it stores only the index) synced by triggers
+COMPLAINT_SEARCH_DDL_SQLITE = [
+    """CREATE VIRTUAL TABLE IF NOT EXISTS complaints_fts USING fts5(
+        title, description, suspect_details, content='complaints', content_rowid='id', tokenize='porter unicode61'
+    )""",
+    """CREATE TRIGGER IF NOT EXISTS complaints_fts_insert AFTER INSERT ON complaints BEGIN
+        INSERT INTO complaints_fts (rowid, title, description, suspect_details)
+        VALUES (new.id, new.title, new.description, new.suspect_details);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS complaints_fts_delete AFTER DELETE ON complaints BEGIN
+        INSERT INTO complaints_fts (complaints_fts, rowid, title, description, suspect_details)
+        VALUES ('delete', old.id, old.title, old.description, old.suspect_details);
+    END""",
+    """CREATE TRIGGER IF NOT EXISTS complaints_fts_update AFTER UPDATE OF title, description, suspect_details
+    ON complaints BEGIN
+        INSERT INTO complaints_fts (complaints_fts, rowid, title, description, suspect_details)
+        VALUES ('delete', old.id, old.title, old.description, old.suspect_details);
+        INSERT INTO complaints_fts (rowid, title, description, suspect_details)
+        VALUES (new.id, new.title, new.description, new.suspect_details);
+    END""",
+]
+# Run by create_all with the table; existing databases use add_complaint_search.py
+for _dialect, _statements in (("postgresql", COMPLAINT_SEARCH_DDL_POSTGRES), ("sqlite", COMPLAINT_SEARCH_DDL_SQLITE)):
+    for _statement in _statements:
+        event.listen(Complaint.__table__, "after_create", DDL(_statement).execute_if(dialect=_dialect))
+
 class SOSAlert(Base):
     __tablename__ = "sos_alerts"
 
@@ -48,5 +125,131 @@ class SOSAlert(Base):
     user_email = Column(String, nullable=True)
     lat = Column(String)
     long = Column(String)
+    # Parsed copies of lat/long for spatial queries (see app/geo.py)
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    geohash = Column(String, nullable=True, index=True)
     status = Column(String, default="Pending", nullable=False)
-    created_at = Column(DateTime(timezone=True), server_default=func.now())
+    # Reports of the same event, grouped by app/incidents.py (unset without coordinates)
+    incident_id = Column(Integer, ForeignKey("incidents.id"), nullable=True, index=True)
+    # Unit sent to the alert by POST /sos/{id}/dispatch (see app/dispatch.py)
+    responder_id = Column(Integer, ForeignKey("responders.id"), nullable=True, index=True)
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now())
+    # Bumped on every write (e.g. status changes); drives /sos/changes
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+
+    __table_args__ = (
+        # Newest-first reads (/sos/all, /sos/export) walk this instead of sorting
+        Index("ix_sos_alerts_created_at_id", "created_at", "id"),
+        Index("ix_sos_alerts_updated_at_id", "updated_at", "id"),
+    )
+
+class UploadSession(Base):
+    """A resumable chunked upload (see routers/uploads.py)."""
+    __tablename__ = "upload_sessions"
+
+    id = Column(String, primary_key=True)
+    kind = Column(String)  # image | video | audio
+    content_type = Column(String, nullable=True)
+    filename = Column(String, nullable=True)
+    total_size = Column(Integer)
+    received = Column(Integer, default=0)
+    url = Column(String, nullable=True)  # Set once the file is in the media store
+    media_status = Column(String, nullable=True)  # processing | ready | failed, once every byte is in
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now())
+
+class StatCounter(Base):
+    """One shard of the running total for a counted table, maintained by app/stats.py."""
+    __tablename__ = "stat_counters"
+
+    name = Column(String, primary_key=True)
+    # Each insert bumps a random shard, so concurrent inserts rarely wait on the same row lock
+    shard = Column(Integer, primary_key=True, default=0)
+    value = Column(Integer, nullable=False, default=0)
+
+class StatBucket(Base):
+    """One slot of a shard's fixed-size ring of time buckets used for rolling 24h counts."""
+    __tablename__ = "stat_buckets"
+
+    name = Column(String, primary_key=True)
+    shard = Column(Integer, primary_key=True, default=0)
+    slot = Column(Integer, primary_key=True)
+    bucket = Column(Integer, nullable=False)  # Unix time // BUCKET_SECONDS this slot currently holds
+    count = Column(Integer, nullable=False, default=0)
+
+class HeatmapCell(Base):
+    """Incident count for one geohash cell, precision and day (see app/heatmap.py)."""
+    __tablename__ = "heatmap_cells"
+
+    source = Column(String, primary_key=True)  # "sos" | "complaints"
+    precision = Column(Integer, primary_key=True)
+    cell = Column(String, primary_key=True)  # Geohash prefix of length `precision`
+    day = Column(Integer, primary_key=True)  # Days since the Unix epoch (UTC)
+    # Each report bumps a random shard, so reports from one area rarely wait on the same row lock
+    shard = Column(Integer, primary_key=True, default=0)
+    count = Column(Integer, nullable=False, default=0)
+
+class Incident(Base):
+    """SOS alerts and complaints close together in space and time (see app/incidents.py)."""
+    __tablename__ = "incidents"
+
+    id = Column(Integer, primary_key=True, index=True)
+    # Running mean of the members' coordinates, and the grid cell it falls in
+    latitude = Column(Float, nullable=False)
+    longitude = Column(Float, nullable=False)
+    cell = Column(String, nullable=False)
+    first_seen = Column(DateTime(timezone=True), nullable=False)
+    last_seen = Column(DateTime(timezone=True), nullable=False)
+    member_count = Column(Integer, nullable=False, default=0)
+    sos_count = Column(Integer, nullable=False, default=0)
+    complaint_count = Column(Integer, nullable=False, default=0)
+    # Bumped on every write; with the id, it versions the table for the ETags in app/http_cache.py
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+
+    __table_args__ = (
+        Index("ix_incidents_updated_at_id", "updated_at", "id"),
+        # Open incidents near a new report: a few cells, recent last_seen
+        Index("ix_incidents_cell_last_seen", "cell", "last_seen"),
+        # /incidents, newest first
+        Index("ix_incidents_first_seen_id", "first_seen", "id"),
+    )
+
+class Responder(Base):
+    """A patrol unit that SOS alerts can be dispatched to, located by heartbeats (see app/dispatch.py)."""
+    __tablename__ = "responders"
+
+    id = Column(Integer, primary_key=True, index=True)
+    name = Column(String, nullable=False)
+    status = Column(String, default="Available", nullable=False)  # Available | Busy | Offline
+    # Position from the latest heartbeat
+    latitude = Column(Float, nullable=True)
+    longitude = Column(Float, nullable=True)
+    last_seen = Column(DateTime(timezone=True), nullable=True)
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now())
+    # Bumped on every write; workers pull rows changed since their last look into their index
+    updated_at = Column(DateTime(timezone=True), default=utcnow, onupdate=utcnow)
+
+    __table_args__ = (
+        Index("ix_responders_updated_at_id", "updated_at", "id"),
+    )
+
+class MailDeadLetter(Base):
+    """An email app/mailer.py gave up on after its retries, kept for inspection or resending."""
+    __tablename__ = "mail_dead_letters"
+
+    id = Column(Integer, primary_key=True, index=True)
+    recipient = Column(String, nullable=False)
+    subject = Column(String)
+    body = Column(Text)
+    error = Column(String)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime(timezone=True), default=utcnow, server_default=func.now())
+
+class RateLimitBucket(Base):
+    """Token bucket shared by all workers when RATE_LIMIT_BACKEND=database (see app/ratelimit.py)."""
+    __tablename__ = "rate_limit_buckets"
+
+    key = Column(String, primary_key=True)  # policy:ip|email:value
+    tokens = Column(Float, nullable=False)
+    updated_at = Column(Float, nullable=False, index=True)  # Unix time of the last refill
+    allowed = Column(Boolean, nullable=False, default=True)  # Outcome of the last take, read back by the upsert
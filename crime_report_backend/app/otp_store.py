@@ -0,0 +1,385 @@
+import datetime
+import hmac
+import os
+import secrets
+import threading
+import time
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import Session
+
+from . import log, metrics, models
+
+logger = log.get_logger(__name__)
+
+# "cached": in-memory TTL map in front of the otps table (default).
+# "db": the otps table only. "memory": no table at all (single process, benchmarks).
+OTP_STORE = os.getenv("OTP_STORE", "cached")
+OTP_TTL_SECONDS = int(os.getenv("OTP_TTL_SECONDS", "300"))
+# Wrong codes allowed per issued OTP; after that only a new OTP can be verified
+OTP_MAX_ATTEMPTS = int(os.getenv("OTP_MAX_ATTEMPTS", "5"))
+# How long a verified email is remembered (is_email_verified) before its row is deleted
+OTP_VERIFIED_TTL_SECONDS = int(os.getenv("OTP_VERIFIED_TTL_SECONDS", "86400"))
+# Emails held in memory; past this, new OTPs live only in the table until entries expire
+OTP_CACHE_MAX_ENTRIES = int(os.getenv("OTP_CACHE_MAX_ENTRIES", "100000"))
+# Seconds between deletes of expired rows from the otps table
+OTP_DB_SWEEP_SECONDS = float(os.getenv("OTP_DB_SWEEP_SECONDS", "60"))
+
+def new_code() -> str:
+    return str(10000 + secrets.randbelow(90000))
+
+def codes_match(expected: str | None, given: str) -> bool:
+    # compare_digest so response time doesn't reveal how many leading digits were right
+    return expected is not None and hmac.compare_digest(expected.encode(), given.encode())
+
+def _to_datetime(timestamp: float) -> datetime.datetime:
+    return datetime.datetime.fromtimestamp(timestamp, datetime.timezone.utc)
+
+def _to_timestamp(value: datetime.datetime) -> float:
+    if value.tzinfo is None:
+        # SQLite returns naive datetimes; they were stored as UTC
+        value = value.replace(tzinfo=datetime.timezone.utc)
+    return value.timestamp()
+
+def _attempts():
+    # Rows written before the attempts column existed hold NULL
+    return func.coalesce(models.OTP.attempts, 0)
+
+class OTPEntry:
+    __slots__ = ("code", "expires_at", "attempts", "verified")
+
+    def __init__(self, code: str | None, expires_at: float, attempts: int = 0, verified: bool = False):
+        self.code = code  # None once used
+        self.expires_at = expires_at  # Unix time; for verified entries, when they are forgotten
+        self.attempts = attempts
+        self.verified = verified
+
+    def usable(self, now: float, max_attempts: int) -> bool:
+        return self.code is not None and not self.verified and self.expires_at > now and self.attempts < max_attempts
+
+class TimeWheel:
+    """
+    Hashed timing wheel: `slots` buckets of `tick` seconds each. Deadlines
+    further out than one turn of the wheel stay in their bucket until the
+    turn they are due. Scheduling and expiring are O(1) per key.
+    """
+
+    def __init__(self, slots: int = 512, tick: float = 1.0):
+        self.slots = slots
+        self.tick = tick
+        self._buckets = [dict() for _ in range(slots)]  # key -> deadline tick
+        self._current = int(time.time() / tick)
+
+    def schedule(self, key, deadline: float):
+        deadline_tick = max(int(deadline / self.tick), self._current)
+        self._buckets[deadline_tick % self.slots][key] = deadline_tick
+
+    def advance(self, now: float) -> list:
+        """Keys whose deadline tick has passed since the last call. They may since have been rescheduled."""
+        due = []
+        target = int(now / self.tick)
+        # After a long pause, one turn visits every bucket
+        for current in range(self._current, min(target, self._current + self.slots) + 1):
+            bucket = self._buckets[current % self.slots]
+            ready = [key for key, deadline_tick in bucket.items() if deadline_tick <= target]
+            for key in ready:
+                del bucket[key]
+            due.extend(ready)
+        self._current = target
+        return due
+
+class DatabaseOTPStore:
+    """Every call reads or writes the otps table. Also the durable tier of CachedOTPStore."""
+
+    def __init__(self, max_attempts: int = OTP_MAX_ATTEMPTS):
+        self.max_attempts = max_attempts
+
+    def save(self, db: Session, email: str, entry: OTPEntry):
+        values = {"email": email, "otp": entry.code, "expires_at": _to_datetime(entry.expires_at),
+                  "attempts": entry.attempts, "is_verified": entry.verified}
+        dialect = postgresql if db.get_bind().dialect.name == "postgresql" else sqlite
+        statement = dialect.insert(models.OTP).values(values)
+        db.execute(statement.on_conflict_do_update(
+            index_elements=["email"],
+            set_={key: statement.excluded[key] for key in values if key != "email"},
+        ))
+        db.commit()
+
+    def load(self, db: Session, email: str) -> OTPEntry | None:
+        table = models.OTP
+        # Plain column values, so ending the read transaction doesn't expire them into a second SELECT
+        row = db.execute(
+            select(table.otp, table.expires_at, table.attempts, table.is_verified).where(table.email == email)
+        ).first()
+        db.rollback()
+        if row is None or row.expires_at is None:
+            return None
+        return OTPEntry(row.otp, _to_timestamp(row.expires_at), row.attempts or 0, bool(row.is_verified))
+
+    def add_attempt(self, db: Session, email: str):
+        db.execute(update(models.OTP).where(models.OTP.email == email)
+                   .values(attempts=_attempts() + 1))
+        db.commit()
+
+    def mark_verified(self, db: Session, email: str, code: str, now: float, keep_until: float) -> bool:
+        """Consume the code if the row still holds it unexpired and unlocked. False if another process changed it."""
+        result = db.execute(
+            update(models.OTP)
+            .where(
+                models.OTP.email == email,
+                models.OTP.otp == code,
+                models.OTP.is_verified.is_not(True),
+                models.OTP.expires_at > _to_datetime(now),
+                _attempts() < self.max_attempts,
+            )
+            .values(otp=None, is_verified=True, expires_at=_to_datetime(keep_until))
+        )
+        db.commit()
+        return result.rowcount == 1
+
+    def delete_expired(self, db: Session, now: float) -> int:
+        result = db.execute(delete(models.OTP).where(models.OTP.expires_at < _to_datetime(now)))
+        db.commit()
+        return result.rowcount
+
+    # Store interface
+    def issue(self, db: Session, email: str, code: str, now: float):
+        self.save(db, email, OTPEntry(code, now + OTP_TTL_SECONDS))
+
+    def verify(self, db: Session, email: str, otp: str, now: float) -> bool:
+        entry = self.load(db, email)
+        if entry is None or not entry.usable(now, self.max_attempts):
+            return False
+        if not codes_match(entry.code, otp):
+            self.add_attempt(db, email)
+            return False
+        return self.mark_verified(db, email, otp, now, now + OTP_VERIFIED_TTL_SECONDS)
+
+    def is_verified(self, db: Session, email: str, now: float) -> bool:
+        entry = self.load(db, email)
+        return entry is not None and entry.verified and entry.expires_at > now
+
+class MemoryOTPStore:
+    """
+    OTPs in a dict, expired by a timing wheel swept from a background thread.
+    Nothing is written to the database, so codes don't survive a restart and
+    aren't shared between worker processes.
+    """
+
+    def __init__(self, max_attempts: int = OTP_MAX_ATTEMPTS, max_entries: int = OTP_CACHE_MAX_ENTRIES):
+        self.max_attempts = max_attempts
+        self.max_entries = max_entries
+        self._entries: dict[str, OTPEntry] = {}
+        self._wheel = TimeWheel()
+        self._lock = threading.Lock()
+        self._sweeper = None
+        self.hits = 0
+        self.misses = 0
+        self.expired = 0
+
+    def _put(self, email: str, entry: OTPEntry) -> bool:
+        with self._lock:
+            if email not in self._entries and len(self._entries) >= self.max_entries:
+                return False
+            self._entries[email] = entry
+            self._wheel.schedule(email, entry.expires_at)
+        self._start_sweeper()
+        return True
+
+    def _get(self, email: str) -> OTPEntry | None:
+        entry = self._entries.get(email)
+        if entry is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return entry
+
+    def sweep(self, now: float | None = None) -> int:
+        """Drop entries past their expiry; returns how many."""
+        now = time.time() if now is None else now
+        removed = 0
+        with self._lock:
+            for email in self._wheel.advance(now):
+                entry = self._entries.get(email)
+                if entry is None:
+                    continue
+                if entry.expires_at <= now:
+                    del self._entries[email]
+                    removed += 1
+                else:
+                    # Reissued or verified since it was scheduled
+                    self._wheel.schedule(email, entry.expires_at)
+            self.expired += removed
+        return removed
+
+    def _sweep_loop(self):
+        while True:
+            time.sleep(self._wheel.tick)
+            try:
+                self.sweep()
+                self._after_sweep()
+            except Exception as e:
+                logger.error("OTP sweep failed", extra={"error": str(e)})
+
+    def _after_sweep(self):
+        pass
+
+    def _start_sweeper(self):
+        if self._sweeper is None:
+            with self._lock:
+                if self._sweeper is None:
+                    self._sweeper = threading.Thread(target=self._sweep_loop, name="otp-sweeper", daemon=True)
+                    self._sweeper.start()
+
+    def _check(self, entry: OTPEntry, otp: str, now: float) -> bool:
+        """Compare and consume under the lock, counting wrong guesses."""
+        with self._lock:
+            if not entry.usable(now, self.max_attempts):
+                return False
+            if not codes_match(entry.code, otp):
+                entry.attempts += 1
+                return False
+            entry.code = None
+            entry.verified = True
+            entry.expires_at = now + OTP_VERIFIED_TTL_SECONDS
+        return True
+
+    # Store interface
+    def issue(self, db: Session, email: str, code: str, now: float):
+        self._put(email, OTPEntry(code, now + OTP_TTL_SECONDS))
+
+    def verify(self, db: Session, email: str, otp: str, now: float) -> bool:
+        entry = self._get(email)
+        if entry is None or not self._check(entry, otp, now):
+            return False
+        self._put(email, entry)
+        return True
+
+    def is_verified(self, db: Session, email: str, now: float) -> bool:
+        entry = self._get(email)
+        return entry is not None and entry.verified and entry.expires_at > now
+
+    def stats(self) -> dict:
+        return {"entries": len(self._entries), "hits": self.hits, "misses": self.misses, "expired": self.expired}
+
+class CachedOTPStore(MemoryOTPStore):
+    """
+    MemoryOTPStore with the otps table as a write-through durable tier.
+    Issuing and verifying write the row; code checks are answered from memory
+    when the email is cached. The row stays authoritative: a wrong code or
+    a cache miss rereads it (another worker process may have reissued the
+    code), and verification only succeeds if the row still holds the code.
+    is_verified trusts an entry this worker verified or loaded and reads the
+    row otherwise.
+    Expired rows are deleted every OTP_DB_SWEEP_SECONDS, so the table only
+    holds live codes and recently verified emails.
+    """
+
+    def __init__(self, durable: DatabaseOTPStore, session_factory=None, **kwargs):
+        super().__init__(**kwargs)
+        self.durable = durable
+        self.session_factory = session_factory
+        self._last_db_sweep = 0.0
+        self.rows_deleted = 0
+
+    def _load(self, db: Session, email: str) -> OTPEntry | None:
+        entry = self.durable.load(db, email)
+        if entry is None:
+            with self._lock:
+                self._entries.pop(email, None)
+        else:
+            self._put(email, entry)
+        return entry
+
+    def issue(self, db: Session, email: str, code: str, now: float):
+        entry = OTPEntry(code, now + OTP_TTL_SECONDS)
+        self.durable.save(db, email, entry)
+        self._put(email, entry)
+
+    def verify(self, db: Session, email: str, otp: str, now: float) -> bool:
+        entry = self._get(email)
+        if entry is None or not (entry.usable(now, self.max_attempts) and codes_match(entry.code, otp)):
+            entry = self._load(db, email)
+            if entry is None or not entry.usable(now, self.max_attempts):
+                return False
+            if not codes_match(entry.code, otp):
+                with self._lock:
+                    entry.attempts += 1
+                self.durable.add_attempt(db, email)
+                return False
+        keep_until = now + OTP_VERIFIED_TTL_SECONDS
+        if not self.durable.mark_verified(db, email, otp, now, keep_until):
+            with self._lock:
+                self._entries.pop(email, None)
+            return False
+        with self._lock:
+            entry.code = None
+            entry.verified = True
+            entry.expires_at = keep_until
+        self._put(email, entry)
+        return True
+
+    def is_verified(self, db: Session, email: str, now: float) -> bool:
+        entry = self._get(email)
+        if entry is None or not entry.verified or entry.expires_at <= now:
+            # Another worker may have verified the email since this one cached it
+            entry = self._load(db, email)
+        return entry is not None and entry.verified and entry.expires_at > now
+
+    def _after_sweep(self):
+        now = time.time()
+        if self.session_factory is None or now - self._last_db_sweep < OTP_DB_SWEEP_SECONDS:
+            return
+        self._last_db_sweep = now
+        db = self.session_factory()
+        try:
+            self.rows_deleted += self.durable.delete_expired(db, now)
+        finally:
+            db.close()
+
+    def stats(self) -> dict:
+        return {**super().stats(), "rows_deleted": self.rows_deleted}
+
+class OTPService:
+    """What crud calls: issues codes and routes checks to the configured backend."""
+
+    def __init__(self, backend):
+        self.backend = backend
+
+    def issue(self, db: Session, email: str, fixed_otp: str | None = None) -> str:
+        code = fixed_otp or new_code()
+        self.backend.issue(db, email, code, time.time())
+        return code
+
+    def verify(self, db: Session, email: str, otp: str) -> bool:
+        return self.backend.verify(db, email, otp, time.time())
+
+    def is_verified(self, db: Session, email: str) -> bool:
+        return self.backend.is_verified(db, email, time.time())
+
+    def stats(self) -> dict:
+        stats = self.backend.stats() if hasattr(self.backend, "stats") else {}
+        return {"backend": OTP_STORE, **stats}
+
+def _create_backend():
+    if OTP_STORE == "db":
+        return DatabaseOTPStore()
+    if OTP_STORE == "memory":
+        return MemoryOTPStore()
+    from .database import SessionLocal
+    return CachedOTPStore(DatabaseOTPStore(), session_factory=SessionLocal)
+
+otp_service = OTPService(_create_backend())
+
+def _otp_metrics():
+    stats = otp_service.stats()
+    if "entries" not in stats:
+        return []
+    return [
+        ("otp_cache_entries", "gauge", "OTPs and verified emails held in memory.", (), {(): stats["entries"]}),
+        ("otp_cache_hits_total", "counter", "OTP checks answered from memory.", (), {(): stats["hits"]}),
+        ("otp_cache_misses_total", "counter", "OTP checks that had to read the otps table.", (), {(): stats["misses"]}),
+        ("otp_expired_total", "counter", "OTP entries dropped from memory by the expiry sweeper.", (), {(): stats["expired"]}),
+    ]
+
+metrics.REGISTRY.add_collector(_otp_metrics)
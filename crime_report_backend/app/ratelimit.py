@@ -0,0 +1,274 @@
+import json
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from fastapi import HTTPException, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy import case, delete, func
+from sqlalchemy.dialects import postgresql, sqlite
+
+from . import log, metrics, models
+from .database import env_flag
+
+logger = log.get_logger(__name__)
+
+RATE_LIMIT_ENABLED = env_flag("RATE_LIMIT_ENABLED", "true")
+# "memory": buckets live in this worker process. "database": one shared row per
+# bucket in rate_limit_buckets, so limits hold across workers and instances.
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "memory")
+# Buckets kept by the memory backend; the least recently used are forgotten (i.e. refilled)
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+# Use the first X-Forwarded-For address as the client IP. Only enable behind a
+# proxy that sets it (Render does); otherwise clients can pick their own key.
+RATE_LIMIT_TRUST_FORWARDED = env_flag("RATE_LIMIT_TRUST_FORWARDED")
+
+# Policies: "requests/seconds" per client IP and per email. The bucket holds
+# `requests` tokens and refills at requests/seconds per second. Empty disables.
+POLICIES = {
+    "login": (os.getenv("RATE_LIMIT_LOGIN_PER_IP", "30/60"), os.getenv("RATE_LIMIT_LOGIN_PER_EMAIL", "10/60")),
+    "signup": (os.getenv("RATE_LIMIT_SIGNUP_PER_IP", "10/60"), ""),
+    "send_otp": (os.getenv("RATE_LIMIT_OTP_PER_IP", "10/600"), os.getenv("RATE_LIMIT_OTP_PER_EMAIL", "3/600")),
+    "verify_otp": (os.getenv("RATE_LIMIT_VERIFY_OTP_PER_IP", "30/600"), ""),
+    "complaint": (os.getenv("RATE_LIMIT_COMPLAINT_PER_IP", "20/60"), os.getenv("RATE_LIMIT_COMPLAINT_PER_EMAIL", "10/60")),
+}
+
+ADMISSION_CONTROL_ENABLED = env_flag("ADMISSION_CONTROL_ENABLED", "true")
+# Requests handled at once, SOS creation excluded. Keep it below the AnyIO
+# threadpool size (40) so the sync endpoints that are let in find a thread;
+# POST /sos/ has threads of its own (see routers/sos.py).
+ADMISSION_MAX_IN_FLIGHT = int(os.getenv("ADMISSION_MAX_IN_FLIGHT", "32"))
+# Past this many in flight, dashboard polling is refused so the rest keep their headroom
+ADMISSION_SHED_AT = int(os.getenv("ADMISSION_SHED_AT", "24"))
+
+def parse_rate(value: str) -> tuple[float, float] | None:
+    """"30/60" -> (capacity 30, refill 0.5 per second)."""
+    if not value:
+        return None
+    requests, seconds = value.split("/")
+    return float(requests), float(requests) / float(seconds)
+
+class MemoryBackend:
+    """Token buckets in an LRU-bounded dict, for a single worker process."""
+
+    blocking = False
+
+    def __init__(self, max_keys: int = RATE_LIMIT_MAX_KEYS):
+        self.max_keys = max_keys
+        self._buckets = OrderedDict()  # key -> [tokens, last refill]
+        self._lock = threading.Lock()
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> tuple[bool, float]:
+        """Take one token. Returns (allowed, tokens left); tokens left is fractional when refused."""
+        with self._lock:
+            bucket = self._buckets.get(key)
+            if bucket is None:
+                bucket = self._buckets[key] = [capacity, now]
+                if len(self._buckets) > self.max_keys:
+                    self._buckets.popitem(last=False)
+            else:
+                self._buckets.move_to_end(key)
+            tokens = min(capacity, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+            allowed = tokens >= 1
+            bucket[0] = tokens - 1 if allowed else tokens
+            return allowed, bucket[0]
+
+class DatabaseBackend:
+    """
+    Token buckets as rows of rate_limit_buckets, refilled and taken in one
+    upsert so concurrent workers can't both spend the last token.
+    """
+
+    blocking = True
+    # Rows idle this long are full again whatever their policy, so they can go
+    PRUNE_AFTER_SECONDS = 3600
+
+    def __init__(self, session_factory):
+        self.session_factory = session_factory
+        self._last_prune = 0.0
+
+    def take(self, key: str, capacity: float, rate: float, now: float) -> tuple[bool, float]:
+        table = models.RateLimitBucket
+        db = self.session_factory()
+        try:
+            is_postgres = db.get_bind().dialect.name == "postgresql"
+            dialect = postgresql if is_postgres else sqlite
+            least = func.least if is_postgres else func.min
+            refilled = least(capacity, table.tokens + (now - table.updated_at) * rate)
+            statement = dialect.insert(table).values(key=key, tokens=capacity - 1, updated_at=now, allowed=True)
+            statement = statement.on_conflict_do_update(
+                index_elements=["key"],
+                set_={
+                    "tokens": case((refilled >= 1, refilled - 1), else_=refilled),
+                    "updated_at": now,
+                    "allowed": refilled >= 1,
+                },
+            ).returning(table.allowed, table.tokens)
+            allowed, tokens = db.execute(statement).one()
+            if now - self._last_prune > self.PRUNE_AFTER_SECONDS:
+                self._last_prune = now
+                db.execute(delete(table).where(table.updated_at < now - self.PRUNE_AFTER_SECONDS))
+            db.commit()
+            return bool(allowed), tokens
+        finally:
+            db.close()
+
+class RateLimiter:
+    def __init__(self, backend, policies: dict, enabled: bool = True):
+        self.backend = backend
+        self.enabled = enabled
+        self.policies = {
+            name: (parse_rate(per_ip), parse_rate(per_email)) for name, (per_ip, per_email) in policies.items()
+        }
+        self._limited = {}
+
+    def check(self, request: Request, policy: str, email: str | None = None):
+        """Spend a token from the client's IP bucket (and email bucket) for `policy`, or raise 429."""
+        if not self.enabled:
+            return
+        per_ip, per_email = self.policies[policy]
+        now = time.time()
+        checks = []
+        if per_ip:
+            checks.append(("ip", client_ip(request), per_ip))
+        if per_email and email:
+            checks.append(("email", email.strip().lower(), per_email))
+        for key_type, value, (capacity, rate) in checks:
+            allowed, tokens = self.backend.take(f"{policy}:{key_type}:{value}", capacity, rate, now)
+            if not allowed:
+                self._count(policy, key_type)
+                retry_after = max(1, math.ceil((1 - tokens) / rate))
+                logger.info("Rate limited", extra={"policy": policy, "key_type": key_type, "retry_after": retry_after})
+                raise HTTPException(status_code=429, detail="Too many requests, please retry later",
+                                    headers={"Retry-After": str(retry_after)})
+
+    async def check_async(self, request: Request, policy: str, email: str | None = None):
+        """check() for async endpoints; shared backends run off the event loop."""
+        if self.backend.blocking and self.enabled:
+            await run_in_threadpool(self.check, request, policy, email)
+        else:
+            self.check(request, policy, email)
+
+    def _count(self, policy: str, key_type: str):
+        child = self._limited.get((policy, key_type))
+        if child is None:
+            child = self._limited[(policy, key_type)] = rate_limited.labels(policy, key_type)
+        child.inc()
+
+def client_ip(request: Request) -> str:
+    if RATE_LIMIT_TRUST_FORWARDED:
+        forwarded = request.headers.get("x-forwarded-for")
+        if forwarded:
+            return forwarded.split(",")[0].strip()
+    return request.client.host if request.client else "unknown"
+
+def _create_backend():
+    if RATE_LIMIT_BACKEND == "database":
+        from .database import SessionLocal
+        return DatabaseBackend(SessionLocal)
+    return MemoryBackend()
+
+rate_limited = metrics.Counter(
+    "rate_limited_total", "Requests refused with 429 by a rate limit policy.", ("policy", "key_type"))
+limiter = RateLimiter(_create_backend(), POLICIES, enabled=RATE_LIMIT_ENABLED)
+
+# --------------------------------------------------
+# PRIORITY ADMISSION CONTROL
+# --------------------------------------------------
+# Always admitted and not counted: SOS creation, live streams, monitoring
+CRITICAL = "critical"
+# Refused first when busy: dashboard reads that the client polls again anyway
+SHEDDABLE = "sheddable"
+NORMAL = "normal"
+
+_CRITICAL_REQUESTS = {("POST", "/sos/"), ("POST", "/sos"), ("GET", "/sos/stream"), ("GET", "/metrics")}
+# Counted only until their headers go out: an export can stream for minutes, and
+# EXPORT_MAX_CONCURRENT (app/export.py) already bounds how many run at once
+_STREAMED_PATHS = {"/complaints/export", "/sos/export"}
+_SHEDDABLE_PREFIXES = (
+    "/complaints/all", "/complaints/recent", "/complaints/stats", "/complaints/changes",
+    "/complaints/within", "/complaints/near", "/sos/all", "/sos/stats", "/sos/changes",
+    "/sos/within", "/sos/near", "/heatmap", "/incidents", "/responders", "/auth/users", "/debug",
+)
+
+def priority(method: str, path: str) -> str:
+    if (method, path) in _CRITICAL_REQUESTS:
+        return CRITICAL
+    if method == "GET" and path.startswith(_SHEDDABLE_PREFIXES):
+        return SHEDDABLE
+    return NORMAL
+
+_BUSY_BODY = json.dumps({"detail": "Server busy, please retry shortly"}).encode()
+
+admission_rejected = metrics.Counter(
+    "admission_rejected_total", "Requests refused with 503 because the server was saturated.", ("priority",))
+
+class AdmissionMiddleware:
+    """
+    Bounds how many requests are handled at once. SOS creation is always
+    admitted; past ADMISSION_SHED_AT in flight, dashboard polling gets a 503;
+    past ADMISSION_MAX_IN_FLIGHT, so does everything else. Exports stop
+    counting once they start streaming.
+    """
+
+    def __init__(self, app, max_in_flight: int = ADMISSION_MAX_IN_FLIGHT, shed_at: int = ADMISSION_SHED_AT,
+                 enabled: bool = ADMISSION_CONTROL_ENABLED):
+        self.app = app
+        self.max_in_flight = max_in_flight
+        self.shed_at = shed_at
+        self.enabled = enabled
+        self.in_flight = {CRITICAL: 0, NORMAL: 0, SHEDDABLE: 0}
+        self._rejected = {level: admission_rejected.labels(level) for level in (NORMAL, SHEDDABLE)}
+        _middlewares.append(self)
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not self.enabled:
+            await self.app(scope, receive, send)
+            return
+
+        level = priority(scope["method"], scope["path"])
+        # Single event loop thread: plain counters need no lock
+        busy = self.in_flight[NORMAL] + self.in_flight[SHEDDABLE]
+        limit = self.shed_at if level == SHEDDABLE else self.max_in_flight
+        if level != CRITICAL and busy >= limit:
+            self._rejected[level].inc()
+            await send({
+                "type": "http.response.start",
+                "status": 503,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(_BUSY_BODY)).encode()),
+                            (b"retry-after", b"1")],
+            })
+            await send({"type": "http.response.body", "body": _BUSY_BODY})
+            return
+
+        self.in_flight[level] += 1
+        counted = True
+
+        def finished():
+            nonlocal counted
+            if counted:
+                counted = False
+                self.in_flight[level] -= 1
+
+        async def send_streamed(message):
+            if message["type"] == "http.response.start":
+                finished()
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_streamed if scope["path"] in _STREAMED_PATHS else send)
+        finally:
+            finished()
+
+_middlewares = []
+
+def _admission_metrics():
+    samples = {}
+    for middleware in _middlewares:
+        for level, count in middleware.in_flight.items():
+            samples[(level,)] = samples.get((level,), 0) + count
+    return [("admission_in_flight", "gauge", "Requests being handled, by admission priority.", ("priority",), samples)]
+
+metrics.REGISTRY.add_collector(_admission_metrics)
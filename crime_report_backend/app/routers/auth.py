@@ -1,41 +1,70 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request
+from fastapi.concurrency import run_in_threadpool
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from .. import schemas, crud, utils, database, models
+from .. import schemas, crud, utils, database, models, media, ingest, pagination, log, ratelimit, http_cache, serialization
 from ..utils_email import send_otp_email
-from ..database import SessionLocal
-from ..utils_cloudinary import upload_to_cloudinary
+
+logger = log.get_logger(__name__)
 
 router = APIRouter(
     prefix="/auth",
     tags=["Authentication"]
 )
 
-# Dependency
-def get_db():
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# /users/all selects just these and encodes the rows directly (see app/serialization.py)
+USER_DETAIL_COLUMNS = serialization.columns(models.User, schemas.UserDetail)
+
+def lookup_user_and_release(db: Session, email: str):
+    """
+    Look up a user, then end the transaction so the pooled connection is not
+    held while bcrypt runs. The returned user is detached from the session.
+    """
+    db_user = crud.get_user_by_email(db, email=email)
+    if db_user:
+        db.expunge(db_user)
+    db.rollback()
+    return db_user
 
 @router.post("/signup", response_model=schemas.User)
-def signup(user: schemas.UserCreate, db: Session = Depends(get_db)):
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def signup(user: schemas.UserCreate, request: Request, db: Session = Depends(database.get_db)):
+    await ratelimit.limiter.check_async(request, "signup")
+    db_user = await run_in_threadpool(lookup_user_and_release, db, email=user.email)
     if db_user:
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # OTP verification removed
-    return crud.create_user(db=db, user=user)
+    return await crud.create_user(db=db, user=user)
+
+@router.post("/send-otp", status_code=status.HTTP_202_ACCEPTED)
+def send_otp(otp_request: schemas.OTPRequest, request: Request, db: Session = Depends(database.get_db)):
+    """Create a one-time code for the email and queue it for delivery; returns before the mail is sent."""
+    ratelimit.limiter.check(request, "send_otp", otp_request.email)
+    otp = crud.create_otp(db, email=otp_request.email)
+    if not send_otp_email(otp_request.email, otp):
+        raise HTTPException(status_code=503, detail="Server busy, please retry shortly")
+    return {"message": "OTP sent"}
+
+@router.post("/verify-otp")
+def verify_otp(otp_verify: schemas.OTPVerify, request: Request, db: Session = Depends(database.get_db)):
+    ratelimit.limiter.check(request, "verify_otp")
+    if not crud.verify_otp(db, email=otp_verify.email, otp=otp_verify.otp):
+        raise HTTPException(status_code=400, detail="Invalid or expired OTP")
+    return {"message": "Email verified"}
 
 @router.post("/login")
-def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
-    print(f"DEBUG: Login attempt for email: '{user.email}'")
-    db_user = crud.get_user_by_email(db, email=user.email)
+async def login(user: schemas.UserLogin, request: Request, db: Session = Depends(database.get_db)):
+    logger.debug("Login attempt", extra={"email": user.email})
+    # Before the lookup and bcrypt, the expensive parts a retry storm would repeat
+    await ratelimit.limiter.check_async(request, "login", user.email)
+    db_user = await run_in_threadpool(lookup_user_and_release, db, email=user.email)
     if not db_user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
-    if not utils.verify_password(user.password, db_user.hashed_password):
+    valid, new_hash = await utils.password_hasher.verify_and_update(user.password, db_user.hashed_password)
+    if not valid:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="Invalid credentials")
+    if new_hash:
+        # bcrypt settings changed since this hash was made; upgrade it transparently
+        await run_in_threadpool(crud.update_password_hash, db, db_user.id, new_hash)
     return {
         "message": "Login successful",
         "user_id": db_user.id,
@@ -48,45 +77,36 @@ def login(user: schemas.UserLogin, db: Session = Depends(get_db)):
 def upload_profile_pic(
     email: str = Form(...),
     file: UploadFile = File(...),
-    db: Session = Depends(get_db)
+    db: Session = Depends(database.get_db)
 ):
-    """Upload a profile picture for a user. Returns the Cloudinary URL."""
+    """Upload a profile picture for a user. Returns the media URL."""
     db_user = crud.get_user_by_email(db, email=email)
     if not db_user:
         raise HTTPException(status_code=404, detail="User not found")
-    url = upload_to_cloudinary(file, resource_type="image")
+    ingest.validate_upload(file, "image")
+    url = media.upload_file(file, resource_type="image")
     db_user.profile_pic = url
+    http_cache.bump(db, "users")
     db.commit()
     db.refresh(db_user)
     return {"profile_pic": url, "message": "Profile picture updated successfully"}
 
 @router.get("/users", response_model=list[str])
-def get_all_user_emails(db: Session = Depends(get_db)):
+def get_all_user_emails(db: Session = Depends(database.get_db)):
     users = db.query(models.User).all()
     return [user.email for user in users]
 
 @router.get("/users/all", response_model=list[schemas.UserDetail])
-def get_all_users_detail(db: Session = Depends(get_db)):
-    """Return all registered users with their complaint counts."""
-    results = (
-        db.query(
-            models.User,
-            func.count(models.Complaint.id).label("complaint_count")
-        )
-        .outerjoin(models.Complaint, models.Complaint.user_email == models.User.email)
-        .group_by(models.User.id)
-        .order_by(models.User.id.desc())
-        .all()
-    )
-    return [
-        schemas.UserDetail(
-            id=user.id,
-            name=user.name,
-            email=user.email,
-            profile_pic=user.profile_pic,
-            phone_number=user.phone_number,
-            created_at=user.created_at,
-            complaint_count=count,
-        )
-        for user, count in results
-    ]
+def get_all_users_detail(
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: int | None = None,
+    q: str | None = None,
+    db: Session = Depends(database.get_db)
+):
+    """
+    Return registered users with their complaint counts, newest first, one page at a time.
+    `q` filters by email or name prefix. Pass the X-Next-Cursor response header back as `cursor`.
+    """
+    users, has_more = crud.get_users_page(db, limit=limit, before_id=cursor, search=q, columns=USER_DETAIL_COLUMNS)
+    headers = {"X-Next-Cursor": str(users[-1].id)} if has_more else {}
+    return serialization.RowsResponse(users, schemas.UserDetail, headers=headers)
@@ -1,22 +1,26 @@
-from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form
+from fastapi import APIRouter, Depends, HTTPException, status, UploadFile, File, Form, Query, Request
 from pydantic import BaseModel
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from .. import schemas, models, database, crud
-from sqlalchemy import func
-from datetime import datetime, timedelta, timezone
-import shutil
-import os
-import uuid
+from .. import schemas, models, database, crud, pagination, media, ingest, stats, geo, heatmap, http_cache, log, ratelimit, export, serialization, search, incidents
+from sqlalchemy import select
+from datetime import datetime
+
+logger = log.get_logger(__name__)
 
 router = APIRouter(
     prefix="/complaints",
     tags=["Complaints"],
 )
 
+# List endpoints select just these and encode the rows directly (see app/serialization.py)
+COMPLAINT_COLUMNS = serialization.columns(models.Complaint, schemas.Complaint)
+
 
 
 @router.post("/", response_model=schemas.Complaint)
 def create_complaint(
+    request: Request,
     title: str = Form(...),
     description: str = Form(...),
     crime_type: str = Form(...),
@@ -27,58 +31,92 @@ def create_complaint(
     lat: str = Form(None),
     long: str = Form(None),
     suspect_details: str = Form(None),
+    image_upload_id: str = Form(None),
+    video_upload_id: str = Form(None),
+    audio_upload_id: str = Form(None),
     db: Session = Depends(database.get_db)
 ):
+    ratelimit.limiter.check(request, "complaint", user_email)
     # Robust lookup using CRUD
     user = crud.get_user_by_email(db, email=user_email)
     
     if not user:
-        print(f"DEBUG: User not found for email: '{user_email}'")
-        # Print all emails to help debug
-        all_emails = [u.email for u in db.query(models.User).all()]
-        print(f"DEBUG: Available emails: {all_emails}")
+        logger.info("Complaint rejected: user not found", extra={"email": user_email})
         raise HTTPException(status_code=404, detail=f"User not found for {user_email}")
 
-    image_path = None
-    video_path = None
-    audio_path = None
+    # Attachments keyed by the column that will hold their URL
+    attachments = {}
+    for column, upload, kind in (
+        ("image_path", image, "image"),
+        ("video_path", video, "video"),
+        ("audio_path", audio, "audio"),
+    ):
+        if upload:
+            ingest.validate_upload(upload, kind)
+            attachments[column] = (upload, ingest.RESOURCE_TYPES[kind])
 
-    from ..utils_cloudinary import upload_to_cloudinary
+    # Attachments already sent through resumable /uploads sessions
+    paths = {}
+    for column, upload_id, kind in (
+        ("image_path", image_upload_id, "image"),
+        ("video_path", video_upload_id, "video"),
+        ("audio_path", audio_upload_id, "audio"),
+    ):
+        if upload_id:
+            session = db.get(models.UploadSession, upload_id)
+            if session and session.kind == kind and session.media_status == "processing":
+                raise HTTPException(status_code=409, detail=f"Upload {upload_id} is still being stored, retry shortly")
+            if not session or not session.url or session.kind != kind:
+                raise HTTPException(status_code=400, detail=f"Upload {upload_id} is not a completed {kind} upload")
+            paths[column] = session.url
 
-    if image:
-        print(f"DEBUG: Uploading image to Cloudinary...")
-        image_path = upload_to_cloudinary(image, resource_type="image")
-        print(f"DEBUG: Image uploaded: {image_path}")
-    
-    if video:
-        print(f"DEBUG: Uploading video to Cloudinary...")
-        video_path = upload_to_cloudinary(video, resource_type="video")
-        print(f"DEBUG: Video uploaded: {video_path}")
-        
-    if audio:
-        print(f"DEBUG: Uploading audio to Cloudinary...")
-        # Cloudinary handles audio files under the "video" resource_type
-        audio_path = upload_to_cloudinary(audio, resource_type="video") 
-        print(f"DEBUG: Audio uploaded: {audio_path}")
-
-    new_complaint = models.Complaint(
-        title=title,
-        description=description,
-        crime_type=crime_type,
-        user_email=user_email,
-        image_path=image_path,
-        video_path=video_path,
-        audio_path=audio_path,
-        lat=lat,
-        long=long,
-        suspect_details=suspect_details,
-        status="Pending"
-    )
-    
-    db.add(new_complaint)
-    db.commit()
+    background = bool(attachments) and media.try_reserve_background_slot()
+    # Until schedule_complaint_media takes it over, the slot is ours to give back if anything fails
+    try:
+        if attachments and not background:
+            logger.debug("Uploading attachments concurrently", extra={"attachments": list(attachments)})
+            paths.update(media.upload_media({
+                column: (upload.file, resource_type)
+                for column, (upload, resource_type) in attachments.items()
+            }))
+            logger.debug("Media uploaded", extra={"paths": paths})
+
+        latitude, longitude, geohash = geo.locate(lat, long)
+        new_complaint = models.Complaint(
+            title=title,
+            description=description,
+            crime_type=crime_type,
+            user_email=user.email,
+            image_path=paths.get("image_path"),
+            video_path=paths.get("video_path"),
+            audio_path=paths.get("audio_path"),
+            media_status="processing" if background else "ready",
+            lat=lat,
+            long=long,
+            latitude=latitude,
+            longitude=longitude,
+            geohash=geohash,
+            suspect_details=suspect_details,
+            status="Pending"
+        )
+
+        db.add(new_complaint)
+        crud.increment_complaint_count(db, user.id)
+        stats.record(db, "complaints")
+        heatmap.record(db, "complaints", geohash)
+        incidents.assign(db, "complaint", new_complaint)
+        http_cache.bump(db, "complaints")
+        db.commit()
+    except Exception:
+        if background:
+            media.release_background_slot()
+        raise
+
+    if background:
+        # Never raises; on failure the complaint is marked "failed" and the slot released
+        media.schedule_complaint_media(new_complaint.id, attachments)
     db.refresh(new_complaint)
-    
+
     return new_complaint
 
 @router.get("/my-complaints", response_model=list[schemas.Complaint])
@@ -89,20 +127,17 @@ def get_my_complaints(user_email: str, db: Session = Depends(database.get_db)):
     if not user:
          raise HTTPException(status_code=404, detail="User not found")
          
-    return crud.get_user_complaints(db=db, user_email=user_email)
+    return serialization.RowsResponse(
+        crud.get_user_complaints(db=db, user_email=user.email, columns=COMPLAINT_COLUMNS), schemas.Complaint
+    )
 
 @router.get("/stats")
-def get_complaint_stats(db: Session = Depends(database.get_db)):
+async def get_complaint_stats(db: AsyncSession = Depends(database.get_async_db)):
     """
     Get total complaints and today's complaints count.
     """
-    # Use 24h window for "Today" stats (rolling window)
-    total_complaints = db.query(models.Complaint).count()
-    cutoff = datetime.now(timezone.utc) - timedelta(hours=24)
-    
-    today_complaints = db.query(models.Complaint).filter(
-        models.Complaint.created_at >= cutoff
-    ).count()
+    # Served from incrementally maintained counters (rolling 24h window for "Today")
+    total_complaints, today_complaints = await stats.get_counts_async(db, "complaints")
     
     return {
         "total_complaints": total_complaints,
@@ -110,18 +145,166 @@ def get_complaint_stats(db: Session = Depends(database.get_db)):
     }
 
 @router.get("/recent", response_model=list[schemas.Complaint])
-def get_recent_complaints(limit: int = 5, db: Session = Depends(database.get_db)):
+async def get_recent_complaints(limit: int = 5, db: AsyncSession = Depends(database.get_async_db)):
     """
     Get the most recent complaints.
     """
-    return db.query(models.Complaint).order_by(models.Complaint.created_at.desc()).limit(limit).all()
+    result = await db.execute(
+        select(*COMPLAINT_COLUMNS).order_by(models.Complaint.created_at.desc()).limit(limit)
+    )
+    return serialization.RowsResponse(result.all(), schemas.Complaint)
 
 @router.get("/all", response_model=list[schemas.Complaint])
-def get_all_complaints(db: Session = Depends(database.get_db)):
+async def get_all_complaints(
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    status: str | None = None,
+    crime_type: str | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """
+    Get complaints (admin view), ordered newest first, one page at a time.
+    Pass the X-Next-Cursor response header back as `cursor` to fetch the next page.
+    """
+    complaints, has_more = await db.run_sync(
+        crud.get_complaints_page,
+        limit=limit,
+        cursor=pagination.decode_cursor(cursor) if cursor else None,
+        status=status,
+        crime_type=crime_type,
+        created_after=created_after,
+        created_before=created_before,
+        columns=COMPLAINT_COLUMNS,
+    )
+    headers = {}
+    if has_more:
+        last = complaints[-1]
+        headers["X-Next-Cursor"] = pagination.encode_cursor(last.created_at, last.id)
+    return serialization.RowsResponse(complaints, schemas.Complaint, headers=headers)
+
+@router.get("/export")
+async def export_complaints(
+    format: str = "ndjson",
+    status: str | None = None,
+    crime_type: str | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+):
     """
-    Get all complaints (admin view), ordered newest first.
+    Download every complaint matching the filters (the same ones as /complaints/all),
+    newest first, as `ndjson`, `csv` or `parquet`. The file is streamed as it is read.
     """
-    return db.query(models.Complaint).order_by(models.Complaint.created_at.desc()).all()
+    return export.stream(
+        models.Complaint,
+        export.COMPLAINT_COLUMNS,
+        crud.complaint_filters(status, crime_type, created_after, created_before),
+        format,
+    )
+
+@router.get("/search", response_model=list[schemas.Complaint])
+def search_complaints(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: int = Query(0, ge=0),
+    status: str | None = None,
+    crime_type: str | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    db: Session = Depends(database.get_db)
+):
+    """
+    Full-text search over title, description and suspect details, best match first.
+    `q` takes words (all must match), "quoted phrases" and -excluded words.
+    Pass the X-Next-Cursor response header back as `cursor` to fetch the next page.
+    Only the newest SEARCH_RANK_WINDOW matches are ranked: when older ones were
+    left out, the last page says X-Search-Truncated: true; narrow the search
+    (e.g. created_before) to reach them.
+    """
+    complaints, has_more, truncated = search.search_complaints(
+        db,
+        q,
+        limit=limit,
+        offset=cursor,
+        filters=crud.complaint_filters(status, crime_type, created_after, created_before),
+        columns=COMPLAINT_COLUMNS,
+    )
+    headers = {"X-Next-Cursor": str(cursor + limit)} if has_more else {}
+    if truncated:
+        headers["X-Search-Truncated"] = "true"
+    return serialization.RowsResponse(complaints, schemas.Complaint, headers=headers)
+
+@router.get("/within", response_model=list[schemas.Complaint])
+def get_complaints_within(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    limit: int = Query(pagination.MAX_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Get complaints inside a bounding box (e.g. the visible map area), newest first.
+    """
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="min_lat/min_lon must not exceed max_lat/max_lon")
+    return serialization.RowsResponse(crud.get_points_in_bbox(
+        db,
+        models.Complaint,
+        (min_lat, min_lon, max_lat, max_lon),
+        limit=limit,
+        created_after=created_after,
+        created_before=created_before,
+        columns=COMPLAINT_COLUMNS,
+    ), schemas.Complaint)
+
+@router.get("/near", response_model=list[schemas.Complaint])
+def get_complaints_near(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(1000, gt=0, le=100000),
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Get complaints within `radius_m` metres of a point, nearest first.
+    """
+    return serialization.RowsResponse(crud.get_points_near(
+        db,
+        models.Complaint,
+        lat,
+        lon,
+        radius_m,
+        limit=limit,
+        created_after=created_after,
+        created_before=created_before,
+        columns=COMPLAINT_COLUMNS,
+    ), schemas.Complaint)
+
+@router.get("/changes", response_model=schemas.ComplaintChanges)
+def get_complaint_changes(
+    since: str | None = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Get complaints created or updated after the `since` cursor, oldest change first.
+    Poll again with the returned `cursor` to receive only new activity. Rows just
+    behind the cursor are re-sent in case they committed late; dedupe on (id, updated_at).
+    """
+    complaints, has_more, next_cursor = crud.get_changes_since(
+        db,
+        models.Complaint,
+        limit=limit,
+        cursor=pagination.decode_cursor(since) if since else None,
+    )
+    cursor = pagination.encode_cursor(*next_cursor) if next_cursor else since
+    return {"items": complaints, "cursor": cursor, "has_more": has_more}
 
 ALLOWED_STATUSES = {"Pending", "Dispatched", "Resolved", "Terminated"}
 
@@ -144,6 +327,7 @@ def update_complaint_status(
     if not complaint:
         raise HTTPException(status_code=404, detail="Complaint not found")
     complaint.status = update.status
+    http_cache.bump(db, "complaints")
     db.commit()
     db.refresh(complaint)
     return complaint
@@ -1,7 +1,7 @@
 from fastapi import APIRouter, Depends, HTTPException
 from sqlalchemy.orm import Session
 from sqlalchemy import text
-from .. import database, models
+from .. import database, db_stats, mailer, models, otp_store, utils, stats
 
 router = APIRouter(
     prefix="/debug",
@@ -51,6 +51,46 @@ def get_users_count(db: Session = Depends(database.get_db)):
     except Exception as e:
         return {"error": str(e)}
 
+@router.get("/hashing-stats")
+def get_hashing_stats():
+    """Returns password hashing pool usage (workers busy, queue depth, rejections)."""
+    return utils.password_hasher.stats()
+
+@router.get("/mail-stats")
+def get_mail_stats():
+    """Returns outbound mail queue depth, pending retries, dead letters and SMTP connections opened."""
+    return mailer.mailer.stats()
+
+@router.get("/otp-stats")
+def get_otp_stats():
+    """Returns OTP store backend, entries held in memory, cache hits/misses and expired rows deleted."""
+    return otp_store.otp_service.stats()
+
+@router.get("/pool-stats")
+def get_pool_stats():
+    """Returns database connection pool occupancy and checkout wait times."""
+    return {
+        "sync": database.pool_stats(),
+        "async": database.pool_stats(database._async_engine) if database._async_engine else None,
+    }
+
+@router.get("/db-stats")
+def get_db_stats(reset: bool = False):
+    """
+    Per-route database use since startup: queries, DB time and connection
+    hold time per request, and how often N+1 / unbounded queries were flagged.
+    Pass ?reset=true to start a new measurement window.
+    """
+    report = db_stats.route_report()
+    if reset:
+        db_stats.reset()
+    return report
+
+@router.get("/stats-consistency")
+def check_stats_consistency(repair: bool = False, db: Session = Depends(database.get_db)):
+    """Compares the stats counters with true table counts. Pass ?repair=true to rebuild drifted ones."""
+    return stats.check_consistency(db, repair=repair)
+
 @router.get("/tables")
 def get_tables():
     """Returns a list of all tables in the database."""
@@ -0,0 +1,30 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy.orm import Session
+from .. import schemas, database, heatmap
+
+router = APIRouter(
+    prefix="/heatmap",
+    tags=["Heat Map"],
+)
+
+@router.get("/", response_model=schemas.Heatmap)
+def get_heatmap(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    zoom: int = Query(12, ge=0, le=22),
+    days: int | None = Query(None, ge=1, le=3650),
+    source: str = Query("all", pattern="^(sos|complaints|all)$"),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Incident density for the visible map area: counts per grid cell, with the
+    cell size picked from the map `zoom`. `days` limits it to recent incidents.
+    Served from pre-aggregated counts, so the cost doesn't grow with the number of incidents.
+    """
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="min_lat/min_lon must not exceed max_lat/max_lon")
+    sources = list(heatmap.SOURCES) if source == "all" else [source]
+    grid = heatmap.get_grid(db, sources, zoom, (min_lat, min_lon, max_lat, max_lon), days)
+    return {"zoom": zoom, "days": days, **grid}
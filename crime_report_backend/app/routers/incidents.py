@@ -0,0 +1,122 @@
+from fastapi import APIRouter, Depends, HTTPException, Query
+from sqlalchemy import or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from datetime import datetime
+from .. import schemas, models, database, pagination, serialization
+
+router = APIRouter(
+    prefix="/incidents",
+    tags=["Incidents"],
+)
+
+INCIDENT_COLUMNS = serialization.columns(models.Incident, schemas.Incident)
+
+@router.get("/", response_model=list[schemas.Incident])
+async def get_incidents(
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    min_members: int = Query(1, ge=1),
+    active_since: datetime | None = None,
+    db: AsyncSession = Depends(database.get_async_db)
+):
+    """
+    Incidents (SOS alerts and complaints grouped by place and time) with their
+    member counts, newest first. `min_members=2` hides lone reports, and
+    `active_since` those with no report since then. Pass the X-Next-Cursor
+    response header back as `cursor` to fetch the next page. Pages follow
+    first_seen, which never changes, so incidents that gain members while
+    you page aren't skipped or repeated.
+    """
+    table = models.Incident
+    query = select(*INCIDENT_COLUMNS)
+    if min_members > 1:
+        query = query.where(table.member_count >= min_members)
+    if active_since:
+        query = query.where(table.last_seen >= active_since)
+    if cursor:
+        first_seen, last_id = pagination.decode_cursor(cursor)
+        query = query.where(
+            table.first_seen <= first_seen,
+            or_(table.first_seen < first_seen, table.id < last_id),
+        )
+    rows = (await db.execute(query.order_by(table.first_seen.desc(), table.id.desc()).limit(limit + 1))).all()
+    headers = {}
+    if len(rows) > limit:
+        rows = rows[:limit]
+        headers["X-Next-Cursor"] = pagination.encode_cursor(rows[-1].first_seen, rows[-1].id)
+    return serialization.RowsResponse(rows, schemas.Incident, headers=headers)
+
+# Reports grouped into incidents: model, schema and the columns its list endpoint selects
+MEMBERS = {
+    "sos": (models.SOSAlert, schemas.SOSAlert, serialization.columns(models.SOSAlert, schemas.SOSAlert)),
+    "complaints": (models.Complaint, schemas.Complaint, serialization.columns(models.Complaint, schemas.Complaint)),
+}
+
+def _members_page(db: Session, kind: str, incident_id: int, limit: int, cursor: str | None = None) -> tuple[list, bool]:
+    """One page of an incident's reports of one kind, oldest first, keyset paginated on (created_at, id)."""
+    model, _, columns = MEMBERS[kind]
+    query = select(*columns).where(model.incident_id == incident_id)
+    if cursor:
+        created_at, last_id = pagination.decode_cursor(cursor)
+        query = query.where(
+            model.created_at >= created_at,
+            or_(model.created_at > created_at, model.id > last_id),
+        )
+    rows = db.execute(query.order_by(model.created_at, model.id).limit(limit + 1)).all()
+    return rows[:limit], len(rows) > limit
+
+@router.get("/{incident_id}", response_model=schemas.IncidentDetail)
+def get_incident(
+    incident_id: int,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: Session = Depends(database.get_db)
+):
+    """
+    An incident with the first `limit` SOS alerts and complaints grouped into
+    it, oldest first. sos_count and complaint_count tell whether there are
+    more; page through them with /incidents/{id}/sos and /incidents/{id}/complaints.
+    """
+    incident = db.get(models.Incident, incident_id)
+    if not incident:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    return schemas.IncidentDetail(
+        **schemas.Incident.model_validate(incident).model_dump(),
+        sos_alerts=_members_page(db, "sos", incident_id, limit)[0],
+        complaints=_members_page(db, "complaints", incident_id, limit)[0],
+    )
+
+def _members_response(db: Session, kind: str, incident_id: int, limit: int, cursor: str | None):
+    if db.get(models.Incident, incident_id) is None:
+        raise HTTPException(status_code=404, detail="Incident not found")
+    rows, has_more = _members_page(db, kind, incident_id, limit, cursor)
+    headers = {}
+    if has_more:
+        headers["X-Next-Cursor"] = pagination.encode_cursor(rows[-1].created_at, rows[-1].id)
+    return serialization.RowsResponse(rows, MEMBERS[kind][1], headers=headers)
+
+@router.get("/{incident_id}/sos", response_model=list[schemas.SOSAlert])
+def get_incident_sos_alerts(
+    incident_id: int,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    db: Session = Depends(database.get_db)
+):
+    """
+    The SOS alerts grouped into an incident, oldest first.
+    Pass the X-Next-Cursor response header back as `cursor` to fetch the next page.
+    """
+    return _members_response(db, "sos", incident_id, limit, cursor)
+
+@router.get("/{incident_id}/complaints", response_model=list[schemas.Complaint])
+def get_incident_complaints(
+    incident_id: int,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    cursor: str | None = None,
+    db: Session = Depends(database.get_db)
+):
+    """
+    The complaints grouped into an incident, oldest first.
+    Pass the X-Next-Cursor response header back as `cursor` to fetch the next page.
+    """
+    return _members_response(db, "complaints", incident_id, limit, cursor)
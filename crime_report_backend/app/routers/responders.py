@@ -0,0 +1,62 @@
+from fastapi import APIRouter, Depends, HTTPException
+from sqlalchemy import case, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+from datetime import datetime, timezone
+from .. import schemas, models, database, dispatch, serialization
+
+router = APIRouter(
+    prefix="/responders",
+    tags=["Responders"],
+)
+
+RESPONDER_COLUMNS = serialization.columns(models.Responder, schemas.Responder)
+
+@router.post("/", response_model=schemas.Responder)
+def create_responder(responder: schemas.ResponderCreate, db: Session = Depends(database.get_db)):
+    """Register a responder. It is proposed for SOS alerts once it sends a heartbeat."""
+    new_responder = models.Responder(name=responder.name, status="Available")
+    db.add(new_responder)
+    db.commit()
+    db.refresh(new_responder)
+    return new_responder
+
+@router.get("/", response_model=list[schemas.Responder])
+async def get_responders(db: AsyncSession = Depends(database.get_async_db)):
+    """All responders with their last reported position and status."""
+    result = await db.execute(select(*RESPONDER_COLUMNS).order_by(models.Responder.id))
+    return serialization.RowsResponse(result.all(), schemas.Responder)
+
+@router.put("/{responder_id}/heartbeat", response_model=schemas.Responder)
+def responder_heartbeat(
+    responder_id: int,
+    heartbeat: schemas.ResponderHeartbeat,
+    db: Session = Depends(database.get_db)
+):
+    """
+    Report a responder's current position, and optionally its status
+    (Available, Busy or Offline). Send it every few seconds while on duty;
+    responders silent for DISPATCH_HEARTBEAT_TTL seconds aren't proposed.
+    A responder dispatched to an alert stays Busy through "Available"
+    heartbeats until the alert is Resolved or Dismissed.
+    """
+    values = {"latitude": heartbeat.latitude, "longitude": heartbeat.longitude, "last_seen": datetime.now(timezone.utc)}
+    if heartbeat.status is not None:
+        if heartbeat.status not in dispatch.RESPONDER_STATUSES:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Invalid status. Must be one of: {', '.join(dispatch.RESPONDER_STATUSES)}"
+            )
+        values["status"] = heartbeat.status
+        if heartbeat.status == "Available":
+            # Decided in the UPDATE itself, so a dispatch committing meanwhile isn't overwritten
+            values["status"] = case((models.Responder.status == "Busy", "Busy"), else_="Available")
+    row = db.execute(
+        update(models.Responder).where(models.Responder.id == responder_id).values(**values)
+        .returning(*RESPONDER_COLUMNS)
+    ).first()
+    if row is None:
+        raise HTTPException(status_code=404, detail="Responder not found")
+    db.commit()
+    dispatch.apply(row)
+    return row._mapping
@@ -1,9 +1,14 @@
-from fastapi import APIRouter, Depends, HTTPException, status
+from fastapi import APIRouter, Depends, HTTPException, status, Query
+from fastapi.responses import StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.orm import Session
-from sqlalchemy import func
-from datetime import datetime, timedelta, timezone
+from sqlalchemy import select
+from datetime import datetime
 from pydantic import BaseModel
-from .. import schemas, models, database
+import anyio
+import asyncio
+from .. import schemas, models, database, crud, pagination, stats, geo, heatmap, http_cache, export, serialization, incidents, dispatch
+from ..broadcast import sos_hub, format_sse
 
 router = APIRouter(
     prefix="/sos",
@@ -11,25 +16,65 @@ router = APIRouter(
 )
 
 ALLOWED_SOS_STATUSES = {"Pending", "Dispatched", "Resolved", "Dismissed"}
+# Moving an alert to one of these frees the responder dispatched to it
+RELEASING_SOS_STATUSES = {"Resolved", "Dismissed"}
+
+# List endpoints select just these and encode the rows directly (see app/serialization.py)
+SOS_COLUMNS = serialization.columns(models.SOSAlert, schemas.SOSAlert)
+
+# SOS creation runs on these threads, not the shared pool the other sync endpoints
+# use; one per reserved connection (see database.reserved_session())
+SOS_THREADS = anyio.CapacityLimiter(database.DB_RESERVED_POOL_SIZE)
+
+# Comment frame sent to idle streams so proxies don't drop the connection
+STREAM_KEEPALIVE_SECONDS = 15
 
 class SOSStatusUpdate(BaseModel):
     status: str
 
-@router.post("/", response_model=schemas.SOSAlert)
-def create_sos_alert(alert: schemas.SOSAlertCreate, db: Session = Depends(database.get_db)):
+def publish_sos_event(event: str, alert: models.SOSAlert, **extra):
+    """Push an alert to live dispatcher streams. The event id doubles as a /sos/changes cursor."""
+    sos_hub.publish(
+        event,
+        {**schemas.SOSAlert.model_validate(alert).model_dump(mode="json"), **extra},
+        event_id=pagination.encode_cursor(alert.updated_at, alert.id),
+    )
+
+@router.post("/", response_model=schemas.SOSAlertCreated)
+async def create_sos_alert(alert: schemas.SOSAlertCreate):
     """
     Trigger an SOS alert with location data. Status defaults to Pending.
+    The nearest available responders come back as `proposed_responders`
+    (also sent on /sos/stream); confirm one with POST /sos/{id}/dispatch.
     """
-    new_alert = models.SOSAlert(
-        user_email=alert.user_email,
-        lat=alert.lat,
-        long=alert.long,
-        status="Pending"
-    )
-    db.add(new_alert)
-    db.commit()
-    db.refresh(new_alert)
-    return new_alert
+    # Its own threads and connections: a flood of other requests can't make an alert wait for either
+    return await anyio.to_thread.run_sync(_create_sos_alert, alert, limiter=SOS_THREADS)
+
+def _create_sos_alert(alert: schemas.SOSAlertCreate) -> dict:
+    db = database.reserved_session()
+    try:
+        latitude, longitude, geohash = geo.locate(alert.lat, alert.long)
+        new_alert = models.SOSAlert(
+            user_email=crud.normalize_email(alert.user_email) if alert.user_email else None,
+            lat=alert.lat,
+            long=alert.long,
+            latitude=latitude,
+            longitude=longitude,
+            geohash=geohash,
+            status="Pending"
+        )
+        db.add(new_alert)
+        stats.record(db, "sos_alerts")
+        heatmap.record(db, "sos", geohash)
+        incidents.assign(db, "sos", new_alert)
+        http_cache.bump(db, "sos_alerts")
+        db.commit()
+        db.refresh(new_alert)
+        proposals = dispatch.propose(db, latitude, longitude)
+        publish_sos_event("sos_created", new_alert, proposed_responders=proposals)
+        return {**schemas.SOSAlert.model_validate(new_alert).model_dump(), "proposed_responders": proposals}
+    finally:
+        db.close()
 
 @router.patch("/{alert_id}/status", response_model=schemas.SOSAlert)
 def update_sos_status(
@@ -47,25 +92,65 @@ def update_sos_status(
     if not alert:
         raise HTTPException(status_code=404, detail="SOS alert not found")
     alert.status = update.status
+    released = None
+    if update.status in RELEASING_SOS_STATUSES and alert.responder_id is not None:
+        released = dispatch.set_status(db, alert.responder_id, "Available", only_if="Busy")
+    http_cache.bump(db, "sos_alerts")
+    db.commit()
+    if released:
+        dispatch.apply(released)
+    db.refresh(alert)
+    publish_sos_event("sos_updated", alert)
+    return alert
+
+@router.get("/{alert_id}/proposals", response_model=list[schemas.ResponderProposal])
+def get_sos_proposals(
+    alert_id: int,
+    k: int = Query(dispatch.DISPATCH_PROPOSALS, ge=1, le=50),
+    db: Session = Depends(database.get_db)
+):
+    """The k nearest available responders to an alert right now, nearest first."""
+    alert = db.get(models.SOSAlert, alert_id)
+    if not alert:
+        raise HTTPException(status_code=404, detail="SOS alert not found")
+    return dispatch.propose(db, alert.latitude, alert.longitude, k=k)
+
+@router.post("/{alert_id}/dispatch", response_model=schemas.SOSAlert)
+def dispatch_sos_alert(alert_id: int, assignment: schemas.SOSDispatch, db: Session = Depends(database.get_db)):
+    """
+    Send a responder to an alert: the alert becomes Dispatched and the
+    responder Busy until the alert is Resolved or Dismissed.
+    """
+    alert = db.get(models.SOSAlert, alert_id)
+    if not alert:
+        raise HTTPException(status_code=404, detail="SOS alert not found")
+    claimed = dispatch.set_status(db, assignment.responder_id, "Busy", only_if="Available")
+    if claimed is None:
+        if db.get(models.Responder, assignment.responder_id) is None:
+            raise HTTPException(status_code=404, detail="Responder not found")
+        raise HTTPException(status_code=409, detail="Responder is not available")
+    released = None
+    if alert.responder_id is not None and alert.responder_id != assignment.responder_id:
+        # Reassigned: the previous responder is free again
+        released = dispatch.set_status(db, alert.responder_id, "Available", only_if="Busy")
+    alert.status = "Dispatched"
+    alert.responder_id = assignment.responder_id
+    http_cache.bump(db, "sos_alerts")
     db.commit()
+    for row in (claimed, released):
+        if row:
+            dispatch.apply(row)
     db.refresh(alert)
+    publish_sos_event("sos_updated", alert)
     return alert
 
 @router.get("/stats")
-def get_sos_stats(db: Session = Depends(database.get_db)):
+async def get_sos_stats(db: AsyncSession = Depends(database.get_async_db)):
     """
     Get total SOS alerts and today's alerts count.
     """
-    total_alerts = db.query(models.SOSAlert).count()
-    
-    # Get today's alerts (Postgres specific date function or python based)
-    today = datetime.now(timezone.utc).date()
-    # Use 24h window for consistency with complaints
-    cutoff = datetime.now(timezone.utc) - timedelta(hours=24)
-    
-    today_alerts = db.query(models.SOSAlert).filter(
-        models.SOSAlert.created_at >= cutoff
-    ).count()
+    # Served from incrementally maintained counters (rolling 24h window, consistent with complaints)
+    total_alerts, today_alerts = await stats.get_counts_async(db, "sos_alerts")
     
     return {
         "total_alerts": total_alerts,
@@ -73,8 +158,128 @@ def get_sos_stats(db: Session = Depends(database.get_db)):
     }
 
 @router.get("/all", response_model=list[schemas.SOSAlert])
-def get_all_sos_alerts(db: Session = Depends(database.get_db)):
+async def get_all_sos_alerts(db: AsyncSession = Depends(database.get_async_db)):
     """
     Get all SOS alerts with their coordinates (for the heat map).
     """
-    return db.query(models.SOSAlert).order_by(models.SOSAlert.created_at.desc()).all()
+    result = await db.execute(select(*SOS_COLUMNS).order_by(models.SOSAlert.created_at.desc()))
+    return serialization.RowsResponse(result.all(), schemas.SOSAlert)
+
+@router.get("/export")
+async def export_sos_alerts(
+    format: str = "ndjson",
+    status: str | None = None,
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+):
+    """
+    Download SOS alert history, newest first, as `ndjson`, `csv` or `parquet`.
+    The file is streamed as it is read.
+    """
+    return export.stream(
+        models.SOSAlert,
+        export.SOS_COLUMNS,
+        crud.sos_filters(status, created_after, created_before),
+        format,
+    )
+
+@router.get("/within", response_model=list[schemas.SOSAlert])
+def get_sos_alerts_within(
+    min_lat: float = Query(..., ge=-90, le=90),
+    min_lon: float = Query(..., ge=-180, le=180),
+    max_lat: float = Query(..., ge=-90, le=90),
+    max_lon: float = Query(..., ge=-180, le=180),
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    limit: int = Query(pagination.MAX_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Get SOS alerts inside a bounding box (e.g. the visible map area), newest first.
+    """
+    if min_lat > max_lat or min_lon > max_lon:
+        raise HTTPException(status_code=400, detail="min_lat/min_lon must not exceed max_lat/max_lon")
+    return serialization.RowsResponse(crud.get_points_in_bbox(
+        db,
+        models.SOSAlert,
+        (min_lat, min_lon, max_lat, max_lon),
+        limit=limit,
+        created_after=created_after,
+        created_before=created_before,
+        columns=SOS_COLUMNS,
+    ), schemas.SOSAlert)
+
+@router.get("/near", response_model=list[schemas.SOSAlert])
+def get_sos_alerts_near(
+    lat: float = Query(..., ge=-90, le=90),
+    lon: float = Query(..., ge=-180, le=180),
+    radius_m: float = Query(1000, gt=0, le=100000),
+    created_after: datetime | None = None,
+    created_before: datetime | None = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Get SOS alerts within `radius_m` metres of a point, nearest first.
+    """
+    return serialization.RowsResponse(crud.get_points_near(
+        db,
+        models.SOSAlert,
+        lat,
+        lon,
+        radius_m,
+        limit=limit,
+        created_after=created_after,
+        created_before=created_before,
+        columns=SOS_COLUMNS,
+    ), schemas.SOSAlert)
+
+@router.get("/changes", response_model=schemas.SOSAlertChanges)
+def get_sos_changes(
+    since: str | None = None,
+    limit: int = Query(pagination.DEFAULT_PAGE_SIZE, ge=1, le=pagination.MAX_PAGE_SIZE),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Get SOS alerts created or updated after the `since` cursor, oldest change first.
+    Poll again with the returned `cursor` to receive only new activity. Rows just
+    behind the cursor are re-sent in case they committed late; dedupe on (id, updated_at).
+    """
+    alerts, has_more, next_cursor = crud.get_changes_since(
+        db,
+        models.SOSAlert,
+        limit=limit,
+        cursor=pagination.decode_cursor(since) if since else None,
+    )
+    cursor = pagination.encode_cursor(*next_cursor) if next_cursor else since
+    return {"items": alerts, "cursor": cursor, "has_more": has_more}
+
+@router.get("/stream")
+async def stream_sos_alerts():
+    """
+    Server-Sent Events stream of new (`sos_created`) and updated (`sos_updated`) alerts.
+    On reconnect, fetch /sos/changes?since=<last event id> to catch up on missed events.
+    """
+    subscriber = sos_hub.subscribe()
+
+    async def event_stream():
+        try:
+            yield ": connected\n\n"
+            while True:
+                try:
+                    message = await asyncio.wait_for(subscriber.get(), timeout=STREAM_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keep-alive\n\n"
+                    continue
+                if message is None:
+                    # Evicted as a slow consumer; the client's EventSource will reconnect
+                    break
+                yield format_sse(message)
+        finally:
+            sos_hub.unsubscribe(subscriber)
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
@@ -0,0 +1,101 @@
+from fastapi import APIRouter, Depends, HTTPException, Header, Request
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.orm import Session
+import uuid
+from .. import schemas, models, database, ingest, media
+
+router = APIRouter(
+    prefix="/uploads",
+    tags=["Uploads"],
+)
+
+def get_upload_session_or_404(db: Session, upload_id: str) -> models.UploadSession:
+    upload = db.get(models.UploadSession, upload_id)
+    if not upload:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return upload
+
+def finalize_upload(db: Session, upload: models.UploadSession):
+    """
+    Hand a fully received file to the media store. With a background slot
+    free, the upload is left "processing" and its url is filled in later;
+    otherwise the file is uploaded now and the url recorded.
+    """
+    resource_type = ingest.RESOURCE_TYPES[upload.kind]
+    if media.try_reserve_background_slot():
+        upload.media_status = "processing"
+        try:
+            db.commit()
+        except Exception:
+            media.release_background_slot()
+            raise
+        media.schedule_staged_upload(upload.id, resource_type)
+        return
+    with open(ingest.staging_path(upload.id), "rb") as staged:
+        upload.url = media.upload_media({"file": (staged, resource_type)})["file"]
+    upload.media_status = "ready"
+    db.commit()
+    ingest.discard(upload.id)
+
+@router.post("/", response_model=schemas.UploadSession)
+def create_upload_session(session: schemas.UploadSessionCreate, db: Session = Depends(database.get_db)):
+    """
+    Start a resumable upload. Send the bytes with one or more PUT /uploads/{id}
+    requests, then pass the id to POST /complaints/ (e.g. as `video_upload_id`).
+    """
+    ingest.check_media(session.kind, session.content_type, session.size, session.filename)
+    upload = models.UploadSession(
+        id=uuid.uuid4().hex,
+        kind=session.kind,
+        content_type=ingest.resolve_content_type(session.content_type, session.filename),
+        filename=session.filename,
+        total_size=session.size,
+        received=0,
+    )
+    db.add(upload)
+    db.commit()
+    db.refresh(upload)
+    return upload
+
+@router.get("/{upload_id}", response_model=schemas.UploadSession)
+def get_upload_session(upload_id: str, db: Session = Depends(database.get_db)):
+    """Check progress; after a dropped connection, resume from `received`."""
+    return get_upload_session_or_404(db, upload_id)
+
+@router.put("/{upload_id}", response_model=schemas.UploadSession)
+async def upload_chunk(
+    upload_id: str,
+    request: Request,
+    upload_offset: int = Header(...),
+    db: Session = Depends(database.get_db)
+):
+    """
+    Append the raw request body at `Upload-Offset`. The body is streamed to disk
+    as it arrives, so memory use doesn't depend on the chunk or file size.
+    Once the last byte is in, the file is pushed to the media store: with
+    MEDIA_UPLOAD_MODE=async in the background, so poll GET /uploads/{id} until
+    media_status is "ready". If it is "failed", PUT an empty body at the full
+    size to try again.
+    """
+    async with ingest.exclusive(upload_id):
+        upload = await run_in_threadpool(get_upload_session_or_404, db, upload_id)
+        if upload.url or upload.media_status == "processing":
+            return upload
+        if upload_offset != upload.received:
+            raise HTTPException(
+                status_code=409,
+                detail=f"Upload-Offset mismatch: server has {upload.received} bytes"
+            )
+
+        total_size = upload.total_size
+        try:
+            await ingest.append_chunks(upload_id, upload_offset, total_size, request.stream())
+        finally:
+            # Record progress even if the client dropped mid-chunk, so it can resume
+            received = await run_in_threadpool(ingest.staged_size, upload_id)
+            upload.received = received
+            await run_in_threadpool(db.commit)
+
+        if received == total_size:
+            await run_in_threadpool(finalize_upload, db, upload)
+        return upload
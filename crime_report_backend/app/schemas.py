@@ -1,4 +1,4 @@
-from pydantic import BaseModel, EmailStr
+from pydantic import BaseModel, EmailStr, Field
 from datetime import datetime
 
 class UserBase(BaseModel):
@@ -29,15 +29,23 @@ class Complaint(BaseModel):
     image_path: str | None = None
     video_path: str | None = None
     audio_path: str | None = None
+    media_status: str | None = None
     lat: str | None = None
     long: str | None = None
     suspect_details: str | None = None
     status: str
+    incident_id: int | None = None
     created_at: datetime
+    updated_at: datetime | None = None
 
     class Config:
         from_attributes = True
 
+class ComplaintChanges(BaseModel):
+    items: list[Complaint]
+    cursor: str | None = None
+    has_more: bool = False
+
 class User(UserBase):
     id: int
     name: str | None = None
@@ -69,7 +77,96 @@ class SOSAlertCreate(SOSAlertBase):
 
 class SOSAlert(SOSAlertBase):
     id: int
+    incident_id: int | None = None
+    responder_id: int | None = None
     created_at: datetime
+    updated_at: datetime | None = None
     
     class Config:
         from_attributes = True
+
+class ResponderProposal(BaseModel):
+    responder_id: int
+    name: str
+    distance_m: float
+
+class SOSAlertCreated(SOSAlert):
+    # Nearest available responders when the alert came in, nearest first
+    proposed_responders: list[ResponderProposal] = []
+
+class SOSDispatch(BaseModel):
+    responder_id: int
+
+class SOSAlertChanges(BaseModel):
+    items: list[SOSAlert]
+    cursor: str | None = None
+    has_more: bool = False
+
+class UploadSessionCreate(BaseModel):
+    kind: str
+    size: int = Field(..., ge=1)
+    content_type: str | None = None
+    filename: str | None = None
+
+class UploadSession(BaseModel):
+    id: str
+    kind: str
+    content_type: str | None = None
+    total_size: int
+    received: int
+    url: str | None = None
+    media_status: str | None = None
+
+    class Config:
+        from_attributes = True
+
+class HeatmapCell(BaseModel):
+    cell: str
+    lat: float
+    lon: float
+    count: int
+
+class Heatmap(BaseModel):
+    zoom: int
+    precision: int
+    cell_height: float
+    cell_width: float
+    days: int | None = None
+    max_count: int
+    cells: list[HeatmapCell]
+
+class Incident(BaseModel):
+    id: int
+    latitude: float
+    longitude: float
+    first_seen: datetime
+    last_seen: datetime
+    member_count: int
+    sos_count: int
+    complaint_count: int
+
+    class Config:
+        from_attributes = True
+
+class IncidentDetail(Incident):
+    sos_alerts: list[SOSAlert]
+    complaints: list[Complaint]
+
+class ResponderCreate(BaseModel):
+    name: str
+
+class ResponderHeartbeat(BaseModel):
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+    status: str | None = None
+
+class Responder(BaseModel):
+    id: int
+    name: str
+    status: str
+    latitude: float | None = None
+    longitude: float | None = None
+    last_seen: datetime | None = None
+
+    class Config:
+        from_attributes = True
@@ -0,0 +1,88 @@
+import os
+import re
+from sqlalchemy import column, func, literal_column, select, table
+from sqlalchemy.orm import Session
+
+from . import models
+
+# SQLite ranking weights per column, matching Postgres' default ts_rank weights
+# for the "A" (title, suspect_details) and "B" (description) labels in models.py
+TITLE_WEIGHT = SUSPECT_WEIGHT = 1.0
+DESCRIPTION_WEIGHT = 0.4
+
+# Matches ranked per search, newest first. Ranking every match of a common word
+# means scoring most of the table, so older matches are reached by narrowing
+# the search (e.g. with created_before) instead; search_complaints() reports
+# when it left any out.
+SEARCH_RANK_WINDOW = int(os.getenv("SEARCH_RANK_WINDOW", "5000"))
+
+_complaints_fts = table("complaints_fts", column("rowid"))
+# "quoted phrase", -excluded or plain term
+_TOKEN = re.compile(r'(-?)"([^"]*)"|(-?)(\S+)')
+
+def fts5_query(q: str) -> str | None:
+    """
+    Turn search box input into an FTS5 query with the same syntax as Postgres'
+    websearch_to_tsquery: terms are ANDed, "quoted phrases" match as phrases
+    and -term excludes. Everything is quoted, so no input is an FTS5 syntax error.
+    Returns None when nothing searchable is left.
+    """
+    include, exclude = [], []
+    for phrase_sign, phrase, term_sign, term in _TOKEN.findall(q):
+        words = (phrase or term).replace('"', " ").split()
+        if not words:
+            continue
+        quoted = '"' + " ".join(words) + '"'
+        (exclude if phrase_sign or term_sign else include).append(quoted)
+    if not include:
+        return None
+    return " ".join(include) + "".join(f" NOT {quoted}" for quoted in exclude)
+
+def search_complaints(db: Session, q: str, limit: int, offset: int = 0, filters: list = (), columns: list | None = None):
+    """
+    Complaints matching `q`, best match first (newest first among equals).
+    Returns one page, whether more exist (like crud.get_complaints_page) and
+    whether older matches were left out. `filters` are extra WHERE clauses
+    (see crud.complaint_filters). Only the newest SEARCH_RANK_WINDOW matches
+    are ranked; the truncation check runs on the window's last page only.
+    """
+    model = models.Complaint
+    if db.get_bind().dialect.name == "postgresql":
+        vector = literal_column("complaints.search_vector")
+        tsquery = func.websearch_to_tsquery("english", q)
+        newest = model.id.desc()
+        matching = select(model.id).where(vector.op("@@")(tsquery), *filters)
+        candidates = matching.order_by(newest).limit(SEARCH_RANK_WINDOW).subquery()
+        score = func.ts_rank(vector, tsquery).desc()
+    else:
+        match = fts5_query(q)
+        if match is None:
+            return [], False, False
+        fts = literal_column("complaints_fts")
+        newest = _complaints_fts.c.rowid.desc()
+        matching = select(_complaints_fts.c.rowid.label("id"))
+        if filters:
+            matching = matching.join(model, model.id == _complaints_fts.c.rowid)
+        matching = matching.where(fts.op("MATCH")(match), *filters)
+        # bm25() is lower for better matches; its weights follow the FTS5 column order.
+        # It is only computed for rows the window reads.
+        candidates = (
+            matching.add_columns(func.bm25(fts, TITLE_WEIGHT, DESCRIPTION_WEIGHT, SUSPECT_WEIGHT).label("score"))
+            .order_by(newest).limit(SEARCH_RANK_WINDOW).subquery()
+        )
+        score = candidates.c.score
+    query = (
+        (select(*columns) if columns else select(model))
+        .join(candidates, candidates.c.id == model.id)
+        .order_by(score, model.id.desc())
+        .offset(offset)
+        .limit(limit + 1)
+    )
+    rows = db.execute(query)
+    rows = rows.all() if columns else rows.scalars().all()
+    has_more = len(rows) > limit
+    truncated = False
+    if not has_more and offset + len(rows) == SEARCH_RANK_WINDOW:
+        # The window is full: is there a match past it?
+        truncated = db.execute(matching.order_by(newest).offset(SEARCH_RANK_WINDOW).limit(1)).first() is not None
+    return rows[:limit], has_more, truncated
@@ -0,0 +1,23 @@
+import orjson
+from fastapi.responses import Response
+
+def columns(model, schema) -> list:
+    """The columns of `model` behind each field of `schema`, in field order, for select() / query()."""
+    return [getattr(model, name) for name in schema.model_fields]
+
+class RowsResponse(Response):
+    """
+    A JSON list built straight from rows selected with columns(model, schema),
+    encoded by orjson. No ORM objects or Pydantic models are created per row.
+    Columns past the schema's fields are left out. Keep `response_model` on the
+    route so the OpenAPI schema stays the same; FastAPI does not re-validate a
+    returned Response.
+    """
+
+    media_type = "application/json"
+
+    def __init__(self, rows, schema, **kwargs):
+        names = tuple(schema.model_fields)
+        # OPT_UTC_Z matches Pydantic, which writes UTC datetimes with a "Z" suffix
+        body = orjson.dumps([dict(zip(names, row)) for row in rows], option=orjson.OPT_UTC_Z)
+        super().__init__(body, **kwargs)
@@ -0,0 +1,167 @@
+import os
+import random
+import time
+from datetime import datetime, timezone
+from sqlalchemy import case, func, insert, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session
+
+from . import log, models
+
+logger = log.get_logger(__name__)
+
+# Rolling counts are kept in 5-minute buckets, so "last 24h" may include up
+# to 5 extra minutes at the far edge of the window.
+BUCKET_SECONDS = 300
+RING_SLOTS = 24 * 3600 // BUCKET_SECONDS
+STATS_CACHE_TTL = float(os.getenv("STATS_CACHE_TTL", "5"))
+# Rows each counter is split across. Concurrent inserts only queue behind each
+# other when they pick the same shard. Changing it needs shard_stat_counters.py.
+STATS_SHARDS = int(os.getenv("STATS_SHARDS", "16"))
+
+# Counter name -> table it counts
+COUNTED = {
+    "complaints": models.Complaint,
+    "sos_alerts": models.SOSAlert,
+}
+
+# Counter name -> (expires at, (total, last 24h))
+_cache = {}
+
+def current_bucket(now: float | None = None) -> int:
+    return int((time.time() if now is None else now) // BUCKET_SECONDS)
+
+def record(db: Session, name: str):
+    """
+    Count one new row of `name`. Call it after db.add() and before db.commit()
+    so the counters change in the same transaction as the insert. Only one
+    random shard is written. Counters are built at startup (ensure_counters),
+    never here.
+    """
+    bucket = current_bucket()
+    shard = random.randrange(STATS_SHARDS)
+    result = db.execute(
+        update(models.StatCounter)
+        .where(models.StatCounter.name == name, models.StatCounter.shard == shard)
+        .values(value=models.StatCounter.value + 1)
+    )
+    if result.rowcount == 0:
+        # Not built yet; the insert still goes through, and check_stats.py --repair recounts
+        logger.warning("Stats counters missing, insert not counted", extra={"counter": name, "shard": shard})
+        return
+    db.execute(
+        update(models.StatBucket)
+        .where(
+            models.StatBucket.name == name,
+            models.StatBucket.shard == shard,
+            models.StatBucket.slot == bucket % RING_SLOTS,
+        )
+        .values(
+            # Reuse the slot if it still holds a bucket from a previous lap of the ring
+            count=case((models.StatBucket.bucket == bucket, models.StatBucket.count + 1), else_=1),
+            bucket=bucket,
+        )
+    )
+
+def get_counts(db: Session, name: str) -> tuple[int, int]:
+    """Return (total, last 24h) for `name` in O(1), cached for STATS_CACHE_TTL seconds."""
+    cached = _cache.get(name)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+
+    total = db.query(func.sum(models.StatCounter.value)).filter(models.StatCounter.name == name).scalar()
+    if total is None:
+        ensure_counters(db, [name])
+        total = db.query(func.sum(models.StatCounter.value)).filter(models.StatCounter.name == name).scalar()
+    oldest = current_bucket() - RING_SLOTS + 1
+    recent = (
+        db.query(func.coalesce(func.sum(models.StatBucket.count), 0))
+        .filter(models.StatBucket.name == name, models.StatBucket.bucket >= oldest)
+        .scalar()
+    )
+    counts = (total, recent)
+    _cache[name] = (time.monotonic() + STATS_CACHE_TTL, counts)
+    return counts
+
+def invalidate(name: str):
+    """Drop the cached counts for `name` (after a write, so the next read is exact)."""
+    _cache.pop(name, None)
+
+async def get_counts_async(db: AsyncSession, name: str) -> tuple[int, int]:
+    """get_counts() for async endpoints; cache hits don't touch the database."""
+    cached = _cache.get(name)
+    if cached and cached[0] > time.monotonic():
+        return cached[1]
+    return await db.run_sync(get_counts, name)
+
+def _true_counts(db: Session, name: str):
+    """Exact (total, per-bucket counts for the current window) from the source table."""
+    model = COUNTED[name]
+    total = db.query(func.count(model.id)).scalar()
+    oldest = current_bucket() - RING_SLOTS + 1
+    cutoff = datetime.fromtimestamp(oldest * BUCKET_SECONDS, timezone.utc)
+    buckets = {}
+    for (created_at,) in db.query(model.created_at).filter(model.created_at >= cutoff):
+        if created_at.tzinfo is None:
+            # SQLite returns naive datetimes; they are stored in UTC
+            created_at = created_at.replace(tzinfo=timezone.utc)
+        bucket = current_bucket(created_at.timestamp())
+        buckets[bucket] = buckets.get(bucket, 0) + 1
+    return total, buckets
+
+def _backfill(db: Session, name: str):
+    """Rebuild every shard of `name`: true counts go in shard 0, the other shards start at zero."""
+    total, buckets = _true_counts(db, name)
+    db.query(models.StatBucket).filter(models.StatBucket.name == name).delete()
+    db.query(models.StatCounter).filter(models.StatCounter.name == name).delete()
+    db.execute(insert(models.StatCounter), [
+        {"name": name, "shard": shard, "value": total if shard == 0 else 0} for shard in range(STATS_SHARDS)
+    ])
+    slots = {bucket % RING_SLOTS: (bucket, count) for bucket, count in buckets.items()}
+    db.execute(insert(models.StatBucket), [
+        {"name": name, "shard": shard, "slot": slot,
+         **dict(zip(("bucket", "count"), slots.get(slot, (-1, 0)) if shard == 0 else (-1, 0)))}
+        for shard in range(STATS_SHARDS) for slot in range(RING_SLOTS)
+    ])
+    db.flush()
+
+def ensure_counters(db: Session, names=None):
+    """Build counters for any counted table that doesn't have them yet (first run)."""
+    for name in names or COUNTED:
+        exists = db.query(models.StatCounter.name).filter(models.StatCounter.name == name).first()
+        if exists:
+            continue
+        try:
+            _backfill(db, name)
+            db.commit()
+            logger.info("Built stats counters", extra={"counter": name})
+        except IntegrityError:
+            # Another worker built them first
+            db.rollback()
+
+def check_consistency(db: Session, repair: bool = False) -> dict:
+    """
+    Compare the counters against true counts from the source tables.
+    With repair=True, counters that drifted are rebuilt from scratch.
+    """
+    report = {}
+    for name in COUNTED:
+        true_total, buckets = _true_counts(db, name)
+        true_recent = sum(buckets.values())
+        _cache.pop(name, None)
+        total, recent = get_counts(db, name)
+        consistent = (total, recent) == (true_total, true_recent)
+        report[name] = {
+            "counter_total": total,
+            "true_total": true_total,
+            "counter_last_24h": recent,
+            "true_last_24h": true_recent,
+            "consistent": consistent,
+        }
+        if repair and not consistent:
+            _backfill(db, name)
+            db.commit()
+            _cache.pop(name, None)
+            report[name]["repaired"] = True
+    return report
@@ -1,9 +1,126 @@
+import asyncio
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from fastapi import HTTPException
 from passlib.context import CryptContext
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+from . import log, metrics
+
+logger = log.get_logger(__name__)
+
+# bcrypt cost factor. Changing it rehashes each user's password on their next login.
+BCRYPT_ROUNDS = int(os.getenv("BCRYPT_ROUNDS", "12"))
+# Processes dedicated to hashing, i.e. how many bcrypt calls run in parallel
+HASHING_WORKERS = int(os.getenv("HASHING_WORKERS", str(os.cpu_count() or 2)))
+# Hash requests allowed to wait for a worker before new ones get a 503
+HASHING_MAX_QUEUE = int(os.getenv("HASHING_MAX_QUEUE", "256"))
+# Scheduling niceness of the hashing processes. When bcrypt saturates the CPUs,
+# the API process (SOS alerts, dashboards) still gets scheduled first.
+HASHING_NICE = int(os.getenv("HASHING_NICE", "10"))
+
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=BCRYPT_ROUNDS)
 
 def verify_password(plain_password, hashed_password):
     return pwd_context.verify(plain_password, hashed_password)
 
 def get_password_hash(password):
     return pwd_context.hash(password)
+
+def verify_and_update_password(plain_password, hashed_password):
+    """Returns (valid, new_hash). new_hash is set when the stored hash uses outdated settings."""
+    return pwd_context.verify_and_update(plain_password, hashed_password)
+
+def _lower_priority(increment: int):
+    if increment and hasattr(os, "nice"):
+        os.nice(increment)
+
+class PasswordHasher:
+    """
+    Runs bcrypt in a dedicated process pool so hashing neither holds the GIL
+    nor ties up the AnyIO threadpool that serves every other endpoint.
+    """
+
+    def __init__(self, workers: int, max_queue: int):
+        self.workers = workers
+        self.max_queue = max_queue
+        self.pending = 0
+        self.completed = 0
+        self.failed = 0
+        self.rejected = 0
+        self._executor = None
+
+    def _get_executor(self):
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_lower_priority,
+                initargs=(HASHING_NICE,),
+            )
+        return self._executor
+
+    @property
+    def queued(self) -> int:
+        """Requests waiting for a free worker."""
+        return max(0, self.pending - self.workers)
+
+    async def _run(self, fn, *args):
+        if self.queued >= self.max_queue:
+            self.rejected += 1
+            raise HTTPException(status_code=503, detail="Server busy, please retry shortly")
+        self.pending += 1
+        executor = self._get_executor()
+        try:
+            result = await asyncio.get_running_loop().run_in_executor(executor, fn, *args)
+        except BrokenProcessPool:
+            self.failed += 1
+            # A worker died (e.g. OOM-killed) and the pool refuses all further work; start a new one
+            if self._executor is executor:
+                logger.error("Password hashing pool broke; starting a new one")
+                self._executor = None
+                executor.shutdown(wait=False)
+            raise HTTPException(status_code=503, detail="Server busy, please retry shortly")
+        except Exception:
+            self.failed += 1
+            raise
+        finally:
+            self.pending -= 1
+        self.completed += 1
+        return result
+
+    async def hash(self, password: str) -> str:
+        return await self._run(get_password_hash, password)
+
+    async def verify_and_update(self, plain_password: str, hashed_password: str):
+        return await self._run(verify_and_update_password, plain_password, hashed_password)
+
+    def stats(self) -> dict:
+        return {
+            "workers": self.workers,
+            "in_flight": min(self.pending, self.workers),
+            "queued": self.queued,
+            "completed": self.completed,
+            "failed": self.failed,
+            "rejected": self.rejected,
+        }
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+password_hasher = PasswordHasher(HASHING_WORKERS, HASHING_MAX_QUEUE)
+
+def _hashing_metrics():
+    stats = password_hasher.stats()
+    return [
+        ("password_hashing_queue_depth", "gauge", "Hash requests waiting for a free worker.", (), {(): stats["queued"]}),
+        ("password_hashing_in_flight", "gauge", "Hash requests running in worker processes.", (), {(): stats["in_flight"]}),
+        ("password_hashing_completed_total", "counter", "Hash requests finished successfully.", (), {(): stats["completed"]}),
+        ("password_hashing_failed_total", "counter", "Hash requests that raised, including a broken pool.", (), {(): stats["failed"]}),
+        ("password_hashing_rejected_total", "counter", "Hash requests refused with 503.", (), {(): stats["rejected"]}),
+    ]
+
+metrics.REGISTRY.add_collector(_hashing_metrics)
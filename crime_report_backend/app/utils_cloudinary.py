@@ -3,20 +3,56 @@ import cloudinary.uploader
 import os
 from fastapi import HTTPException, UploadFile
 
+from . import log
+
+logger = log.get_logger(__name__)
+
 # Ensure CLOUDINARY_URL is loaded
 if not os.getenv("CLOUDINARY_URL"):
-    print("⚠️  WARNING: CLOUDINARY_URL not found in environment variables!")
+    logger.warning("CLOUDINARY_URL not found in environment variables!")
 else:
     # Basic validation (Masked)
     url = os.getenv("CLOUDINARY_URL")
     try:
         if "@" in url and ":" in url:
-            print(f"✅ Cloudinary URL found: {url.split('@')[1]}")
+            logger.info("Cloudinary URL found", extra={"cloud": url.split('@')[1]})
         else:
-            print("⚠️  Cloudinary URL format looks suspicious.")
+            logger.warning("Cloudinary URL format looks suspicious.")
     except:
         pass
 
+# Files are sent in chunks of this size, which bounds memory per upload.
+# Cloudinary requires chunks of at least 5 MB.
+UPLOAD_CHUNK_SIZE = int(os.getenv("CLOUDINARY_CHUNK_SIZE", str(6 * 1024 * 1024)))
+
+class _KeepOpen:
+    """upload_large closes the file it is given; this keeps ours open so callers can retry."""
+
+    def __init__(self, fileobj):
+        self._fileobj = fileobj
+
+    def __getattr__(self, name):
+        return getattr(self._fileobj, name)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+def upload_fileobj(fileobj, resource_type: str = "auto") -> str:
+    """
+    Uploads a file-like object to Cloudinary in chunks and returns the secure URL.
+    Raises whatever the SDK raises; callers decide how to surface it.
+    """
+    response = cloudinary.uploader.upload_large(
+        _KeepOpen(fileobj),
+        resource_type=resource_type,
+        chunk_size=UPLOAD_CHUNK_SIZE,
+        folder="crime_reports" # Optional: organize in a folder
+    )
+    return response.get("secure_url")
+
 def upload_to_cloudinary(file: UploadFile, resource_type: str = "auto") -> str:
     """
     Uploads a file to Cloudinary and returns the secure URL.
@@ -31,12 +67,7 @@ def upload_to_cloudinary(file: UploadFile, resource_type: str = "auto") -> str:
     try:
         # Cloudinary expects a file-like object or path. 
         # UploadFile.file is a SpooledTemporaryFile which works.
-        response = cloudinary.uploader.upload(
-            file.file,
-            resource_type=resource_type,
-            folder="crime_reports" # Optional: organize in a folder
-        )
-        return response.get("secure_url")
+        return upload_fileobj(file.file, resource_type=resource_type)
     except Exception as e:
-        print(f"❌ Cloudinary Upload Error: {e}")
+        logger.error("Cloudinary upload failed", extra={"error": str(e)})
         raise HTTPException(status_code=500, detail=f"Media upload failed: {str(e)}")
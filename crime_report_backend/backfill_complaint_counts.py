@@ -0,0 +1,35 @@
+"""
+Migration: Add 'complaint_count' to users and backfill it from the complaints
+table. Safe to re-run at any time to resync the counts.
+Run from the crime_report_backend directory.
+"""
+from sqlalchemy import text
+from app.database import engine
+
+def backfill_complaint_counts():
+    print("Initiating database migration for users table...")
+    try:
+        with engine.connect() as conn:
+            conn.execute(text("ALTER TABLE users ADD COLUMN complaint_count INTEGER NOT NULL DEFAULT 0;"))
+            conn.commit()
+            print("Successfully added 'complaint_count' column to 'users' table.")
+    except Exception as e:
+        print(f"Migration error (column might already exist): {e}")
+
+    with engine.connect() as conn:
+        result = conn.execute(text(
+            "UPDATE users SET complaint_count = "
+            "(SELECT count(*) FROM complaints WHERE complaints.user_email = users.email);"
+        ))
+        if engine.dialect.name == "postgresql":
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_users_email_pattern ON users (email text_pattern_ops);"
+            ))
+            conn.execute(text(
+                "CREATE INDEX IF NOT EXISTS ix_users_name_lower_pattern ON users (lower(name) text_pattern_ops);"
+            ))
+        conn.commit()
+        print(f"Backfilled complaint counts for {result.rowcount} user(s).")
+
+if __name__ == "__main__":
+    backfill_complaint_counts()
@@ -0,0 +1,69 @@
+"""
+Benchmark: time spent on the request path uploading a complaint's attachments.
+
+Uses LocalFileUploader with an artificial per-upload latency to stand in for
+Cloudinary, and compares:
+  sequential  - one upload after another (the old create_complaint behaviour)
+  concurrent  - media.upload_media, all attachments in parallel
+  async       - media.schedule_complaint_media, the request only spools the files
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.bench_complaint_uploads --latency 0.3 --requests 20
+"""
+import argparse
+import io
+import tempfile
+import time
+from unittest import mock
+
+from app import media
+
+ATTACHMENTS = {"image_path": "image", "video_path": "video", "audio_path": "video"}
+
+class FakeUpload:
+    """Minimal stand-in for fastapi.UploadFile."""
+
+    def __init__(self, size: int):
+        self.file = io.BytesIO(b"x" * size)
+
+def run(latency: float, requests: int, size: int):
+    media.uploader = media.LocalFileUploader(root=tempfile.mkdtemp(), latency=latency)
+
+    begin = time.perf_counter()
+    for _ in range(requests):
+        for resource_type in ATTACHMENTS.values():
+            media.uploader.upload(FakeUpload(size).file, resource_type)
+    sequential = (time.perf_counter() - begin) / requests
+
+    begin = time.perf_counter()
+    for _ in range(requests):
+        media.upload_media({
+            column: (FakeUpload(size).file, resource_type)
+            for column, resource_type in ATTACHMENTS.items()
+        })
+    concurrent = (time.perf_counter() - begin) / requests
+
+    # The DB write at the end of each background job is not what we are measuring
+    with mock.patch.object(media, "SessionLocal"):
+        begin = time.perf_counter()
+        for i in range(requests):
+            media._background_slots.acquire()
+            media.schedule_complaint_media(i, {
+                column: (FakeUpload(size), resource_type)
+                for column, resource_type in ATTACHMENTS.items()
+            })
+        background = (time.perf_counter() - begin) / requests
+        media.shutdown()
+
+    print(f"{len(ATTACHMENTS)} attachments x {size // 1024} KiB, {latency * 1000:.0f} ms per upload")
+    print(f"sequential {sequential * 1000:8.1f} ms/request")
+    print(f"concurrent {concurrent * 1000:8.1f} ms/request")
+    print(f"async      {background * 1000:8.1f} ms/request (uploads continue in background)")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--latency", type=float, default=0.3)
+    parser.add_argument("--requests", type=int, default=20)
+    parser.add_argument("--size", type=int, default=256 * 1024)
+    args = parser.parse_args()
+    run(args.latency, args.requests, args.size)
@@ -0,0 +1,82 @@
+"""
+Benchmark: per-page latency of keyset pagination on /complaints/all.
+
+Seeds a throwaway SQLite database with N complaints and times fetching the
+first page, a page from the middle and the last page via crud.get_complaints_page.
+With the (created_at, id) index, latency should stay flat as N grows.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.bench_complaints_pagination --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models
+
+PAGE_SIZE = 100
+REPEAT = 50
+
+def seed(engine, n: int):
+    start = datetime(2024, 1, 1, tzinfo=timezone.utc)
+    batch = []
+    with engine.begin() as conn:
+        for i in range(n):
+            batch.append({
+                "title": f"Complaint {i}",
+                "description": "Benchmark row",
+                "crime_type": ("Theft", "Assault", "Fraud")[i % 3],
+                "user_email": "bench@example.com",
+                "status": ("Pending", "Dispatched", "Resolved")[i % 3],
+                "created_at": start + timedelta(seconds=i),
+            })
+            if len(batch) == 10000:
+                conn.execute(insert(models.Complaint), batch)
+                batch = []
+        if batch:
+            conn.execute(insert(models.Complaint), batch)
+
+def time_page(db, cursor, **filters) -> float:
+    begin = time.perf_counter()
+    for _ in range(REPEAT):
+        crud.get_complaints_page(db, limit=PAGE_SIZE, cursor=cursor, **filters)
+    return (time.perf_counter() - begin) / REPEAT * 1000
+
+def cursor_at(db, offset: int):
+    row = (
+        db.query(models.Complaint.created_at, models.Complaint.id)
+        .order_by(models.Complaint.created_at.desc(), models.Complaint.id.desc())
+        .offset(offset)
+        .first()
+    )
+    return (row.created_at, row.id)
+
+def run(n: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    seed(engine, n)
+    db = sessionmaker(bind=engine)()
+    try:
+        first = time_page(db, None)
+        middle = time_page(db, cursor_at(db, n // 2))
+        last = time_page(db, cursor_at(db, n - PAGE_SIZE - 1))
+        filtered = time_page(db, cursor_at(db, n // 2), status="Resolved")
+        print(f"{n:>9} rows | first {first:6.2f} ms | middle {middle:6.2f} ms | "
+              f"last {last:6.2f} ms | middle+status {filtered:6.2f} ms")
+    finally:
+        db.close()
+        engine.dispose()
+        os.remove(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size)
@@ -0,0 +1,172 @@
+"""
+Benchmark and simulation for the responder index behind SOS dispatch
+proposals (app/dispatch.py).
+
+1. Query latency. For each --sizes count of responders spread over a
+   city-sized area (Delhi), time ResponderIndex.nearest() for k
+   responders around random points. The same queries also run as a brute
+   force scan over every responder; both must return the same responders.
+   The cost of a heartbeat that moves a responder is timed too.
+
+2. Simulation. --responders units patrol the city in a random walk and
+   send a heartbeat every --heartbeat seconds of simulated time. SOS
+   alerts arrive at --alerts-per-minute, mostly in a few hotspots. Each
+   alert gets k proposals. The nearest one is dispatched (it leaves the
+   index), stays busy for a random service time, then becomes available
+   again near the alert. Reports proposal latency under that churn, how
+   far the dispatched responder was, and how often nobody was in range.
+   A sample of proposals is checked against brute force.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.bench_dispatch --sizes 1000 10000 100000 --responders 10000 --hours 2
+"""
+import argparse
+import heapq
+import math
+import os
+import random
+import tempfile
+import time
+
+CITY = (28.40, 76.84, 28.88, 77.35)  # min_lat, min_lon, max_lat, max_lon
+HOTSPOTS = ((28.6139, 77.2090), (28.6562, 77.2410), (28.5355, 77.3910), (28.4595, 77.0266), (28.7041, 77.1025))
+
+def random_point(rng: random.Random) -> tuple:
+    return rng.uniform(CITY[0], CITY[2]), rng.uniform(CITY[1], CITY[3])
+
+def alert_point(rng: random.Random) -> tuple:
+    if rng.random() < 0.3:
+        return random_point(rng)
+    latitude, longitude = rng.choice(HOTSPOTS)
+    return latitude + rng.gauss(0, 0.02), longitude + rng.gauss(0, 0.02)
+
+def move(rng: random.Random, latitude: float, longitude: float, metres: float) -> tuple:
+    bearing = rng.uniform(0, 2 * math.pi)
+    latitude += metres * math.cos(bearing) / 111320
+    longitude += metres * math.sin(bearing) / (111320 * math.cos(math.radians(latitude)))
+    return min(max(latitude, CITY[0]), CITY[2]), min(max(longitude, CITY[1]), CITY[3])
+
+def brute_force(positions: dict, latitude: float, longitude: float, k: int, max_distance_m: float) -> list:
+    from app import geo
+
+    distances = ((geo.haversine_m(latitude, longitude, lat, lon), responder_id)
+                 for responder_id, (lat, lon) in positions.items())
+    return heapq.nsmallest(k, (item for item in distances if item[0] <= max_distance_m))
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))]
+
+def query_latency(sizes: list, k: int, queries: int, rng: random.Random):
+    from app import dispatch
+
+    print(f"nearest() for k={k}, {queries} queries per size (microseconds)")
+    print(f"{'responders':>10}{'grid p50':>10}{'grid p99':>10}{'scan p50':>10}{'move p50':>10}")
+    for size in sizes:
+        index = dispatch.ResponderIndex()
+        now = time.time()
+        positions = {}
+        for responder_id in range(size):
+            positions[responder_id] = random_point(rng)
+            index.update(responder_id, f"Unit {responder_id}", *positions[responder_id], now)
+        points = [alert_point(rng) for _ in range(queries)]
+        grid, scan = [], []
+        for latitude, longitude in points:
+            begin = time.perf_counter()
+            found = index.nearest(latitude, longitude, k, now=now)
+            grid.append(time.perf_counter() - begin)
+            begin = time.perf_counter()
+            expected = brute_force(positions, latitude, longitude, k, dispatch.DISPATCH_MAX_DISTANCE_M)
+            scan.append(time.perf_counter() - begin)
+            assert [responder_id for _, responder_id, _ in found] == [responder_id for _, responder_id in expected]
+        moves = []
+        for _ in range(queries):
+            responder_id = rng.randrange(size)
+            positions[responder_id] = move(rng, *positions[responder_id], 100)
+            begin = time.perf_counter()
+            index.update(responder_id, f"Unit {responder_id}", *positions[responder_id], now)
+            moves.append(time.perf_counter() - begin)
+        print(f"{size:>10}{percentile(grid, 0.5) * 1e6:>10.1f}{percentile(grid, 0.99) * 1e6:>10.1f}"
+              f"{percentile(scan, 0.5) * 1e6:>10.0f}{percentile(moves, 0.5) * 1e6:>10.1f}")
+
+def simulate(responders: int, hours: float, alerts_per_minute: float, heartbeat: float, k: int, rng: random.Random):
+    from app import dispatch
+
+    index = dispatch.ResponderIndex()
+    start = time.time()
+    available = {responder_id: random_point(rng) for responder_id in range(responders)}
+    busy = []  # Heap of (free again at, responder id, position)
+    for responder_id, position in available.items():
+        index.update(responder_id, f"Unit {responder_id}", *position, start)
+
+    latencies, distances, heartbeats, checked = [], [], 0, 0
+    unanswered = alerts = 0
+    heartbeat_time = 0.0
+    clock, end = 0.0, hours * 3600
+    next_alert = rng.expovariate(alerts_per_minute / 60)
+    while clock < end:
+        clock += heartbeat
+        now = start + clock
+        while busy and busy[0][0] <= clock:
+            _, responder_id, position = heapq.heappop(busy)
+            available[responder_id] = position
+            index.update(responder_id, f"Unit {responder_id}", *position, now)
+        # Patrolling at ~8 m/s
+        begin = time.perf_counter()
+        for responder_id, position in available.items():
+            position = available[responder_id] = move(rng, *position, 8 * heartbeat)
+            index.update(responder_id, f"Unit {responder_id}", *position, now)
+        heartbeat_time += time.perf_counter() - begin
+        heartbeats += len(available)
+        while next_alert <= clock:
+            next_alert += rng.expovariate(alerts_per_minute / 60)
+            alerts += 1
+            latitude, longitude = alert_point(rng)
+            begin = time.perf_counter()
+            proposals = index.nearest(latitude, longitude, k, now=now)
+            latencies.append(time.perf_counter() - begin)
+            if alerts % 50 == 0:
+                expected = brute_force(available, latitude, longitude, k, dispatch.DISPATCH_MAX_DISTANCE_M)
+                assert [responder_id for _, responder_id, _ in proposals] == [responder_id for _, responder_id in expected]
+                checked += 1
+            if not proposals:
+                unanswered += 1
+                continue
+            distance, responder_id, _ = proposals[0]
+            distances.append(distance)
+            index.remove(responder_id)
+            del available[responder_id]
+            # On scene and back in service after 20-60 minutes, near the alert
+            free_at = clock + rng.uniform(1200, 3600)
+            heapq.heappush(busy, (free_at, responder_id, move(rng, latitude, longitude, rng.uniform(0, 500))))
+
+    print(f"\nSimulated {hours:g} h: {responders} responders, heartbeat every {heartbeat:g} s, "
+          f"{alerts_per_minute:g} alerts/min, k={k}")
+    print(f"{alerts} alerts, {heartbeats} heartbeats applied ({heartbeat_time / heartbeats * 1e6:.1f} us each), "
+          f"{len(busy)} responders busy at the end")
+    print(f"proposal p50 {percentile(latencies, 0.5) * 1e6:.1f} us, p99 {percentile(latencies, 0.99) * 1e6:.1f} us, "
+          f"max {max(latencies) * 1e6:.0f} us")
+    print(f"dispatched responder distance: mean {sum(distances) / len(distances):.0f} m, "
+          f"p90 {percentile(distances, 0.9):.0f} m; no responder in range for {unanswered} alerts; "
+          f"{checked} proposals matched brute force")
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--queries", type=int, default=2000)
+    parser.add_argument("--k", type=int, default=3)
+    parser.add_argument("--responders", type=int, default=10000)
+    parser.add_argument("--hours", type=float, default=2)
+    parser.add_argument("--alerts-per-minute", type=float, default=20)
+    parser.add_argument("--heartbeat", type=float, default=10, help="Seconds between a responder's heartbeats")
+    args = parser.parse_args()
+
+    # The index needs no database; this keeps the import of app.models away from a real one
+    workdir = tempfile.mkdtemp()
+    os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}", LOG_LEVEL="WARNING")
+    rng = random.Random(11)
+    query_latency(args.sizes, args.k, args.queries, rng)
+    simulate(args.responders, args.hours, args.alerts_per_minute, args.heartbeat, args.k, rng)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,135 @@
+"""
+Benchmark: pulling a whole table through the list endpoints vs. streaming it
+from /complaints/export and /sos/export.
+
+Seeds a throwaway SQLite database with --rows complaints and --rows SOS
+alerts. Each case then starts a fresh uvicorn worker, downloads the whole
+table over HTTP and reports:
+  - time to first byte;
+  - total time and rows per second;
+  - the worker's peak resident memory (VmHWM), which includes about 100 MB
+    for the app itself.
+/complaints/all is followed page by page through X-Next-Cursor, the way a
+report script pulls it today. /sos/all returns the whole table in a single
+response.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.bench_export --rows 200000
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+PORT = 8767
+
+def seed(url: str, rows: int):
+    from sqlalchemy import create_engine, insert
+    from app import models
+
+    engine = create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"email": "user@example.org", "name": "User", "hashed_password": "x"}])
+        for start in range(0, rows, 50000):
+            count = min(50000, rows - start)
+            conn.execute(insert(models.Complaint), [
+                {"title": f"Complaint {i}", "description": "Seeded complaint text " * 8, "crime_type": "Theft",
+                 "user_email": "user@example.org", "status": "Pending", "lat": "28.61", "long": "77.21",
+                 "latitude": 28.61, "longitude": 77.21}
+                for i in range(start, start + count)
+            ])
+            conn.execute(insert(models.SOSAlert), [
+                {"lat": "28.61", "long": "77.21", "latitude": 28.61, "longitude": 77.21, "status": "Pending"}
+                for _ in range(count)
+            ])
+    engine.dispose()
+
+def start_server(workdir: str, env: dict):
+    import httpx
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT), "--log-level", "warning",
+         "--no-access-log", "--app-dir", os.getcwd()],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("API did not start")
+
+def peak_rss_mb(pid: int) -> float:
+    with open(f"/proc/{pid}/status") as status:
+        for line in status:
+            if line.startswith("VmHWM:"):
+                return int(line.split()[1]) / 1024
+    return float("nan")
+
+def download(client, path: str, paged: bool) -> tuple[float, int]:
+    """Fetch `path` (following X-Next-Cursor when paged). Returns (time to first byte, bytes)."""
+    first_byte, size, cursor = None, 0, None
+    started = time.perf_counter()
+    while True:
+        # Passing params= would replace the query string already in `path`
+        with client.stream("GET", f"{path}&cursor={cursor}" if cursor else path) as response:
+            response.raise_for_status()
+            for chunk in response.iter_raw():
+                if first_byte is None:
+                    first_byte = time.perf_counter() - started
+                size += len(chunk)
+            cursor = response.headers.get("x-next-cursor")
+        if not (paged and cursor):
+            return first_byte, size
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=200000, help="Complaints, and SOS alerts, to seed")
+    args = parser.parse_args()
+
+    import httpx
+
+    workdir = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.update(DATABASE_URL=url, LOG_LEVEL="WARNING")
+    seed(url, args.rows)
+    env = {**os.environ, "HTTP_CACHE_ENABLED": "false", "ADMISSION_CONTROL_ENABLED": "false"}
+
+    cases = [
+        ("/complaints/all (paged)", "/complaints/all?limit=500", True),
+        ("/complaints/export ndjson", "/complaints/export?format=ndjson", False),
+        ("/complaints/export csv", "/complaints/export?format=csv", False),
+        ("/sos/all", "/sos/all", False),
+        ("/sos/export ndjson", "/sos/export?format=ndjson", False),
+        ("/sos/export csv", "/sos/export?format=csv", False),
+    ]
+    try:
+        import pyarrow  # noqa: F401
+        cases += [("/complaints/export parquet", "/complaints/export?format=parquet", False),
+                  ("/sos/export parquet", "/sos/export?format=parquet", False)]
+    except ImportError:
+        print("pyarrow not installed: skipping parquet")
+
+    print(f"{args.rows} rows per table")
+    print(f"{'case':<30}{'first byte ms':>15}{'total s':>10}{'rows/s':>10}{'MB sent':>10}{'peak RSS MB':>13}")
+    for label, path, paged in cases:
+        server = start_server(workdir, env)
+        try:
+            with httpx.Client(base_url=f"http://127.0.0.1:{PORT}", timeout=600) as client:
+                started = time.perf_counter()
+                first_byte, size = download(client, path, paged)
+                elapsed = time.perf_counter() - started
+            print(f"{label:<30}{first_byte * 1000:>15.1f}{elapsed:>10.2f}{args.rows / elapsed:>10.0f}"
+                  f"{size / 1e6:>10.1f}{peak_rss_mb(server.pid):>13.0f}")
+        finally:
+            server.terminate()
+            server.wait()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,76 @@
+"""
+Benchmark: viewport (bounding box) and radius query latency for SOS alerts.
+
+Seeds a throwaway SQLite database with N alerts spread over India and
+times a city-sized viewport query and a 2 km radius query through the
+geohash index, next to a plain numeric range filter with no spatial index.
+The indexed queries should grow far slower than N.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.bench_geo_queries --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, geo, models
+
+REPEAT = 20
+VIEWPORT = (28.55, 77.15, 28.70, 77.30)  # Central Delhi
+CENTER = (28.61, 77.21)
+
+def seed(engine, n: int):
+    rng = random.Random(42)
+    with engine.begin() as conn:
+        for start in range(0, n, 10000):
+            rows = []
+            for _ in range(min(10000, n - start)):
+                latitude, longitude = rng.uniform(8.0, 35.0), rng.uniform(68.0, 97.0)
+                rows.append({
+                    "lat": str(latitude),
+                    "long": str(longitude),
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "geohash": geo.encode(latitude, longitude),
+                    "status": "Pending",
+                })
+            conn.execute(insert(models.SOSAlert), rows)
+
+def timed(fn) -> tuple[float, int]:
+    begin = time.perf_counter()
+    for _ in range(REPEAT):
+        result = fn()
+    return (time.perf_counter() - begin) / REPEAT * 1000, len(result)
+
+def run(n: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    seed(engine, n)
+    db = sessionmaker(bind=engine)()
+    min_lat, min_lon, max_lat, max_lon = VIEWPORT
+    try:
+        scan, found = timed(lambda: db.query(models.SOSAlert).filter(
+            models.SOSAlert.latitude.between(min_lat, max_lat),
+            models.SOSAlert.longitude.between(min_lon, max_lon),
+        ).all())
+        bbox, _ = timed(lambda: crud.get_points_in_bbox(db, models.SOSAlert, VIEWPORT, limit=None))
+        near, near_found = timed(lambda: crud.get_points_near(db, models.SOSAlert, *CENTER, 2000, limit=500))
+        print(f"{n:>9} alerts | viewport hits {found:5} | full scan {scan:8.2f} ms | "
+              f"geohash bbox {bbox:7.2f} ms | 2 km radius ({near_found} hits) {near:7.2f} ms")
+    finally:
+        db.close()
+        engine.dispose()
+        os.remove(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size)
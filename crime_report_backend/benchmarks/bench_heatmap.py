@@ -0,0 +1,91 @@
+"""
+Benchmark: heat map cost versus incident history size.
+
+Seeds a throwaway SQLite database with N SOS alerts spread over India and
+compares what the old heat map view did (download every alert as JSON) with
+GET /heatmap-style grids for a country-wide and a city-wide viewport, both
+uncached and from the LRU cache. Grid latency and response size should stay
+roughly flat as N grows.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.bench_heatmap --sizes 10000 100000 1000000
+"""
+import argparse
+import json
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timezone
+
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import sessionmaker
+
+from app import geo, heatmap, models, schemas
+
+REPEAT = 10
+VIEWPORTS = {
+    "country z5": (5, (8.0, 68.0, 35.0, 97.0)),
+    "city z12": (12, (28.55, 77.15, 28.70, 77.30)),  # Central Delhi
+}
+
+def seed(engine, n: int):
+    rng = random.Random(42)
+    now = time.time()
+    with engine.begin() as conn:
+        for start in range(0, n, 10000):
+            rows = []
+            for _ in range(min(10000, n - start)):
+                latitude, longitude = rng.uniform(8.0, 35.0), rng.uniform(68.0, 97.0)
+                rows.append({
+                    "lat": str(latitude),
+                    "long": str(longitude),
+                    "latitude": latitude,
+                    "longitude": longitude,
+                    "geohash": geo.encode(latitude, longitude),
+                    "status": "Pending",
+                    "created_at": datetime.fromtimestamp(now - rng.uniform(0, 90 * 86400), timezone.utc),
+                })
+            conn.execute(insert(models.SOSAlert), rows)
+
+def timed(fn):
+    begin = time.perf_counter()
+    for _ in range(REPEAT):
+        result = fn()
+    return (time.perf_counter() - begin) / REPEAT * 1000, result
+
+def run(n: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    seed(engine, n)
+    db = sessionmaker(bind=engine)()
+    try:
+        heatmap.rebuild(db)
+
+        def download_all():
+            alerts = db.query(models.SOSAlert).all()
+            return json.dumps([schemas.SOSAlert.model_validate(a).model_dump(mode="json") for a in alerts])
+
+        full, body = timed(download_all)
+        print(f"{n:>9} alerts | download all {full:9.2f} ms {len(body) / 1024:9.0f} KiB")
+        for label, (zoom, bbox) in VIEWPORTS.items():
+            heatmap._cache = heatmap.LRUCache(0, 0)
+            uncached, grid = timed(lambda: heatmap.get_grid(db, ["sos"], zoom, bbox, 30))
+            heatmap._cache = heatmap.LRUCache(heatmap.HEATMAP_CACHE_SIZE, 60)
+            heatmap.get_grid(db, ["sos"], zoom, bbox, 30)
+            cached, _ = timed(lambda: heatmap.get_grid(db, ["sos"], zoom, bbox, 30))
+            size = len(json.dumps(grid)) / 1024
+            print(f"          {label:10} | {len(grid['cells']):5} cells {size:6.0f} KiB | "
+                  f"uncached {uncached:7.2f} ms | cached {cached:6.3f} ms")
+    finally:
+        db.close()
+        engine.dispose()
+        os.remove(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000])
+    args = parser.parse_args()
+    for size in args.sizes:
+        run(size)
@@ -0,0 +1,99 @@
+"""
+Benchmark: cost of a dashboard poll with and without the ETag / response cache.
+
+Seeds a throwaway SQLite database, then polls each cached endpoint through
+the full middleware stack in three ways:
+  - uncached: HTTPCacheMiddleware disabled, so every poll runs the query
+    and serializes the page (the old behaviour);
+  - cache hit: a client without an ETag, served the stored response bytes;
+  - 304: a client sending If-None-Match, answered with no body at all.
+Every --write-every polls, an SOS alert is created. That bumps the
+sos_alerts version, so /sos/* polls then miss once and rebuild.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.bench_http_cache --complaints 5000 --polls 300
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+PATHS = ["/complaints/all?limit=100", "/complaints/recent", "/complaints/stats",
+         "/sos/all", "/sos/stats", "/auth/users/all?limit=100"]
+
+def seed(url: str, complaints: int, users: int, alerts: int):
+    from sqlalchemy import create_engine, insert
+    from app import models
+
+    engine = create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"email": f"user{i}@example.org", "name": f"User {i}", "hashed_password": "x"} for i in range(users)
+        ])
+        conn.execute(insert(models.Complaint), [
+            {"title": f"Complaint {i}", "description": "Seeded " * 20, "crime_type": "Theft",
+             "user_email": f"user{i % users}@example.org", "status": "Pending"}
+            for i in range(complaints)
+        ])
+        conn.execute(insert(models.SOSAlert), [
+            {"lat": "28.61", "long": "77.21", "status": "Pending"} for _ in range(alerts)
+        ])
+    engine.dispose()
+
+def find_cache_middleware(app):
+    from app.http_cache import HTTPCacheMiddleware
+
+    layer = app.middleware_stack
+    while layer is not None and not isinstance(layer, HTTPCacheMiddleware):
+        layer = getattr(layer, "app", None)
+    return layer
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--complaints", type=int, default=5000)
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--alerts", type=int, default=500)
+    parser.add_argument("--polls", type=int, default=300, help="Polls per endpoint and mode")
+    parser.add_argument("--write-every", type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.update(DATABASE_URL=url, LOG_LEVEL="WARNING", STATS_CACHE_TTL="0", DB_STATS_HEADERS="false")
+    seed(url, args.complaints, args.users, args.alerts)
+    sys.path.insert(0, os.getcwd())
+    os.chdir(workdir)
+
+    from fastapi.testclient import TestClient
+    from app.main import app
+
+    with TestClient(app) as client:
+        client.get("/")
+        cache = find_cache_middleware(app)
+        print(f"{args.complaints} complaints, {args.users} users, {args.alerts} SOS alerts; "
+              f"{args.polls} polls per endpoint, an SOS write every {args.write_every}")
+        print(f"{'endpoint':<28}{'uncached ms':>13}{'hit ms':>10}{'304 ms':>10}{'body KB':>10}{'304 share':>11}")
+        for path in PATHS:
+            results = {}
+            for mode in ("uncached", "hit", "304"):
+                cache.enabled = mode != "uncached"
+                etag, not_modified, size = None, 0, 0
+                started = time.perf_counter()
+                for i in range(args.polls):
+                    if args.write_every and i and i % args.write_every == 0:
+                        client.post("/sos/", json={"lat": "28.61", "long": "77.21"})
+                    headers = {"If-None-Match": etag} if mode == "304" and etag else {}
+                    response = client.get(path, headers=headers)
+                    if response.status_code == 304:
+                        not_modified += 1
+                    else:
+                        size = len(response.content)
+                        etag = response.headers.get("etag")
+                results[mode] = (time.perf_counter() - started) / args.polls * 1000, not_modified, size
+            print(f"{path:<28}{results['uncached'][0]:>13.3f}{results['hit'][0]:>10.3f}{results['304'][0]:>10.3f}"
+                  f"{results['uncached'][2] / 1024:>10.1f}{results['304'][1] / args.polls:>11.0%}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+Benchmark: replay a synthetic SOS stream through incident clustering.
+
+Generates --alerts SOS alerts over a city-sized area (Delhi). Events start
+at random places and times. Each one produces a burst of alerts: a
+geometric count with mean --burst, scattered ~100 m around the event and
+spread over a few minutes. Some alerts are lone reports.
+
+Alerts are replayed in time order the way POST /sos/ handles them:
+insert the row, incidents.assign(), commit. Joins are flushed into their
+incidents every INCIDENT_FLUSH_SECONDS of synthetic time, as the
+background flusher would. The script reports:
+  - throughput;
+  - assign() latency for the first and last 10% of the stream. Flat means
+    the cost doesn't grow with the number of incidents stored;
+  - how well incidents match the true events. Purity is the share of
+    alerts that sit in an incident dominated by their own event. Split
+    events are those whose alerts landed in more than one incident.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.bench_incidents --alerts 100000 --burst 5
+"""
+import argparse
+import collections
+import math
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+CITY = (28.40, 76.84, 28.88, 77.35)  # min_lat, min_lon, max_lat, max_lon
+
+def generate(count: int, burst: float, rng: random.Random) -> list:
+    """(seconds since start, latitude, longitude, event id) tuples, in time order."""
+    alerts, event, clock = [], 0, 0.0
+    while len(alerts) < count:
+        clock += rng.expovariate(1 / 20)  # An event every ~20 s across the city
+        latitude = rng.uniform(CITY[0], CITY[2])
+        longitude = rng.uniform(CITY[1], CITY[3])
+        size = 1
+        while rng.random() > 1 / burst:
+            size += 1
+        for _ in range(min(size, count - len(alerts))):
+            # ~100 m scatter, reports over the next few minutes
+            d_lat = rng.gauss(0, 100) / 111320
+            d_lon = rng.gauss(0, 100) / (111320 * math.cos(math.radians(latitude)))
+            alerts.append((clock + rng.expovariate(1 / 90), latitude + d_lat, longitude + d_lon, event))
+        event += 1
+    alerts.sort()
+    return alerts
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--alerts", type=int, default=100000)
+    parser.add_argument("--burst", type=float, default=5, help="Mean alerts per event")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}", LOG_LEVEL="WARNING")
+
+    from sqlalchemy import event as sa_event
+    from app import database, geo, incidents, models
+
+    @sa_event.listens_for(database.engine, "connect")
+    def _wal(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+        dbapi_connection.execute("PRAGMA synchronous=NORMAL")
+
+    models.Base.metadata.create_all(bind=database.engine)
+    rng = random.Random(7)
+    alerts = generate(args.alerts, args.burst, rng)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    print(f"{len(alerts)} alerts from {alerts[-1][3] + 1} events over {alerts[-1][0] / 3600:.1f} h (synthetic time); "
+          f"radius {incidents.INCIDENT_RADIUS_M:.0f} m, window {incidents.INCIDENT_WINDOW_SECONDS:.0f} s")
+
+    assigned, timings = [], []
+    flushed_at = 0.0
+    started = time.perf_counter()
+    for seconds, latitude, longitude, _ in alerts:
+        # A session per alert, like a request
+        db = database.SessionLocal()
+        try:
+            alert = models.SOSAlert(lat=f"{latitude:.6f}", long=f"{longitude:.6f}", latitude=latitude,
+                                    longitude=longitude, geohash=geo.encode(latitude, longitude), status="Pending")
+            db.add(alert)
+            begin = time.perf_counter()
+            assigned.append(incidents.assign(db, "sos", alert, now=start + timedelta(seconds=seconds)))
+            timings.append(time.perf_counter() - begin)
+            db.commit()
+        finally:
+            db.close()
+        if seconds - flushed_at >= incidents.INCIDENT_FLUSH_SECONDS:
+            incidents.joins.flush()
+            flushed_at = seconds
+    incidents.joins.flush()
+    elapsed = time.perf_counter() - started
+    db = database.SessionLocal()
+    try:
+        incident_count = db.query(models.Incident).count()
+    finally:
+        db.close()
+
+    tenth = max(1, len(timings) // 10)
+    print(f"Replayed in {elapsed:.1f} s: {len(alerts) / elapsed:.0f} alerts/s including insert + commit")
+    print(f"assign() first 10%: p50 {percentile(timings[:tenth], 0.5):.3f} ms p99 {percentile(timings[:tenth], 0.99):.3f} ms")
+    print(f"assign() last 10%:  p50 {percentile(timings[-tenth:], 0.5):.3f} ms p99 {percentile(timings[-tenth:], 0.99):.3f} ms")
+
+    by_incident = collections.defaultdict(collections.Counter)
+    incidents_per_event = collections.defaultdict(set)
+    for (_, _, _, event), incident in zip(alerts, assigned):
+        by_incident[incident][event] += 1
+        incidents_per_event[event].add(incident)
+    pure = sum(counts.most_common(1)[0][1] for counts in by_incident.values())
+    split = sum(1 for found in incidents_per_event.values() if len(found) > 1)
+    events = len(incidents_per_event)
+    print(f"{events} events -> {incident_count} incidents; purity {pure / len(alerts):.1%}; "
+          f"split events {split / events:.1%}; dashboard rows {len(alerts)} -> {incident_count}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark: rows per second for the list endpoints' query + serialization,
+before and after the fast path.
+
+Seeds a throwaway SQLite database, then for each list shape (Complaint,
+SOSAlert, UserDetail) times two paths over --rows rows:
+  - "pydantic": load ORM objects, then validate and dump them through the
+    response_model the way FastAPI does (TypeAdapter(list[schema]) with
+    from_attributes, then JSONResponse's json.dumps);
+  - "rows": select only the schema's columns as tuples and encode them with
+    serialization.RowsResponse (orjson).
+Both outputs are checked to decode to the same JSON.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.bench_list_serialization --rows 5000 --repeat 20
+"""
+import argparse
+import json
+import os
+import tempfile
+import time
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=5000)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    os.environ.update(DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'bench.db')}", LOG_LEVEL="WARNING")
+
+    from pydantic import TypeAdapter
+    from sqlalchemy import insert, select
+    from app import database, models, schemas, serialization
+
+    models.Base.metadata.create_all(bind=database.engine)
+    with database.engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"email": f"user{i}@example.org", "name": f"User {i}", "hashed_password": "x", "complaint_count": i % 7}
+            for i in range(args.rows)
+        ])
+        conn.execute(insert(models.Complaint), [
+            {"title": f"Complaint {i}", "description": "Seeded complaint text " * 8, "crime_type": "Theft",
+             "user_email": f"user{i}@example.org", "status": "Pending", "lat": "28.61", "long": "77.21"}
+            for i in range(args.rows)
+        ])
+        conn.execute(insert(models.SOSAlert), [
+            {"lat": "28.61", "long": "77.21", "status": "Pending", "user_email": f"user{i}@example.org"}
+            for i in range(args.rows)
+        ])
+
+    def pydantic_path(db, model, schema):
+        objects = db.scalars(select(model).order_by(model.id.desc())).all()
+        adapter = TypeAdapter(list[schema])
+        content = adapter.dump_python(adapter.validate_python(objects, from_attributes=True), mode="json")
+        return json.dumps(content, ensure_ascii=False, allow_nan=False, separators=(",", ":")).encode()
+
+    def rows_path(db, model, schema):
+        rows = db.execute(select(*serialization.columns(model, schema)).order_by(model.id.desc())).all()
+        return serialization.RowsResponse(rows, schema).body
+
+    print(f"{args.rows} rows, best of {args.repeat}")
+    print(f"{'schema':<12}{'path':<10}{'ms':>10}{'rows/s':>12}{'speedup':>9}")
+    for model, schema in ((models.Complaint, schemas.Complaint), (models.SOSAlert, schemas.SOSAlert),
+                          (models.User, schemas.UserDetail)):
+        results = {}
+        for name, path in (("pydantic", pydantic_path), ("rows", rows_path)):
+            best = float("inf")
+            for _ in range(args.repeat):
+                db = database.SessionLocal()
+                started = time.perf_counter()
+                body = path(db, model, schema)
+                best = min(best, time.perf_counter() - started)
+                db.close()
+            results[name] = (best, json.loads(body))
+        assert results["pydantic"][1] == results["rows"][1], f"{schema.__name__} output differs"
+        for name, (best, _) in results.items():
+            speedup = results["pydantic"][0] / best
+            print(f"{schema.__name__:<12}{name:<10}{best * 1000:>10.1f}{args.rows / best:>12.0f}{speedup:>8.1f}x")
+
+if __name__ == "__main__":
+    main()
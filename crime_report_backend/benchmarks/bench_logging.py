@@ -0,0 +1,105 @@
+"""
+Benchmark: request latency vs. stdout throughput, print() vs. the queued logger.
+
+Replays a burst of requests at --rps on a 40-thread pool (the size of the
+AnyIO threadpool). Each request writes the log lines create_complaint used
+to print. stdout is replaced with a stream that takes --write-ms per
+write and serialises writers, the way a full pipe to a slow log collector
+does. With print(), request latency tracks stdout speed. With the queued
+logger it shouldn't; if the queue fills, records are dropped and counted.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.bench_logging --requests 1000 --rps 1000 --write-ms 0.5
+"""
+import argparse
+import logging
+import logging.handlers
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app import log
+
+LINES_PER_REQUEST = 3
+
+class SlowStream:
+    def __init__(self, write_seconds: float):
+        self.write_seconds = write_seconds
+        self._lock = threading.Lock()
+        self.lines = 0
+
+    def write(self, text: str):
+        with self._lock:
+            time.sleep(self.write_seconds)
+            self.lines += text.count("\n")
+
+    def flush(self):
+        pass
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000
+
+def burst(handle_request, requests: int, rps: float) -> list:
+    latencies = []
+    lock = threading.Lock()
+
+    def timed(enqueued_at):
+        handle_request()
+        with lock:
+            latencies.append(time.perf_counter() - enqueued_at)
+
+    with ThreadPoolExecutor(max_workers=40) as pool:
+        start = time.perf_counter()
+        for i in range(requests):
+            delay = start + i / rps - time.perf_counter()
+            if delay > 0:
+                time.sleep(delay)
+            pool.submit(timed, time.perf_counter())
+    return latencies
+
+def run_print(stream: SlowStream, requests: int, rps: float):
+    def handle_request():
+        print("DEBUG: Uploading image_path concurrently...", file=stream)
+        print("DEBUG: Media uploaded: {'image_path': 'https://res.cloudinary.com/...'}", file=stream)
+        print("Complaint created", file=stream)
+    return burst(handle_request, requests, rps)
+
+def run_logger(stream: SlowStream, requests: int, rps: float, queue_size: int):
+    handler = log.NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    output = logging.StreamHandler(stream)
+    output.setFormatter(log.JSONFormatter())
+    listener = logging.handlers.QueueListener(handler.queue, output)
+    listener.start()
+    logger = logging.getLogger("bench.logging")
+    logger.propagate = False
+    logger.setLevel(logging.INFO)
+    logger.addHandler(handler)
+
+    def handle_request():
+        logger.info("Uploading attachments concurrently", extra={"attachments": ["image_path"]})
+        logger.info("Media uploaded", extra={"paths": {"image_path": "https://res.cloudinary.com/..."}})
+        logger.info("Complaint created")
+    latencies = burst(handle_request, requests, rps)
+    listener.stop()
+    logger.removeHandler(handler)
+    return latencies, handler.dropped
+
+def report(label: str, latencies: list, extra: str = ""):
+    print(f"{label:15} | p50 {percentile(latencies, 0.5):8.2f} ms | p99 {percentile(latencies, 0.99):8.2f} ms | "
+          f"max {max(latencies) * 1000:8.2f} ms {extra}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=1000)
+    parser.add_argument("--rps", type=float, default=1000)
+    parser.add_argument("--write-ms", type=float, nargs="+", default=[0.0, 0.1, 0.5])
+    parser.add_argument("--queue-size", type=int, default=log.LOG_QUEUE_SIZE)
+    args = parser.parse_args()
+    print(f"{args.requests} requests at {args.rps:.0f} rps, {LINES_PER_REQUEST} lines each")
+    for write_ms in args.write_ms:
+        print(f"stdout write latency {write_ms} ms")
+        report("  print()", run_print(SlowStream(write_ms / 1000), args.requests, args.rps))
+        latencies, dropped = run_logger(SlowStream(write_ms / 1000), args.requests, args.rps, args.queue_size)
+        report("  queued logger", latencies, f"| dropped {dropped}")
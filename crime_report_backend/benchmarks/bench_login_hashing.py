@@ -0,0 +1,83 @@
+"""
+Benchmark: login latency under a burst of concurrent logins.
+
+Fires N concurrent POST /auth/login requests at the app in-process (via
+httpx's ASGI transport) while a probe keeps hitting GET / to show how the
+rest of the API fares. Compares bcrypt in the shared threadpool (the old
+behaviour) with the dedicated hashing process pool.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.bench_login_hashing --concurrency 200
+"""
+import argparse
+import asyncio
+import os
+import tempfile
+import time
+
+def percentile(samples, q):
+    samples = sorted(samples)
+    return samples[min(len(samples) - 1, int(q * len(samples)))] * 1000
+
+async def burst(app, concurrency: int):
+    import httpx
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        await client.post("/auth/signup", json={"email": "bench@example.com", "password": "secret"})
+        await client.post("/auth/login", json={"email": "bench@example.com", "password": "secret"})  # Warm up
+
+        async def login():
+            begin = time.perf_counter()
+            response = await client.post("/auth/login", json={"email": "bench@example.com", "password": "secret"})
+            assert response.status_code == 200, response.text
+            return time.perf_counter() - begin
+
+        probes = []
+        done = asyncio.Event()
+
+        async def probe():
+            while not done.is_set():
+                begin = time.perf_counter()
+                await client.get("/")
+                probes.append(time.perf_counter() - begin)
+                await asyncio.sleep(0.01)
+
+        probe_task = asyncio.create_task(probe())
+        begin = time.perf_counter()
+        logins = await asyncio.gather(*(login() for _ in range(concurrency)))
+        elapsed = time.perf_counter() - begin
+        done.set()
+        await probe_task
+    return logins, probes, elapsed
+
+def report(label, logins, probes, elapsed):
+    print(f"{label:<12} | {len(logins) / elapsed:6.1f} logins/s | login p50 {percentile(logins, 0.5):8.1f} ms "
+          f"p99 {percentile(logins, 0.99):8.1f} ms | GET / p99 {percentile(probes, 0.99):7.1f} ms")
+
+async def main(concurrency: int):
+    from fastapi.concurrency import run_in_threadpool
+    from app import utils
+    from app.main import app
+
+    async def threadpool_verify(plain, hashed):
+        return await run_in_threadpool(utils.verify_and_update_password, plain, hashed)
+
+    process_verify = utils.password_hasher.verify_and_update
+    utils.password_hasher.verify_and_update = threadpool_verify
+    report("threadpool", *await burst(app, concurrency))
+
+    utils.password_hasher.verify_and_update = process_verify
+    report("process pool", *await burst(app, concurrency))
+    print(f"hashing pool: {utils.password_hasher.stats()}")
+    utils.password_hasher.shutdown()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--concurrency", type=int, default=200)
+    args = parser.parse_args()
+    workdir = tempfile.mkdtemp()
+    os.environ.setdefault("DATABASE_URL", f"sqlite:///{workdir}/bench.db")
+    os.environ.setdefault("HASHING_MAX_QUEUE", str(args.concurrency))
+    os.chdir(workdir)
+    asyncio.run(main(args.concurrency))
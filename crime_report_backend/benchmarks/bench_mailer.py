@@ -0,0 +1,111 @@
+"""
+Benchmark: OTP mail throughput, one SMTP session per message vs. the pooled mailer.
+
+Starts a local aiosmtpd server (pip install aiosmtpd) that stands in for
+the mail provider. --connect-ms is added to every new session, in the EHLO
+handler, to model the TLS handshake and AUTH round trips a real provider
+costs. The old path paid that on every message, inside the request. The
+mailer pays it once per worker connection, and the caller only waits for
+the enqueue.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.bench_mailer --messages 500 --workers 2 --connect-ms 50
+"""
+import argparse
+import asyncio
+import smtplib
+import threading
+import time
+
+from aiosmtpd.controller import Controller
+
+from app.mailer import Mailer, OutgoingMail
+
+SENDER = "noreply@example.org"
+BODY = "<html><body><h2>Verification Code</h2><p>Your OTP is: <strong>12345</strong></p></body></html>"
+
+class Handler:
+    def __init__(self, connect_seconds: float):
+        self.connect_seconds = connect_seconds
+        self.received = 0
+        self.done = threading.Event()
+        self.expected = 0
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        await asyncio.sleep(self.connect_seconds)
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        self.received += 1
+        if self.received >= self.expected:
+            self.done.set()
+        return "250 OK"
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))]
+
+def run_per_message(port: int, messages: int) -> list:
+    """What send_otp_email used to do: connect, send and quit for every message."""
+    latencies = []
+    for i in range(messages):
+        started = time.perf_counter()
+        server = smtplib.SMTP("127.0.0.1", port)
+        server.sendmail(SENDER, f"user{i}@example.org", OutgoingMail(f"user{i}@example.org", "OTP", BODY).as_string(SENDER))
+        server.quit()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+def run_pooled(port: int, messages: int, workers: int, batch_size: int):
+    mailer = Mailer("127.0.0.1", port, sender=SENDER, security="none", workers=workers,
+                    queue_size=messages, batch_size=batch_size, dead_letter=lambda mail: None)
+    latencies = []
+    for i in range(messages):
+        started = time.perf_counter()
+        mailer.enqueue(f"user{i}@example.org", "OTP", BODY)
+        latencies.append(time.perf_counter() - started)
+    return mailer, latencies
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--messages", type=int, default=500)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=20)
+    parser.add_argument("--connect-ms", type=float, default=50.0)
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    handler = Handler(args.connect_ms / 1000)
+    controller = Controller(handler, hostname="127.0.0.1", port=args.port)
+    controller.start()
+    try:
+        print(f"{args.messages} messages, {args.connect_ms:.0f} ms session setup")
+        print(f"{'mode':<28}{'msgs/s':>10}{'caller p50 ms':>15}{'caller p99 ms':>15}{'sessions':>10}")
+
+        handler.received, handler.expected = 0, args.messages
+        handler.done.clear()
+        started = time.perf_counter()
+        latencies = run_per_message(args.port, args.messages)
+        elapsed = time.perf_counter() - started
+        print(f"{'session per message':<28}{args.messages / elapsed:>10.1f}"
+              f"{percentile(latencies, 0.5) * 1000:>15.2f}{percentile(latencies, 0.99) * 1000:>15.2f}"
+              f"{args.messages:>10}")
+
+        handler.received, handler.expected = 0, args.messages
+        handler.done.clear()
+        started = time.perf_counter()
+        mailer, latencies = run_pooled(args.port, args.messages, args.workers, args.batch_size)
+        handler.done.wait(timeout=300)
+        elapsed = time.perf_counter() - started
+        stats = mailer.stats()
+        mailer.shutdown()
+        label = f"pooled ({args.workers} workers)"
+        print(f"{label:<28}{handler.received / elapsed:>10.1f}"
+              f"{percentile(latencies, 0.5) * 1000:>15.3f}{percentile(latencies, 0.99) * 1000:>15.3f}"
+              f"{stats['connections_opened']:>10}")
+    finally:
+        controller.stop()
+
+if __name__ == "__main__":
+    main()
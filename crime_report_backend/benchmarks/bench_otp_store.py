@@ -0,0 +1,117 @@
+"""
+Benchmark: OTP issue/verify throughput for each OTP store backend.
+
+Replays a signup-shaped mix against a fresh SQLite file from --threads
+threads. Each of --emails addresses gets an OTP issued, a wrong guess
+for every --wrong-every-th one, the right code, then is_email_verified
+checks. Reports ops/s and per-operation latency for the "db" store (every
+call hits the otps table, as crud did before), the default "cached" store
+(memory with write-through) and "memory" (no table). Afterwards it sweeps
+past the TTL and shows how many otps rows remain.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.bench_otp_store --emails 5000 --threads 4 --checks 3
+"""
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from sqlalchemy import event
+from sqlalchemy.orm import sessionmaker
+
+from app import database, models, otp_store
+
+def make_session_factory(path: str):
+    engine = database.build_engine(f"sqlite:///{path}")
+
+    @event.listens_for(engine, "connect")
+    def _wal(dbapi_connection, connection_record):
+        dbapi_connection.execute("PRAGMA journal_mode=WAL")
+        dbapi_connection.execute("PRAGMA synchronous=NORMAL")
+
+    models.Base.metadata.create_all(bind=engine)
+    return engine, sessionmaker(bind=engine, autoflush=False)
+
+def make_backend(name: str, session_factory):
+    if name == "db":
+        return otp_store.DatabaseOTPStore()
+    if name == "memory":
+        return otp_store.MemoryOTPStore()
+    return otp_store.CachedOTPStore(otp_store.DatabaseOTPStore(), session_factory=session_factory)
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * q))] if values else 0.0
+
+def run_flow(backend, session_factory, emails: list, wrong_every: int, checks: int, timings: dict):
+    db = session_factory()
+    try:
+        for index, email in enumerate(emails):
+            code = otp_store.new_code()
+            started = time.perf_counter()
+            backend.issue(db, email, code, time.time())
+            timings["issue"].append(time.perf_counter() - started)
+            if wrong_every and index % wrong_every == 0:
+                started = time.perf_counter()
+                backend.verify(db, email, "00000" if code != "00000" else "11111", time.time())
+                timings["verify (wrong)"].append(time.perf_counter() - started)
+            started = time.perf_counter()
+            assert backend.verify(db, email, code, time.time())
+            timings["verify"].append(time.perf_counter() - started)
+            for _ in range(checks):
+                started = time.perf_counter()
+                assert backend.is_verified(db, email, time.time())
+                timings["is_verified"].append(time.perf_counter() - started)
+    finally:
+        db.close()
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--emails", type=int, default=5000)
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--wrong-every", type=int, default=5)
+    parser.add_argument("--checks", type=int, default=3, help="is_email_verified calls per email")
+    parser.add_argument("--backends", default="db,cached,memory")
+    args = parser.parse_args()
+
+    print(f"{args.emails} emails, {args.threads} threads, {args.checks} verified-checks each")
+    print(f"{'backend':<9}{'ops/s':>10}{'op':>17}{'p50 ms':>10}{'p99 ms':>10}{'rows left':>11}")
+    for name in args.backends.split(","):
+        with tempfile.TemporaryDirectory() as tmp:
+            engine, session_factory = make_session_factory(os.path.join(tmp, "otp.db"))
+            backend = make_backend(name, session_factory)
+            emails = [f"user{i}@example.org" for i in range(args.emails)]
+            shards = [emails[i::args.threads] for i in range(args.threads)]
+            per_thread = [{"issue": [], "verify (wrong)": [], "verify": [], "is_verified": []} for _ in shards]
+
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=args.threads) as pool:
+                list(pool.map(lambda pair: run_flow(backend, session_factory, pair[0], args.wrong_every,
+                                                    args.checks, pair[1]), zip(shards, per_thread)))
+            elapsed = time.perf_counter() - started
+
+            timings = {op: [t for thread in per_thread for t in thread[op]] for op in per_thread[0]}
+            ops = sum(len(values) for values in timings.values())
+
+            # Everything issued is past its TTL (and verified rows past their retention) here
+            later = time.time() + otp_store.OTP_VERIFIED_TTL_SECONDS + 1
+            if isinstance(backend, otp_store.MemoryOTPStore):
+                backend.sweep(later)
+            db = session_factory()
+            if name != "memory":
+                otp_store.DatabaseOTPStore().delete_expired(db, later)
+            rows_left = db.query(models.OTP).count()
+            db.close()
+
+            first = True
+            for op, values in timings.items():
+                label = f"{name:<9}{ops / elapsed:>10.0f}" if first else " " * 19
+                print(f"{label}{op:>17}{percentile(values, 0.5) * 1000:>10.3f}{percentile(values, 0.99) * 1000:>10.3f}"
+                      f"{rows_left if first else '':>11}")
+                first = False
+            engine.dispose()
+
+if __name__ == "__main__":
+    main()
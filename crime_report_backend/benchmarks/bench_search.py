@@ -0,0 +1,139 @@
+"""
+Benchmark: /complaints/search query latency on a large synthetic corpus.
+
+Seeds a throwaway SQLite database with --rows complaints. The FTS5 table is
+filled by the insert trigger, as in production. Titles and descriptions are
+drawn from a Zipf-weighted vocabulary, so some words are common and others
+rare. Suspect details hold a name and sometimes a vehicle plate.
+
+A set of dispatcher-style queries is run through search.search_complaints()
+(first page, limit 20, ranking the newest SEARCH_RANK_WINDOW matches). For
+comparison, the same queries run as an unranked LIKE '%term%' scan over the
+same three columns, newest first. That scan is the closest server-side
+equivalent of downloading /complaints/all and filtering in the browser.
+It is fast when a term is common, because the first 20 rows it reads
+match. Reports p50/p99 latency and the number of matching rows for each
+query.
+
+This measures the SQLite/FTS5 backend. Postgres uses the tsvector + GIN
+path instead.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.bench_search --rows 1000000 --repeat 20
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+WORDS = ("stolen bike phone wallet car theft robbery assault harassment fraud call market station road night "
+         "morning evening house shop window door bag gold chain cash laptop scooter auto bus train metro park "
+         "school hospital temple street lane colony sector block near behind outside inside threatened followed "
+         "snatched broke entered escaped fled vehicle black white red blue silver man woman boys group neighbour").split()
+FIRST_NAMES = "Rahul Amit Priya Sunil Anita Vikram Pooja Rohan Neha Arjun Kavita Sanjay Deepak Meera Imran".split()
+LAST_NAMES = "Sharma Verma Singh Gupta Khan Yadav Patel Kumar Das Reddy Nair Iyer Joshi Mehta Chauhan".split()
+
+def plate(rng: random.Random) -> str:
+    return f"DL-{rng.randint(1, 13)}{rng.choice('CSEVT')}-{rng.choice('ABCDEFGH')}{rng.choice('ABCDEFGH')}-{rng.randint(1000, 9999)}"
+
+def seed(url: str, rows: int, rng: random.Random) -> list:
+    from sqlalchemy import create_engine, insert
+    from app import models
+
+    engine = create_engine(url)
+    models.Base.metadata.create_all(bind=engine)
+    # Zipf-like: the first words are far more frequent than the last
+    weights = [1 / (rank + 1) for rank in range(len(WORDS))]
+    plates = []
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [{"email": "user@example.org", "name": "User", "hashed_password": "x"}])
+        for start in range(0, rows, 50000):
+            batch = []
+            for _ in range(min(50000, rows - start)):
+                suspect = f"{rng.choice(FIRST_NAMES)} {rng.choice(LAST_NAMES)}"
+                if rng.random() < 0.3:
+                    plates.append(plate(rng))
+                    suspect += f", plate {plates[-1]}"
+                batch.append({
+                    "title": " ".join(rng.choices(WORDS, weights, k=3)).capitalize(),
+                    "description": " ".join(rng.choices(WORDS, weights, k=rng.randint(15, 40))),
+                    "suspect_details": suspect,
+                    "crime_type": rng.choice(("Theft", "Robbery", "Fraud", "Assault")),
+                    "user_email": "user@example.org",
+                    "status": "Pending",
+                })
+            conn.execute(insert(models.Complaint), batch)
+    engine.dispose()
+    return plates
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--repeat", type=int, default=20)
+    parser.add_argument("--like-repeat", type=int, default=3, help="Repeats for the (slow) LIKE scan")
+    args = parser.parse_args()
+
+    rng = random.Random(42)
+    workdir = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ.update(DATABASE_URL=url, LOG_LEVEL="WARNING")
+    started = time.perf_counter()
+    plates = seed(url, args.rows, rng)
+    print(f"Seeded {args.rows} complaints (FTS5 kept in sync by trigger) in {time.perf_counter() - started:.0f} s, "
+          f"db {os.path.getsize(os.path.join(workdir, 'bench.db')) / 1e6:.0f} MB")
+
+    from sqlalchemy import or_, select, text
+    from app import crud, database, models, search
+    from app.routers.complaints import COMPLAINT_COLUMNS
+
+    queries = [
+        ("plate", rng.choice(plates), {}),
+        ("plate digits", rng.choice(plates).rsplit("-", 1)[1], {}),
+        ("name", "Imran Chauhan", {}),
+        ("rare word", "neighbour", {}),
+        ("common word", "stolen", {}),
+        ("two words", "gold chain", {}),
+        ("phrase", '"gold chain"', {}),
+        ("word -word", "scooter -night", {}),
+        ("word + filter", "laptop", {"crime_type": "Fraud"}),
+    ]
+
+    def like_scan(db, q):
+        terms = [term.strip('"') for term in q.split() if not term.startswith("-")]
+        conditions = [or_(*(column.ilike(f"%{term}%") for column in
+                            (models.Complaint.title, models.Complaint.description, models.Complaint.suspect_details)))
+                      for term in terms]
+        return db.execute(select(*COMPLAINT_COLUMNS).where(*conditions)
+                          .order_by(models.Complaint.id.desc()).limit(20)).all()
+
+    print(f"Ranking the newest {search.SEARCH_RANK_WINDOW} matches (SEARCH_RANK_WINDOW)")
+    print(f"{'query':<15}{'q':<22}{'matches':>9}{'fts p50 ms':>12}{'fts p99 ms':>12}{'LIKE p50 ms':>13}")
+    db = database.SessionLocal()
+    try:
+        for label, q, filters in queries:
+            where = crud.complaint_filters(**filters)
+            matches = db.execute(
+                text("SELECT count(*) FROM complaints_fts WHERE complaints_fts MATCH :q"), {"q": search.fts5_query(q)}
+            ).scalar()
+            timings = []
+            for _ in range(args.repeat):
+                begin = time.perf_counter()
+                rows, _, _ = search.search_complaints(db, q, limit=20, filters=where, columns=COMPLAINT_COLUMNS)
+                timings.append(time.perf_counter() - begin)
+            like = []
+            for _ in range(args.like_repeat):
+                begin = time.perf_counter()
+                like_scan(db, q)
+                like.append(time.perf_counter() - begin)
+            print(f"{label:<15}{q:<22}{matches:>9}{percentile(timings, 0.5):>12.2f}{percentile(timings, 0.99):>12.2f}"
+                  f"{percentile(like, 0.5):>13.0f}")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+"""
+Benchmark: peak Python memory per upload on the resumable ingest path.
+
+Streams a file of each size through ingest.append_chunks (as PUT /uploads/{id}
+does with the request body), in several resumable PUTs, then pushes it to a
+LocalFileUploader as finalize_upload does. Peak traced memory should stay
+constant as the file size grows.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.bench_streaming_ingest --sizes-mb 10 100 500
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+import tracemalloc
+import uuid
+
+from app import ingest, media
+
+NETWORK_CHUNK = 64 * 1024  # What the ASGI server typically hands us per receive()
+PUT_SIZE = 8 * 1024 * 1024  # Bytes the client sends per resumable PUT
+
+async def body(size: int):
+    payload = b"x" * NETWORK_CHUNK
+    sent = 0
+    while sent < size:
+        chunk = payload[:min(NETWORK_CHUNK, size - sent)]
+        sent += len(chunk)
+        yield chunk
+
+async def ingest_file(upload_id: str, total: int):
+    offset = 0
+    while offset < total:
+        offset = await ingest.append_chunks(upload_id, offset, total, body(min(PUT_SIZE, total - offset)))
+    with open(ingest.staging_path(upload_id), "rb") as staged:
+        media.uploader.upload(staged, "video")
+    ingest.discard(upload_id)
+
+def run(size_mb: int):
+    total = size_mb * 1024 * 1024
+    tracemalloc.start()
+    begin = time.perf_counter()
+    asyncio.run(ingest_file(uuid.uuid4().hex, total))
+    elapsed = time.perf_counter() - begin
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{size_mb:>6} MB | peak {peak / 1024:8.1f} KiB | {size_mb / elapsed:7.1f} MB/s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes-mb", type=int, nargs="+", default=[10, 100, 500])
+    args = parser.parse_args()
+    ingest.INCOMING_DIR = tempfile.mkdtemp()
+    store = tempfile.mkdtemp()
+    media.uploader = media.LocalFileUploader(root=store)
+    for size in args.sizes_mb:
+        run(size)
@@ -0,0 +1,75 @@
+"""
+Benchmark: user lookup latency by email.
+
+Seeds a throwaway SQLite database with N users and compares the old
+two-pass lookup (exact match, then func.lower() on a miss) with the
+single indexed lookup on normalized emails, for hits and misses. The
+lower(email) index is dropped first, since the old schema did not have it
+and the normalized lookup does not need it.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.bench_user_lookup --users 1000000
+"""
+import argparse
+import os
+import random
+import tempfile
+import time
+
+from sqlalchemy import create_engine, func, insert, text
+from sqlalchemy.orm import sessionmaker
+
+from app import crud, models
+
+REPEAT = 200
+
+def two_pass_lookup(db, email):
+    """get_user_by_email before emails were normalized."""
+    email = email.strip()
+    user = db.query(models.User).filter(models.User.email == email).first()
+    if user:
+        return user
+    return db.query(models.User).filter(func.lower(models.User.email) == email.lower()).first()
+
+def seed(engine, n: int):
+    with engine.begin() as conn:
+        for start in range(0, n, 10000):
+            conn.execute(insert(models.User), [
+                {"email": f"user{i}@example.com", "hashed_password": "x"}
+                for i in range(start, min(start + 10000, n))
+            ])
+
+def time_lookups(db, lookup, emails) -> float:
+    begin = time.perf_counter()
+    for email in emails:
+        lookup(db, email)
+    return (time.perf_counter() - begin) / len(emails) * 1000
+
+def run(n: int):
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine = create_engine(f"sqlite:///{path}")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ux_users_email_lower"))
+    seed(engine, n)
+    db = sessionmaker(bind=engine)()
+    hits = [f"User{random.randrange(n)}@Example.com " for _ in range(REPEAT)]
+    misses = [f"nobody{i}@example.com" for i in range(REPEAT // 10)]
+    try:
+        print(f"{n:,} users")
+        for label, lookup in (("two-pass", two_pass_lookup), ("normalized", crud.get_user_by_email)):
+            # The old path only finds mixed-case input via its slow second pass
+            hit = time_lookups(db, lookup, hits)
+            miss = time_lookups(db, lookup, misses)
+            print(f"  {label:<10} | mixed-case hit {hit:8.3f} ms | miss {miss:8.3f} ms")
+    finally:
+        db.close()
+        engine.dispose()
+        os.remove(path)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--users", type=int, nargs="+", default=[1000000])
+    args = parser.parse_args()
+    for size in args.users:
+        run(size)
@@ -0,0 +1,236 @@
+"""
+Load test: SOS creation latency during a login flood, with and without
+rate limiting and admission control.
+
+Starts the API under uvicorn against a throwaway SQLite database seeded
+with --users accounts. --flood clients then retry logins with wrong
+passwords as fast as they get answers, the way a mobile app retry storm
+does. The logins are spread over --flood-ips forwarded addresses and the
+seeded emails, so every one of them costs a bcrypt verify unless a limit
+stops it. --pollers dashboard clients poll the read endpoints, --exporters
+clients download /complaints/export slowly (so each export streams for
+seconds), and one client creates an SOS alert every 100 ms. Clients speak HTTP/1.1 over
+raw keep-alive sockets: on a small box an HTTP client library would use
+more CPU than the server it is testing. The flood and polling clients
+run in a separate process at --client-nice (19 by default), standing in
+for clients on other machines; the SOS client has the main process to
+itself, so its timings aren't held up by theirs. Each run is measured three ways:
+no flood (baseline), flood with RATE_LIMIT_ENABLED and
+ADMISSION_CONTROL_ENABLED off, and flood with both on. On one CPU, expect
+the SOS p50 to stay flat under the flood and the p99 to stay well under
+the limits-off run, though above the no-flood one: the flood's 429s and
+503s still take event loop and GIL time from the SOS threads.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.loadtest_admission --flood 100 --pollers 5 --duration 20
+"""
+import argparse
+import asyncio
+import collections
+import concurrent.futures
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+PORT = 8766
+POLL_PATHS = ["/complaints/stats", "/sos/stats", "/sos/all", "/complaints/recent"]
+
+def seed(url: str, users: int, complaints: int, rounds: int):
+    from passlib.context import CryptContext
+    from sqlalchemy import create_engine, insert
+    from app import models
+
+    engine = create_engine(url)
+    with engine.connect() as conn:
+        conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    models.Base.metadata.create_all(bind=engine)
+    hashed = CryptContext(schemes=["bcrypt"], bcrypt__rounds=rounds).hash("correct horse")
+    with engine.begin() as conn:
+        conn.execute(insert(models.User), [
+            {"email": f"user{i}@example.org", "name": f"User {i}", "hashed_password": hashed}
+            for i in range(users)
+        ])
+        conn.execute(insert(models.Complaint), [
+            {"title": f"Complaint {i}", "description": "Bench complaint " * 8, "crime_type": "Theft",
+             "user_email": "user0@example.org", "status": "Pending"}
+            for i in range(complaints)
+        ])
+    engine.dispose()
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000 if values else float("nan")
+
+class RawClient:
+    """One keep-alive HTTP/1.1 connection with just enough parsing to read a status and skip the body."""
+
+    def __init__(self, port: int):
+        self.port = port
+        self.reader = self.writer = None
+
+    async def request(self, method: str, path: str, body: dict | None = None, headers: dict | None = None) -> int:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection("127.0.0.1", self.port)
+        payload = json.dumps(body).encode() if body is not None else b""
+        lines = [f"{method} {path} HTTP/1.1", "Host: 127.0.0.1", f"Content-Length: {len(payload)}"]
+        if body is not None:
+            lines.append("Content-Type: application/json")
+        lines += [f"{name}: {value}" for name, value in (headers or {}).items()]
+        try:
+            self.writer.write(("\r\n".join(lines) + "\r\n\r\n").encode() + payload)
+            head = await self.reader.readuntil(b"\r\n\r\n")
+            status = int(head.split(b" ", 2)[1])
+            length = 0
+            for line in head.split(b"\r\n"):
+                if line.lower().startswith(b"content-length:"):
+                    length = int(line.split(b":", 1)[1])
+            await self.reader.readexactly(length)
+            return status
+        except Exception:
+            self.close()
+            raise
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.reader = self.writer = None
+
+async def flooder(deadline: float, users: int, ips: int, retry: float, timeout: float, statuses: collections.Counter):
+    rng = random.Random()
+    client = RawClient(PORT)
+    while time.perf_counter() < deadline:
+        headers = {"X-Forwarded-For": f"10.0.{rng.randrange(ips) // 256}.{rng.randrange(ips) % 256}"}
+        body = {"email": f"user{rng.randrange(users)}@example.org", "password": "wrong"}
+        try:
+            statuses[await asyncio.wait_for(client.request("POST", "/auth/login", body, headers), timeout)] += 1
+        except asyncio.TimeoutError:
+            statuses["timeout"] += 1
+            client.close()
+        except Exception as e:
+            statuses[type(e).__name__] += 1
+        await asyncio.sleep(retry)
+    client.close()
+
+async def poller(deadline: float, statuses: collections.Counter):
+    rng = random.Random()
+    client = RawClient(PORT)
+    while time.perf_counter() < deadline:
+        try:
+            statuses[await client.request("GET", rng.choice(POLL_PATHS))] += 1
+        except Exception as e:
+            statuses[type(e).__name__] += 1
+        await asyncio.sleep(0.05)
+    client.close()
+
+async def exporter(deadline: float, statuses: collections.Counter):
+    # Reads 16 KB every 20 ms, like a client on a slow link; the server streams as fast as it is read
+    while time.perf_counter() < deadline:
+        try:
+            reader, writer = await asyncio.open_connection("127.0.0.1", PORT)
+            writer.write(b"GET /complaints/export?format=csv HTTP/1.1\r\nHost: 127.0.0.1\r\nConnection: close\r\n\r\n")
+            head = await reader.readuntil(b"\r\n\r\n")
+            status = int(head.split(b" ", 2)[1])
+            while await reader.read(16384) and time.perf_counter() < deadline:
+                await asyncio.sleep(0.02)
+            writer.close()
+            statuses[status] += 1
+        except Exception as e:
+            statuses[type(e).__name__] += 1
+        await asyncio.sleep(0.5)
+
+async def sos_writer(deadline: float, latencies: list, failures: collections.Counter):
+    client = RawClient(PORT)
+    while time.perf_counter() < deadline:
+        begin = time.perf_counter()
+        try:
+            status = await client.request("POST", "/sos/", {"lat": "28.61", "long": "77.21"})
+            if status == 200:
+                latencies.append(time.perf_counter() - begin)
+            else:
+                failures[status] += 1
+        except Exception as e:
+            failures[type(e).__name__] += 1
+        await asyncio.sleep(0.1)
+    client.close()
+
+async def clients(args, flood: int) -> tuple:
+    deadline = time.perf_counter() + args.duration
+    logins, polls, exports = collections.Counter(), collections.Counter(), collections.Counter()
+    await asyncio.gather(
+        *(flooder(deadline, args.users, args.flood_ips, args.flood_retry_ms / 1000, args.flood_timeout_ms / 1000, logins)
+          for _ in range(flood)),
+        *(poller(deadline, polls) for _ in range(args.pollers)),
+        *(exporter(deadline, exports) for _ in range(args.exporters)),
+    )
+    return logins, polls, exports
+
+def clients_process(args, flood: int) -> tuple:
+    return asyncio.run(clients(args, flood))
+
+async def run(label: str, args, flood: int):
+    sos, sos_failures = [], collections.Counter()
+    # Flood and polling clients get their own, lower-priority process: on a real
+    # deployment they run on other machines, not the server's CPUs
+    with concurrent.futures.ProcessPoolExecutor(1, initializer=os.nice, initargs=(args.client_nice,)) as pool:
+        (logins, polls, exports), _ = await asyncio.gather(
+            asyncio.get_running_loop().run_in_executor(pool, clients_process, args, flood),
+            sos_writer(time.perf_counter() + args.duration, sos, sos_failures),
+        )
+    print(f"{label:<22} | SOS p50 {percentile(sos, 0.5):7.1f} ms p99 {percentile(sos, 0.99):7.1f} ms "
+          f"n={len(sos)} failed={sum(sos_failures.values())} | logins {dict(sorted(logins.items(), key=str))} "
+          f"| polls {dict(sorted(polls.items(), key=str))} | exports {dict(sorted(exports.items(), key=str))}")
+
+def start_server(workdir: str, env: dict):
+    import httpx
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app.main:app", "--port", str(PORT), "--log-level", "warning",
+         "--no-access-log", "--app-dir", os.getcwd()],
+        cwd=workdir, env=env, stdout=subprocess.DEVNULL,
+    )
+    deadline = time.time() + 30
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/", timeout=1)
+            return server
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    server.terminate()
+    raise RuntimeError("API did not start")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--flood", type=int, default=100, help="Concurrent login retry loops")
+    parser.add_argument("--flood-retry-ms", type=float, default=100)
+    parser.add_argument("--flood-timeout-ms", type=float, default=2000)
+    parser.add_argument("--flood-ips", type=int, default=50)
+    parser.add_argument("--users", type=int, default=5)
+    parser.add_argument("--pollers", type=int, default=5)
+    parser.add_argument("--exporters", type=int, default=2, help="Slow /complaints/export downloads")
+    parser.add_argument("--complaints", type=int, default=20000, help="Complaints seeded for the exports")
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--bcrypt-rounds", type=int, default=10)
+    parser.add_argument("--client-nice", type=int, default=19, help="Niceness of the flood and polling clients")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    url = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    seed(url, args.users, args.complaints, args.bcrypt_rounds)
+    base_env = {**os.environ, "DATABASE_URL": url, "BCRYPT_ROUNDS": str(args.bcrypt_rounds),
+                "RATE_LIMIT_TRUST_FORWARDED": "true", "LOG_LEVEL": "WARNING", "STATS_CACHE_TTL": "0"}
+
+    print(f"{args.flood} login flooders ({args.flood_retry_ms:.0f} ms retry) over {args.flood_ips} IPs / {args.users} emails, "
+          f"{args.pollers} pollers, {args.exporters} exporters, SOS every 100 ms, {args.duration:.0f} s per run, bcrypt rounds {args.bcrypt_rounds}")
+    for label, flood, enabled in (("no flood", 0, "true"), ("flood, limits off", args.flood, "false"),
+                                  ("flood, limits on", args.flood, "true")):
+        env = {**base_env, "RATE_LIMIT_ENABLED": enabled, "ADMISSION_CONTROL_ENABLED": enabled}
+        server = start_server(workdir, env)
+        try:
+            asyncio.run(run(label, args, flood))
+        finally:
+            server.terminate()
+            server.wait()
@@ -0,0 +1,172 @@
+"""
+Load test: sync vs async read endpoints under many concurrent dashboard clients.
+
+Starts the API under uvicorn against a throwaway SQLite database (or --url)
+seeded with complaints. Sync twins of the read endpoints are mounted under
+/bench/sync; they run the same queries through database.get_db. --clients
+concurrent pollers then hit either the sync twins or the real async
+endpoints, while one client keeps creating SOS alerts. The SOS latency shows
+whether dashboard polling starves writes of threadpool threads.
+
+SQLite answers in microseconds, so --db-latency-ms adds a per-statement
+delay on the driver's thread (the worker thread for sync sessions,
+aiosqlite's thread for async ones) to stand in for a network round trip
+to Postgres.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.loadtest_async_reads --clients 500 --duration 15
+"""
+import argparse
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+PORT = 8765
+READ_PATHS = ["/complaints/all?limit=20", "/complaints/recent", "/complaints/stats", "/sos/stats"]
+
+def create_app():
+    """uvicorn factory: the real app plus sync twins of the async read endpoints."""
+    from fastapi import Depends, Response
+    from sqlalchemy import event
+    from sqlalchemy.orm import Session
+    from sqlalchemy.util import await_only
+    from app import crud, database, models, stats
+    from app.main import app
+
+    latency = float(os.getenv("BENCH_DB_LATENCY_MS", "0")) / 1000
+    if latency:
+        delay = lambda statement: time.sleep(latency)
+
+        @event.listens_for(database.engine, "connect")
+        def slow_sync(dbapi_connection, record):
+            dbapi_connection.set_trace_callback(delay)
+
+        @event.listens_for(database.get_async_engine().sync_engine, "connect")
+        def slow_async(dbapi_connection, record):
+            # Installed through aiosqlite so it runs on aiosqlite's own thread
+            await_only(dbapi_connection.driver_connection.set_trace_callback(delay))
+
+    @app.get("/bench/sync/complaints/all")
+    def sync_all(response: Response, limit: int = 100, db: Session = Depends(database.get_db)):
+        rows, _ = crud.get_complaints_page(db, limit=limit)
+        return [{"id": row.id, "title": row.title, "created_at": row.created_at} for row in rows]
+
+    @app.get("/bench/sync/complaints/recent")
+    def sync_recent(limit: int = 5, db: Session = Depends(database.get_db)):
+        rows = db.query(models.Complaint).order_by(models.Complaint.created_at.desc()).limit(limit).all()
+        return [{"id": row.id, "title": row.title, "created_at": row.created_at} for row in rows]
+
+    @app.get("/bench/sync/complaints/stats")
+    def sync_complaint_stats(db: Session = Depends(database.get_db)):
+        return stats.get_counts(db, "complaints")
+
+    @app.get("/bench/sync/sos/stats")
+    def sync_sos_stats(db: Session = Depends(database.get_db)):
+        return stats.get_counts(db, "sos_alerts")
+
+    return app
+
+def seed(url: str, complaints: int):
+    from sqlalchemy import create_engine, insert
+    from app import models
+
+    engine = create_engine(url)
+    if url.startswith("sqlite"):
+        # Persistent setting: lets SOS inserts commit while readers are active,
+        # as they can on Postgres. Otherwise the test mostly measures SQLite locking.
+        with engine.connect() as conn:
+            conn.exec_driver_sql("PRAGMA journal_mode=WAL")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Complaint), [
+            {"title": f"Complaint {i}", "description": "Seeded", "crime_type": "Theft",
+             "user_email": "seed@example.com", "status": "Pending"}
+            for i in range(complaints)
+        ])
+    engine.dispose()
+
+def percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] * 1000 if values else float("nan")
+
+async def poller(client, prefix: str, deadline: float, latencies: list, errors: list):
+    rng = random.Random()
+    while time.perf_counter() < deadline:
+        path = prefix + rng.choice(READ_PATHS)
+        begin = time.perf_counter()
+        try:
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append(time.perf_counter() - begin)
+        except Exception as e:
+            errors.append(type(e).__name__)
+
+async def sos_writer(client, deadline: float, latencies: list):
+    while time.perf_counter() < deadline:
+        begin = time.perf_counter()
+        response = await client.post("/sos/", json={"lat": "28.61", "long": "77.21"})
+        if response.status_code == 200:
+            latencies.append(time.perf_counter() - begin)
+        await asyncio.sleep(0.2)
+
+async def run(mode: str, clients: int, duration: float):
+    import httpx
+
+    prefix = "/bench/sync" if mode == "sync" else ""
+    limits = httpx.Limits(max_connections=clients + 1, max_keepalive_connections=clients + 1)
+    async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{PORT}", limits=limits, timeout=60) as client:
+        deadline = time.perf_counter() + duration
+        reads, writes, errors = [], [], []
+        await asyncio.gather(
+            sos_writer(client, deadline, writes),
+            *(poller(client, prefix, deadline, reads, errors) for _ in range(clients)),
+        )
+    print(f"{mode:5} | {len(reads) / duration:7.1f} reads/s | read p50 {percentile(reads, 0.5):7.1f} ms "
+          f"p99 {percentile(reads, 0.99):7.1f} ms | SOS create p50 {percentile(writes, 0.5):7.1f} ms "
+          f"p99 {percentile(writes, 0.99):7.1f} ms | errors {len(errors)}")
+
+def wait_until_up(timeout: float = 30):
+    import httpx
+
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            httpx.get(f"http://127.0.0.1:{PORT}/complaints/stats", timeout=1)
+            return
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    raise RuntimeError("API did not start")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", help="Database to test against (default: a throwaway SQLite file)")
+    parser.add_argument("--clients", type=int, default=500)
+    parser.add_argument("--duration", type=float, default=15)
+    parser.add_argument("--complaints", type=int, default=10000)
+    parser.add_argument("--db-latency-ms", type=float, default=2.0)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp()
+    url = args.url or f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ["DATABASE_URL"] = url
+    seed(url, args.complaints)
+
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "--factory", "benchmarks.loadtest_async_reads:create_app",
+         "--port", str(PORT), "--log-level", "warning", "--no-access-log", "--app-dir", os.getcwd()],
+        cwd=workdir, env={**os.environ, "STATS_CACHE_TTL": "0", "BENCH_DB_LATENCY_MS": str(args.db_latency_ms)},
+        stdout=subprocess.DEVNULL,
+    )
+    try:
+        wait_until_up()
+        print(f"{args.clients} clients, {args.duration:.0f} s per mode, {args.complaints} complaints, "
+              f"{args.db_latency_ms} ms per statement")
+        for mode in ("sync", "async"):
+            asyncio.run(run(mode, args.clients, args.duration))
+    finally:
+        server.terminate()
+        server.wait()
@@ -0,0 +1,64 @@
+"""
+Load test: end-to-end delivery latency of the SOS broadcast hub.
+
+Connects N in-process subscribers to a BroadcastHub (the same object behind
+/sos/stream), publishes alerts from a worker thread the way the sync
+create_sos_alert handler does, and records publish -> receive latency for
+every subscriber. A handful of subscribers never read, to show that slow
+consumers are evicted instead of holding everyone else back.
+
+Run from the crime_report_backend directory:
+    python -m benchmarks.loadtest_sos_stream --subscribers 1000 --messages 200
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from app.broadcast import BroadcastHub, LocalBackend
+
+async def consume(subscriber, expected: int, latencies: list):
+    for _ in range(expected):
+        message = await subscriber.get()
+        if message is None:
+            return
+        latencies.append(time.perf_counter() - message["data"]["sent_at"])
+
+async def run(subscribers: int, messages: int, slow: int, interval: float):
+    hub = BroadcastHub(LocalBackend(), queue_size=50)
+    hub.start()
+    latencies = []
+    consumers = [
+        asyncio.create_task(consume(hub.subscribe(), messages, latencies))
+        for _ in range(subscribers)
+    ]
+    for _ in range(slow):
+        hub.subscribe()  # Never read from: should be evicted
+
+    def publisher():
+        for i in range(messages):
+            hub.publish("sos_created", {"id": i, "sent_at": time.perf_counter()})
+            time.sleep(interval)
+
+    begin = time.perf_counter()
+    await asyncio.to_thread(publisher)
+    await asyncio.gather(*consumers)
+    elapsed = time.perf_counter() - begin
+    evicted = hub.evictions
+    hub.stop()
+
+    latencies.sort()
+    ms = lambda q: latencies[min(len(latencies) - 1, int(q * len(latencies)))] * 1000
+    print(f"subscribers={subscribers} slow={slow} messages={messages} deliveries={len(latencies)}")
+    print(f"elapsed {elapsed:.2f} s | {len(latencies) / elapsed:,.0f} deliveries/s | evicted {evicted}")
+    print(f"latency ms: mean {statistics.mean(latencies) * 1000:.2f} | p50 {ms(0.50):.2f} | "
+          f"p99 {ms(0.99):.2f} | max {latencies[-1] * 1000:.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--subscribers", type=int, default=1000)
+    parser.add_argument("--messages", type=int, default=200)
+    parser.add_argument("--slow", type=int, default=10)
+    parser.add_argument("--interval", type=float, default=0.005, help="Seconds between publishes")
+    args = parser.parse_args()
+    asyncio.run(run(args.subscribers, args.messages, args.slow, args.interval))
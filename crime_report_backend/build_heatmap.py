@@ -0,0 +1,23 @@
+"""
+Migration: Create the 'heatmap_cells' table and fill it from the geohash
+columns of complaints and sos_alerts. Run add_geo_columns.py first.
+Safe to re-run: the table is dropped and rebuilt from scratch each time, so
+it also repairs counts that drifted and picks up schema changes (the shard
+column). Run from the crime_report_backend directory.
+"""
+from app.database import SessionLocal, engine
+from app import heatmap, models
+
+def build_heatmap():
+    models.HeatmapCell.__table__.drop(bind=engine, checkfirst=True)
+    models.HeatmapCell.__table__.create(bind=engine)
+    db = SessionLocal()
+    try:
+        heatmap.rebuild(db)
+        cells = db.query(models.HeatmapCell).count()
+        print(f"Built heat map: {cells} cell(s) across {len(heatmap.PRECISIONS)} precision levels.")
+    finally:
+        db.close()
+
+if __name__ == "__main__":
+    build_heatmap()
@@ -0,0 +1,24 @@
+"""
+Compare the /complaints/stats and /sos/stats counters against true table counts.
+Run from the crime_report_backend directory; pass --repair to rebuild counters that drifted.
+"""
+import sys
+from app.database import SessionLocal
+from app import stats
+
+def main():
+    repair = "--repair" in sys.argv
+    db = SessionLocal()
+    try:
+        report = stats.check_consistency(db, repair=repair)
+    finally:
+        db.close()
+
+    for name, result in report.items():
+        marker = "✅" if result["consistent"] else "❌"
+        print(f"{marker} {name}: total {result['counter_total']} (true {result['true_total']}), "
+              f"last 24h {result['counter_last_24h']} (true {result['true_last_24h']})"
+              + (" - repaired" if result.get("repaired") else ""))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,75 @@
+"""
+Migration: Normalize users.email (trimmed, lower-case) so login and lookups
+are a single indexed query, and add the case-insensitive unique index.
+
+References in complaints.user_email and sos_alerts.user_email are rewritten
+too. Emails that differ only by case are NOT touched; they are listed so
+they can be merged by hand, after which this script can be re-run.
+Works on both SQLite and PostgreSQL. Run from the crime_report_backend directory.
+"""
+from sqlalchemy import text
+from app.database import engine
+
+def find_case_duplicates(conn):
+    rows = conn.execute(text(
+        "SELECT lower(trim(email)) AS normalized, count(*) FROM users "
+        "GROUP BY lower(trim(email)) HAVING count(*) > 1"
+    )).fetchall()
+    return {row[0] for row in rows}
+
+def normalize_user_emails():
+    with engine.connect() as conn:
+        duplicates = find_case_duplicates(conn)
+        if duplicates:
+            print(f"⚠️  {len(duplicates)} email(s) have case-variant duplicates and will be skipped:")
+            for normalized in sorted(duplicates):
+                variants = conn.execute(
+                    text("SELECT id, email FROM users WHERE lower(trim(email)) = :email ORDER BY id"),
+                    {"email": normalized},
+                ).fetchall()
+                print(f"   {normalized}: " + ", ".join(f"#{uid} '{email}'" for uid, email in variants))
+
+        pending = conn.execute(text(
+            "SELECT email FROM users WHERE email <> lower(trim(email))"
+        )).fetchall()
+        updated = 0
+        for (email,) in pending:
+            normalized = email.strip().lower()
+            if normalized in duplicates:
+                continue
+            params = {"old": email, "new": normalized}
+            if engine.dialect.name == "postgresql":
+                # One statement so the complaints -> users foreign key is satisfied when checked
+                conn.execute(text(
+                    "WITH moved AS (UPDATE users SET email = :new WHERE email = :old RETURNING id) "
+                    "UPDATE complaints SET user_email = :new WHERE user_email = :old"
+                ), params)
+            else:
+                conn.execute(text("UPDATE users SET email = :new WHERE email = :old"), params)
+                conn.execute(text("UPDATE complaints SET user_email = :new WHERE user_email = :old"), params)
+            conn.execute(text("UPDATE sos_alerts SET user_email = :new WHERE user_email = :old"), params)
+            updated += 1
+        conn.commit()
+        print(f"Normalized {updated} user email(s).")
+
+        # Complaints whose spelling matches no user row but whose normalized form does
+        conn.execute(text(
+            "UPDATE complaints SET user_email = lower(trim(user_email)) "
+            "WHERE user_email NOT IN (SELECT email FROM users) "
+            "AND lower(trim(user_email)) IN (SELECT email FROM users)"
+        ))
+        conn.execute(text(
+            "UPDATE sos_alerts SET user_email = lower(trim(user_email)) "
+            "WHERE user_email <> lower(trim(user_email))"
+        ))
+        conn.commit()
+
+        if duplicates:
+            print("Skipping 'ux_users_email_lower' until the duplicates above are merged.")
+            return
+        conn.execute(text("CREATE UNIQUE INDEX IF NOT EXISTS ux_users_email_lower ON users (lower(email));"))
+        conn.commit()
+        print("Success: 'ux_users_email_lower' is in place.")
+
+if __name__ == "__main__":
+    normalize_user_emails()
@@ -0,0 +1,34 @@
+"""
+Migration: Rebuild the /complaints/stats and /sos/stats counters as
+STATS_SHARDS rows per counter (see app/stats.py). The counter tables only
+hold derived data, so they are dropped, recreated and recounted from the
+complaints and sos_alerts tables. Also run it after changing STATS_SHARDS.
+Works on both SQLite and PostgreSQL.
+Run from the crime_report_backend directory, ideally with the API stopped;
+inserts made during the rebuild are caught by `python check_stats.py --repair`.
+"""
+from app.database import SessionLocal, engine
+from app import models, stats
+
+def shard_stat_counters():
+    print(f"Rebuilding stats counters with {stats.STATS_SHARDS} shards...")
+    try:
+        tables = [models.StatBucket.__table__, models.StatCounter.__table__]
+        for table in tables:
+            table.drop(bind=engine, checkfirst=True)
+        for table in reversed(tables):
+            table.create(bind=engine)
+        db = SessionLocal()
+        try:
+            stats.ensure_counters(db)
+            for name in stats.COUNTED:
+                total, recent = stats.get_counts(db, name)
+                print(f"'{name}': {total} total, {recent} in the last 24h.")
+        finally:
+            db.close()
+        print("Success: counters rebuilt.")
+    except Exception as e:
+        print(f"Migration error: {e}")
+
+if __name__ == "__main__":
+    shard_stat_counters()
@@ -0,0 +1,8 @@
+import os
+import sys
+import tempfile
+
+# The app connects to DATABASE_URL on import; keep the tests away from a real database
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(tempfile.mkdtemp(), 'test.db')}"
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
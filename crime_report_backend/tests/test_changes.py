@@ -0,0 +1,68 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import Session
+
+from app import crud, models
+
+T0 = datetime(2024, 1, 1, 12, 0, 0)
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'changes.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    with Session(engine) as session:
+        yield session
+
+def add_alert(db, updated_at):
+    alert = models.SOSAlert(lat="0", long="0", status="Pending", updated_at=updated_at)
+    db.add(alert)
+    db.commit()
+    return alert
+
+def keys(rows):
+    return [(row.id, row.updated_at) for row in rows]
+
+def test_pages_in_change_order_without_gaps(db):
+    alerts = [add_alert(db, T0 + timedelta(seconds=i)) for i in range(5)]
+    seen, cursor = [], None
+    while True:
+        rows, has_more, next_cursor = crud.get_changes_since(db, models.SOSAlert, limit=2, cursor=cursor)
+        seen += [key for key in keys(rows) if key not in seen]
+        cursor = next_cursor or cursor
+        if not has_more:
+            break
+    assert seen == keys(alerts)
+
+def test_row_committed_behind_the_cursor_is_still_delivered(db):
+    add_alert(db, T0 + timedelta(seconds=2))
+    rows, _, cursor = crud.get_changes_since(db, models.SOSAlert, limit=10)
+    assert len(rows) == 1
+
+    # Stamped before the first row but committed after the poll, like a slow transaction
+    late = add_alert(db, T0 + timedelta(seconds=1))
+    rows, has_more, next_cursor = crud.get_changes_since(db, models.SOSAlert, limit=10, cursor=cursor)
+    assert (late.id, late.updated_at) in keys(rows)
+    assert not has_more
+    # Nothing past the cursor yet: the client keeps polling from where it was
+    assert next_cursor is None
+
+def test_rows_older_than_the_overlap_are_not_resent(db):
+    add_alert(db, T0)
+    newest = add_alert(db, T0 + timedelta(seconds=crud.CHANGES_OVERLAP_SECONDS + 1))
+    rows, _, _ = crud.get_changes_since(
+        db, models.SOSAlert, limit=10, cursor=(newest.updated_at, newest.id)
+    )
+    assert keys(rows) == [(newest.id, newest.updated_at)]
+
+def test_cursor_advances_even_when_the_overlap_fills_a_page(db):
+    for i in range(4):
+        add_alert(db, T0 + timedelta(milliseconds=i))
+    rows, _, cursor = crud.get_changes_since(db, models.SOSAlert, limit=4)
+    fresh = add_alert(db, T0 + timedelta(milliseconds=10))
+
+    rows, has_more, next_cursor = crud.get_changes_since(db, models.SOSAlert, limit=2, cursor=cursor)
+    assert (fresh.id, fresh.updated_at) in keys(rows)
+    assert next_cursor == (fresh.updated_at, fresh.id)
+    assert not has_more
@@ -0,0 +1,76 @@
+import math
+import random
+from datetime import datetime, timezone
+
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import dispatch, geo, models
+
+NOW = 1_700_000_000.0
+
+@pytest.fixture
+def sessions(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'dispatch.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+def test_only_one_dispatcher_claims_a_responder(sessions):
+    with sessions() as db:
+        responder = models.Responder(name="Unit 1", status="Available", latitude=12.97, longitude=77.59,
+                                     last_seen=datetime.now(timezone.utc))
+        db.add(responder)
+        db.commit()
+        responder_id = responder.id
+
+    # Both dispatchers saw the responder as Available
+    first, second = sessions(), sessions()
+    claimed = dispatch.set_status(first, responder_id, "Busy", only_if="Available")
+    first.commit()
+    lost = dispatch.set_status(second, responder_id, "Busy", only_if="Available")
+    second.commit()
+    assert claimed is not None and claimed.status == "Busy"
+    assert lost is None
+    first.close()
+    second.close()
+
+def test_unconditional_status_change_always_applies(sessions):
+    with sessions() as db:
+        responder = models.Responder(name="Unit 1", status="Busy")
+        db.add(responder)
+        db.commit()
+        row = dispatch.set_status(db, responder.id, "Available")
+        db.commit()
+        assert row.status == "Available"
+
+def test_nearest_matches_a_full_scan():
+    rng = random.Random(7)
+    index = dispatch.ResponderIndex(cell_m=500)
+    points = {}
+    for responder_id in range(300):
+        lat, lon = 12.9 + rng.uniform(-0.1, 0.1), 77.6 + rng.uniform(-0.1, 0.1)
+        points[responder_id] = (lat, lon)
+        index.update(responder_id, f"Unit {responder_id}", lat, lon, NOW)
+    # Moving a responder leaves it only at its new position
+    points[0] = (12.95, 77.65)
+    index.update(0, "Unit 0", 12.95, 77.65, NOW)
+
+    for _ in range(20):
+        lat, lon = 12.9 + rng.uniform(-0.12, 0.12), 77.6 + rng.uniform(-0.12, 0.12)
+        expected = sorted((geo.haversine_m(lat, lon, *point), responder_id) for responder_id, point in points.items())[:5]
+        found = index.nearest(lat, lon, 5, now=NOW)
+        assert [responder_id for _, responder_id, _ in found] == [responder_id for _, responder_id in expected]
+        assert [distance for distance, _, _ in found] == pytest.approx([distance for distance, _ in expected])
+
+def test_nearest_skips_stale_distant_and_removed_responders():
+    index = dispatch.ResponderIndex(cell_m=1000)
+    index.update(1, "Stale", 12.9, 77.6, NOW - dispatch.DISPATCH_HEARTBEAT_TTL - 1)
+    index.update(2, "Far", 13.9, 77.6, NOW)
+    index.update(3, "Gone", 12.9, 77.6, NOW)
+    index.remove(3)
+    index.update(4, "Near", 12.91, 77.6, NOW)
+    found = index.nearest(12.9, 77.6, 3, max_distance_m=20000, now=NOW)
+    assert [responder_id for _, responder_id, _ in found] == [4]
+    assert math.isclose(found[0][0], geo.haversine_m(12.9, 77.6, 12.91, 77.6))
+    assert len(index) == 3
@@ -0,0 +1,45 @@
+import pytest
+from fastapi.testclient import TestClient
+
+from app import database, http_cache, models
+from app.main import app
+
+@pytest.fixture(scope="module")
+def client():
+    with TestClient(app) as client:
+        yield client
+
+def test_revalidation_is_answered_with_304(client):
+    first = client.get("/sos/all")
+    etag = first.headers["ETag"]
+    again = client.get("/sos/all", headers={"If-None-Match": etag})
+    assert again.status_code == 304
+    assert again.headers["ETag"] == etag
+    assert again.content == b""
+
+def test_commit_changes_the_etag_at_once(client):
+    etag = client.get("/sos/all").headers["ETag"]
+    assert client.post("/sos/", json={"lat": "12.97", "long": "77.59"}).status_code == 200
+    # Well inside HTTP_CACHE_VERSION_TTL: only the commit hook can have invalidated the version
+    after = client.get("/sos/all", headers={"If-None-Match": etag})
+    assert after.status_code == 200
+    assert after.headers["ETag"] != etag
+    assert any(alert["lat"] == "12.97" for alert in after.json())
+
+def test_rolled_back_write_keeps_the_etag(client):
+    etag = client.get("/sos/all").headers["ETag"]
+    db = database.SessionLocal()
+    try:
+        db.add(models.SOSAlert(lat="1", long="1", status="Pending"))
+        http_cache.bump(db, "sos_alerts")
+        db.flush()
+        db.rollback()
+    finally:
+        db.close()
+    assert client.get("/sos/all", headers={"If-None-Match": etag}).status_code == 304
+
+def test_weak_and_strong_validators_match():
+    assert http_cache.etag_matches('"v1"', 'W/"v1"')
+    assert http_cache.etag_matches('W/"v0", W/"v1"', 'W/"v1"')
+    assert http_cache.etag_matches("*", 'W/"v1"')
+    assert not http_cache.etag_matches('W/"v0"', 'W/"v1"')
@@ -0,0 +1,45 @@
+import asyncio
+
+from app import ingest
+
+def run(middleware, headers, chunks):
+    consumed, sent = [], []
+
+    async def receive():
+        body = chunks[len(consumed)]
+        consumed.append(body)
+        return {"type": "http.request", "body": body, "more_body": len(consumed) < len(chunks)}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {"type": "http", "method": "POST", "path": "/upload", "headers": headers}
+    try:
+        asyncio.run(middleware(scope, receive, send))
+    except Exception as e:
+        return sent, len(consumed), e
+    return sent, len(consumed), None
+
+async def read_body(scope, receive, send):
+    while (await receive())["more_body"]:
+        pass
+    await send({"type": "http.response.start", "status": 200, "headers": []})
+
+def test_declared_length_over_the_limit_is_refused_unread():
+    middleware = ingest.UploadLimitMiddleware(read_body, limits={("POST", "/upload"): 100})
+    sent, consumed, error = run(middleware, [(b"content-length", b"101")], [b"x" * 101])
+    assert sent[0]["status"] == 413 and consumed == 0 and error is None
+
+def test_streamed_body_is_cut_off_once_past_the_limit():
+    middleware = ingest.UploadLimitMiddleware(read_body, limits={("POST", "/upload"): 100})
+    sent, consumed, error = run(middleware, [], [b"x" * 40] * 10)
+    assert error.status_code == 413
+    assert consumed == 3 and not sent
+
+def test_bodies_within_the_limit_and_other_routes_pass():
+    middleware = ingest.UploadLimitMiddleware(read_body, limits={("POST", "/upload"): 100})
+    sent, consumed, error = run(middleware, [(b"content-length", b"80")], [b"x" * 40] * 2)
+    assert sent[0]["status"] == 200 and consumed == 2
+    middleware = ingest.UploadLimitMiddleware(read_body, limits={("POST", "/other"): 10})
+    sent, consumed, error = run(middleware, [], [b"x" * 40] * 10)
+    assert sent[0]["status"] == 200 and consumed == 10
@@ -0,0 +1,62 @@
+import pytest
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+
+from app import models, otp_store
+
+NOW = 1_700_000_000.0
+EMAIL = "a@example.com"
+
+@pytest.fixture
+def sessions(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'otp.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    return sessionmaker(bind=engine)
+
+@pytest.fixture(params=["memory", "db", "cached"])
+def store(request, sessions):
+    if request.param == "memory":
+        return otp_store.MemoryOTPStore(max_attempts=3)
+    if request.param == "db":
+        return otp_store.DatabaseOTPStore(max_attempts=3)
+    return otp_store.CachedOTPStore(otp_store.DatabaseOTPStore(max_attempts=3), max_attempts=3)
+
+def test_code_verifies_once(store, sessions):
+    db = sessions()
+    store.issue(db, EMAIL, "12345", NOW)
+    assert store.verify(db, EMAIL, "12345", NOW + 1)
+    assert store.is_verified(db, EMAIL, NOW + 2)
+    assert not store.verify(db, EMAIL, "12345", NOW + 3)
+
+def test_wrong_codes_lock_the_otp(store, sessions):
+    db = sessions()
+    store.issue(db, EMAIL, "12345", NOW)
+    for _ in range(3):
+        assert not store.verify(db, EMAIL, "00000", NOW + 1)
+    assert not store.verify(db, EMAIL, "12345", NOW + 2)
+    assert not store.is_verified(db, EMAIL, NOW + 2)
+    # A new code starts a fresh count
+    store.issue(db, EMAIL, "54321", NOW + 3)
+    assert store.verify(db, EMAIL, "54321", NOW + 4)
+
+def test_expired_code_is_refused(store, sessions):
+    db = sessions()
+    store.issue(db, EMAIL, "12345", NOW)
+    assert not store.verify(db, EMAIL, "12345", NOW + otp_store.OTP_TTL_SECONDS + 1)
+
+def test_cached_workers_share_one_use_and_one_attempt_count(sessions):
+    # Two worker processes, each with its own cache over the same table
+    first = otp_store.CachedOTPStore(otp_store.DatabaseOTPStore(max_attempts=3), max_attempts=3)
+    second = otp_store.CachedOTPStore(otp_store.DatabaseOTPStore(max_attempts=3), max_attempts=3)
+    db = sessions()
+    first.issue(db, EMAIL, "12345", NOW)
+    second.issue(db, EMAIL, "12345", NOW)
+    assert first.verify(db, EMAIL, "12345", NOW + 1)
+    assert not second.verify(db, EMAIL, "12345", NOW + 1)
+    assert second.is_verified(db, EMAIL, NOW + 2)
+
+    first.issue(db, "b@example.com", "11111", NOW)
+    assert not first.verify(db, "b@example.com", "00000", NOW + 1)
+    assert not second.verify(db, "b@example.com", "00000", NOW + 1)
+    assert not first.verify(db, "b@example.com", "00000", NOW + 1)
+    assert not second.verify(db, "b@example.com", "11111", NOW + 2)
@@ -0,0 +1,92 @@
+import asyncio
+
+import pytest
+from fastapi import HTTPException
+from sqlalchemy import create_engine
+from sqlalchemy.orm import sessionmaker
+from starlette.requests import Request
+
+from app import models, ratelimit
+
+def request_from(ip):
+    return Request({"type": "http", "method": "POST", "path": "/", "headers": [], "client": (ip, 1234)})
+
+@pytest.fixture(params=["memory", "database"])
+def backend(request, tmp_path):
+    if request.param == "memory":
+        return ratelimit.MemoryBackend()
+    engine = create_engine(f"sqlite:///{tmp_path / 'ratelimit.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    return ratelimit.DatabaseBackend(sessionmaker(bind=engine))
+
+def test_refuses_with_retry_after_once_the_bucket_is_empty(backend):
+    limiter = ratelimit.RateLimiter(backend, {"login": ("3/60", "")})
+    for _ in range(3):
+        limiter.check(request_from("10.0.0.1"), "login")
+    with pytest.raises(HTTPException) as refused:
+        limiter.check(request_from("10.0.0.1"), "login")
+    assert refused.value.status_code == 429
+    # One token comes back every 20 seconds
+    assert 1 <= int(refused.value.headers["Retry-After"]) <= 20
+    # Other clients have buckets of their own
+    limiter.check(request_from("10.0.0.2"), "login")
+
+def test_email_bucket_applies_across_ips(backend):
+    limiter = ratelimit.RateLimiter(backend, {"send_otp": ("100/60", "2/60")})
+    limiter.check(request_from("10.0.0.1"), "send_otp", "a@example.com")
+    limiter.check(request_from("10.0.0.2"), "send_otp", " A@example.com ")
+    with pytest.raises(HTTPException) as refused:
+        limiter.check(request_from("10.0.0.3"), "send_otp", "a@example.com")
+    assert refused.value.status_code == 429
+    assert "Retry-After" in refused.value.headers
+
+def test_bucket_refills_over_time():
+    backend = ratelimit.MemoryBackend()
+    assert backend.take("k", 1, 0.5, now=100.0) == (True, 0)
+    allowed, tokens = backend.take("k", 1, 0.5, now=101.0)
+    assert not allowed and tokens == pytest.approx(0.5)
+    assert backend.take("k", 1, 0.5, now=102.0)[0]
+
+def test_disabled_limiter_never_refuses():
+    limiter = ratelimit.RateLimiter(ratelimit.MemoryBackend(), {"login": ("1/60", "")}, enabled=False)
+    for _ in range(5):
+        limiter.check(request_from("10.0.0.1"), "login")
+
+def test_admission_sheds_polling_first_and_always_admits_sos():
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+
+    middleware = ratelimit.AdmissionMiddleware(app, max_in_flight=4, shed_at=2)
+    middleware.in_flight[ratelimit.NORMAL] = 2
+
+    def status(method, path):
+        sent = []
+
+        async def send(message):
+            sent.append(message)
+
+        asyncio.run(middleware({"type": "http", "method": method, "path": path}, None, send))
+        return sent[0]["status"]
+
+    assert status("GET", "/sos/all") == 503
+    assert status("POST", "/auth/login") == 200
+    middleware.in_flight[ratelimit.NORMAL] = 4
+    assert status("POST", "/auth/login") == 503
+    assert status("POST", "/sos/") == 200
+
+def test_exports_stop_counting_once_they_stream():
+    seen = []
+
+    async def app(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        seen.append(middleware.in_flight[ratelimit.NORMAL])
+        await send({"type": "http.response.body", "body": b""})
+
+    async def send(message):
+        pass
+
+    middleware = ratelimit.AdmissionMiddleware(app)
+    for path in ("/complaints/export", "/complaints/"):
+        asyncio.run(middleware({"type": "http", "method": "GET", "path": path}, None, send))
+    assert seen == [0, 1]
+    assert middleware.in_flight[ratelimit.NORMAL] == 0
@@ -0,0 +1,57 @@
+import pytest
+from sqlalchemy import create_engine, insert
+from sqlalchemy.orm import Session
+
+from app import models, search
+
+@pytest.mark.parametrize("q, expected", [
+    ("knife robbery", '"knife" "robbery"'),
+    ('"red car"', '"red car"'),
+    ('"red   car"  theft', '"red car" "theft"'),
+    # Quotes inside a term can't open or close an FTS5 string
+    ('a"b', '"a b"'),
+    ('say "hi', '"say" "hi"'),
+    # FTS5 operators and prefix stars are searched as plain words
+    ("NOT OR AND", '"NOT" "OR" "AND"'),
+    ("x*", '"x*"'),
+])
+def test_fts5_query_quotes_every_term(q, expected):
+    assert search.fts5_query(q) == expected
+
+@pytest.mark.parametrize("q, expected", [
+    ("theft -bike", '"theft" NOT "bike"'),
+    ('-"stolen car" phone', '"phone" NOT "stolen car"'),
+    ("theft -bike -car", '"theft" NOT "bike" NOT "car"'),
+])
+def test_fts5_query_excludes_minus_terms(q, expected):
+    assert search.fts5_query(q) == expected
+
+@pytest.mark.parametrize("q", ["", "   ", '""', '" "', "-bike", '-"stolen car"'])
+def test_fts5_query_without_included_terms_is_none(q):
+    assert search.fts5_query(q) is None
+
+@pytest.fixture
+def db(tmp_path):
+    engine = create_engine(f"sqlite:///{tmp_path / 'search.db'}")
+    models.Base.metadata.create_all(bind=engine)
+    with engine.begin() as conn:
+        conn.execute(insert(models.Complaint), [
+            {"title": f"Stolen bike {i}", "description": "Taken from the market", "crime_type": "Theft"}
+            for i in range(10)
+        ])
+    with Session(engine) as session:
+        yield session
+    engine.dispose()
+
+def test_search_reports_matches_left_out_of_the_window(db, monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_RANK_WINDOW", 4)
+    rows, has_more, truncated = search.search_complaints(db, "bike", limit=3)
+    assert len(rows) == 3 and has_more and not truncated
+    rows, has_more, truncated = search.search_complaints(db, "bike", limit=3, offset=3)
+    assert [row.id for row in rows] == [7] and not has_more and truncated
+
+def test_search_is_not_truncated_when_every_match_fits(db, monkeypatch):
+    monkeypatch.setattr(search, "SEARCH_RANK_WINDOW", 10)
+    rows, has_more, truncated = search.search_complaints(db, "bike", limit=10)
+    assert len(rows) == 10 and not has_more and not truncated
+    assert search.search_complaints(db, "bike -market", limit=10) == ([], False, False)